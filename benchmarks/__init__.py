@@ -0,0 +1,10 @@
+"""
+Benchmarks for grammar compilation and generated parser throughput.
+
+Run from the repository root with `python -m benchmarks --help`.
+"""
+import os
+import sys
+
+# use the peggypy in this checkout rather than an installed one
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
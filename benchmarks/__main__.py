@@ -0,0 +1,98 @@
+"""
+Measures compile time per pass, and generated parser throughput, for the
+reference grammars in `benchmarks/grammars.py`, how compile time grows with
+the number of rules, and the syntax tree traversal overhead of the passes,
+and writes the results as JSON so they can be compared between versions:
+
+	python -m benchmarks --output results.json
+	python -m benchmarks --suite parse --grammar json csv --size 10000 1000000
+	python -m benchmarks --suite scaling --rules 1000 3000 9000
+"""
+import argparse
+import datetime
+import json
+import platform
+import sys
+from typing import Any
+
+from peggypy.version import VERSION
+
+from .compile_time import measure_compile
+from .grammars import GRAMMARS
+from .scaling import measure_scaling
+from .traversal import measure_traversal
+from .throughput import measure_parse
+
+
+SUITES = ["compile", "parse", "scaling", "traversal"]
+
+
+def main(argv:list[str]) -> int:
+	parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--suite", nargs="+", choices=SUITES, default=SUITES, help="what to measure (default: all)")
+	parser.add_argument("--grammar", nargs="+", choices=list(GRAMMARS), default=list(GRAMMARS), help="reference grammars to use (default: all)")
+	parser.add_argument("--size", nargs="+", type=int, default=[10_000, 100_000, 1_000_000], help="input sizes in characters, for the parse suite")
+	parser.add_argument("--rules", nargs="+", type=int, default=[500, 1000, 2000, 4000], help="rules in the synthetic grammars, for the scaling and traversal suites")
+	parser.add_argument("--repeat", type=int, default=5, help="runs of each measurement; the fastest is kept")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the input generators")
+	parser.add_argument("--option", nargs=2, action="append", default=[], metavar=("NAME", "JSON_VALUE"), help="a compiler option, e.g. --option cache true")
+	parser.add_argument("--output", help="file to write the results to (default: standard output)")
+	args = parser.parse_args(argv)
+
+	options:dict[str, Any] = {name: json.loads(value) for name, value in args.option}
+
+	results:dict[str, Any] = {
+		"peggypy": VERSION,
+		"python": platform.python_version(),
+		"implementation": platform.python_implementation(),
+		"machine": platform.machine(),
+		"date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+		"options": options,
+		"repeat": args.repeat,
+		"seed": args.seed,
+	}
+
+	if "compile" in args.suite:
+		results["compile"] = {}
+		for name in args.grammar:
+			measured = measure_compile(GRAMMARS[name], args.repeat, dict(options))
+			results["compile"][name] = measured
+			print(f"compile {name:<12} {measured['seconds'] * 1e3:9.2f} ms", file=sys.stderr)
+
+	if "parse" in args.suite:
+		results["parse"] = {}
+		for name in args.grammar:
+			measured = measure_parse(GRAMMARS[name], args.size, args.repeat, args.seed, dict(options))
+			results["parse"][name] = measured
+			for each in measured:
+				print(
+					f"parse   {name:<12} {each['bytes']:>10} bytes {each['mb_per_s']:9.3f} MB/s"
+					f" {each['peak_allocated_bytes'] / 1e6:9.2f} MB peak",
+					file=sys.stderr
+				)
+
+	if "scaling" in args.suite:
+		results["scaling"] = measure_scaling(args.rules, args.repeat, args.seed, dict(options))
+		for each in results["scaling"]:
+			print(f"scaling {each['rules']:>6} rules {each['seconds'] * 1e3:10.2f} ms {each['us_per_rule']:9.2f} us/rule", file=sys.stderr)
+
+	if "traversal" in args.suite:
+		results["traversal"] = measure_traversal(args.rules, args.repeat, args.seed, dict(options))
+		for each in results["traversal"]:
+			print(
+				f"visit   {each['rules']:>6} rules {each['visitor_seconds'] * 1e3:10.2f} ms visitor"
+				f" {each['walker_seconds'] * 1e3:10.2f} ms walker {each['passes_seconds'] * 1e3:10.2f} ms passes",
+				file=sys.stderr
+			)
+
+	text = json.dumps(results, indent=2)
+	if args.output is not None:
+		with open(args.output, "w", encoding="utf-8") as file:
+			file.write(text + "\n")
+	else:
+		print(text)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
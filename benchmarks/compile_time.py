@@ -0,0 +1,42 @@
+"""Time spent in each compiler pass"""
+import time
+from typing import Any
+
+from peggypy.compiler import Pass_Report, compile_ast_code
+from peggypy.compiler.passes import passes
+
+from .grammars import Reference_Grammar
+
+
+def measure_compile(grammar:Reference_Grammar, repeat:int, options:dict[str, Any]) -> dict[str, Any]:
+	"""
+	Compiles `grammar` `repeat` times with the passes of `peggypy.compiler.passes`,
+	and returns the fastest time of each pass, by stage, and of the whole
+	compilation, in seconds.
+	"""
+	stage_of = {each_pass.__name__: stage for stage, stage_passes in passes.items() for each_pass in stage_passes}
+	best:dict[str, dict[str, float]] = {stage: {} for stage in passes}
+	best_total = float("inf")
+
+	def record(report:Pass_Report):
+		stage_times = best[stage_of[report.name]]
+		stage_times[report.name] = min(stage_times.get(report.name, report.seconds), report.seconds)
+
+	for _ in range(repeat):
+		ast = grammar.build()
+		start = time.perf_counter()
+		compile_ast_code(
+			ast,
+			[each_pass for stage_passes in passes.values() for each_pass in stage_passes],
+			**options,
+			pass_hook=record
+		)
+		best_total = min(best_total, time.perf_counter() - start)
+
+	return {
+		"stages": {
+			stage: {"passes": stage_times, "seconds": sum(stage_times.values())}
+			for stage, stage_times in best.items()
+		},
+		"seconds": best_total,
+	}
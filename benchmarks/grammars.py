@@ -0,0 +1,523 @@
+"""
+Reference grammars, and generators of synthetic inputs for them.
+
+The grammars are built as syntax trees, so that compiling them measures the
+passes alone and not the grammar parser.
+"""
+import json
+import random
+from dataclasses import dataclass
+from typing import Callable, Union
+
+from peggypy.compiler.utils_and_types.syntax_tree import (
+	Action,
+	Any,
+	Choice,
+	Class,
+	Cursor_Location,
+	Grammar,
+	Group,
+	Labeled,
+	Literal,
+	Location,
+	Named,
+	One_or_More,
+	Optional,
+	Rule,
+	Rule_Ref,
+	Rule_Expression,
+	Sequence,
+	Simple_Not,
+	Text,
+	Zero_or_More,
+)
+
+
+@dataclass
+class Reference_Grammar:
+	name:str
+	build:Callable[[], Grammar]  # a new syntax tree on each call, since the passes mutate it
+	make_input:Callable[[int, random.Random], str]  # an input of at least the given number of characters
+
+
+# Every node gets the same location; none of the reference grammars has errors to report
+def _at() -> Location:
+	return Location(Cursor_Location(0, 1, 1), Cursor_Location(0, 1, 1))
+
+def _rule(name:str, expression:Rule_Expression) -> Rule:
+	return Rule(_at(), expression, name, _at())
+
+def _named(name:str, expression:Rule_Expression) -> Named:
+	return Named(_at(), expression, name)
+
+def _ref(name:str) -> Rule_Ref:
+	return Rule_Ref(_at(), name)
+
+def _lit(value:str, ignoreCase:bool=False) -> Literal:
+	return Literal(_at(), value, ignoreCase)
+
+def _cls(parts:list[Union[str, list[str]]], inverted:bool=False) -> Class:
+	return Class(_at(), parts, inverted, False)
+
+def _seq(*elements:Rule_Expression) -> Sequence:
+	return Sequence(_at(), list(elements))
+
+def _choice(*alternatives:Rule_Expression) -> Choice:
+	return Choice(_at(), list(alternatives))
+
+def _act(expression:Rule_Expression, code:str) -> Action:
+	return Action(_at(), expression, code, _at())
+
+def _label(label:str, expression:Rule_Expression) -> Labeled:
+	return Labeled(_at(), expression, label, _at())
+
+def _text(expression:Rule_Expression) -> Text:
+	return Text(_at(), expression)
+
+def _group(expression:Rule_Expression) -> Group:
+	return Group(_at(), expression)
+
+def _optional(expression:Rule_Expression) -> Optional:
+	return Optional(_at(), expression)
+
+def _star(expression:Rule_Expression) -> Zero_or_More:
+	return Zero_or_More(_at(), expression)
+
+def _plus(expression:Rule_Expression) -> One_or_More:
+	return One_or_More(_at(), expression)
+
+def _not(expression:Rule_Expression) -> Simple_Not:
+	return Simple_Not(_at(), expression)
+
+def _any() -> Any:
+	return Any(_at())
+
+def _grammar(*rules:Rule) -> Grammar:
+	return Grammar(_at(), None, None, list(rules))
+
+
+def arithmetic() -> Grammar:
+	"""The arithmetic example from the peggy documentation, without division"""
+	return _grammar(
+		_rule("Expression", _act(
+			_seq(
+				_label("head", _ref("Term")),
+				_label("tail", _star(_group(_seq(_ref("_"), _choice(_lit("+"), _lit("-")), _ref("_"), _ref("Term"))))),
+			),
+			"""
+			result = head
+			for element in tail:
+				result = result + element[3] if element[1] == "+" else result - element[3]
+			return result
+			""",
+		)),
+		_rule("Term", _act(
+			_seq(
+				_label("head", _ref("Factor")),
+				_label("tail", _star(_group(_seq(_ref("_"), _lit("*"), _ref("_"), _ref("Factor"))))),
+			),
+			"""
+			result = head
+			for element in tail:
+				result *= element[3]
+			return result
+			""",
+		)),
+		_rule("Factor", _choice(
+			_act(_seq(_lit("("), _ref("_"), _label("expr", _ref("Expression")), _ref("_"), _lit(")")), "return expr"),
+			_ref("Integer"),
+		)),
+		_rule("Integer", _named("integer", _act(_plus(_cls([["0", "9"]])), "return int(text())"))),
+		_rule("_", _named("whitespace", _star(_cls([" ", "\t", "\n", "\r"])))),
+	)
+
+
+def arithmetic_input(size:int, rng:random.Random) -> str:
+	parts:list[str] = []
+	length = 0
+	while length < size:
+		if rng.random() < 0.2:
+			term = f"({rng.randint(0, 999)} {rng.choice('+-')} {rng.randint(0, 999)})"
+		else:
+			term = "*".join(str(rng.randint(0, 99)) for _ in range(rng.randint(1, 3)))
+		parts.append(term)
+		length += len(term) + 3
+	return parts[0] + "".join(f" {rng.choice('+-')} {term}" for term in parts[1:])
+
+
+def json_() -> Grammar:
+	"""JSON as in RFC 8259"""
+	ws = lambda: _ref("ws")
+	return _grammar(
+		_rule("JSON_text", _act(_seq(ws(), _label("value", _ref("value")), ws()), "return value")),
+		_rule("begin_array", _seq(ws(), _lit("["), ws())),
+		_rule("begin_object", _seq(ws(), _lit("{"), ws())),
+		_rule("end_array", _seq(ws(), _lit("]"), ws())),
+		_rule("end_object", _seq(ws(), _lit("}"), ws())),
+		_rule("name_separator", _seq(ws(), _lit(":"), ws())),
+		_rule("value_separator", _seq(ws(), _lit(","), ws())),
+		_rule("ws", _named("whitespace", _star(_cls([" ", "\t", "\n", "\r"])))),
+		_rule("value", _choice(
+			_ref("false"), _ref("null"), _ref("true"), _ref("object"), _ref("array"), _ref("number"), _ref("string"),
+		)),
+		_rule("false", _act(_lit("false"), "return False")),
+		_rule("null", _act(_lit("null"), "return None")),
+		_rule("true", _act(_lit("true"), "return True")),
+		_rule("object", _act(
+			_seq(
+				_ref("begin_object"),
+				_label("members", _optional(_act(
+					_seq(
+						_label("head", _ref("member")),
+						_label("tail", _star(_act(_seq(_ref("value_separator"), _label("m", _ref("member"))), "return m"))),
+					),
+					"return dict([head] + tail)",
+				))),
+				_ref("end_object"),
+			),
+			"return members if members is not None else {}",
+		)),
+		_rule("member", _act(
+			_seq(_label("name", _ref("string")), _ref("name_separator"), _label("value", _ref("value"))),
+			"return (name, value)",
+		)),
+		_rule("array", _act(
+			_seq(
+				_ref("begin_array"),
+				_label("values", _optional(_act(
+					_seq(
+						_label("head", _ref("value")),
+						_label("tail", _star(_act(_seq(_ref("value_separator"), _label("v", _ref("value"))), "return v"))),
+					),
+					"return [head] + tail",
+				))),
+				_ref("end_array"),
+			),
+			"return values if values is not None else []",
+		)),
+		_rule("number", _named("number", _act(
+			_seq(_optional(_lit("-")), _ref("int"), _optional(_ref("frac")), _optional(_ref("exp"))),
+			"return float(text())",
+		))),
+		_rule("exp", _seq(_lit("e", True), _optional(_cls(["+", "-"])), _plus(_cls([["0", "9"]])))),
+		_rule("frac", _seq(_lit("."), _plus(_cls([["0", "9"]])))),
+		_rule("int", _choice(_lit("0"), _seq(_cls([["1", "9"]]), _star(_cls([["0", "9"]]))))),
+		_rule("string", _named("string", _act(
+			_seq(_lit("\""), _label("chars", _star(_ref("char"))), _lit("\"")),
+			"return \"\".join(chars)",
+		))),
+		_rule("char", _choice(
+			_cls(["\"", "\\", ["\x00", "\x1f"]], inverted=True),
+			_act(
+				_seq(_lit("\\"), _label("c", _choice(
+					_lit("\""),
+					_lit("\\"),
+					_lit("/"),
+					_act(_lit("b"), "return \"\\b\""),
+					_act(_lit("f"), "return \"\\f\""),
+					_act(_lit("n"), "return \"\\n\""),
+					_act(_lit("r"), "return \"\\r\""),
+					_act(_lit("t"), "return \"\\t\""),
+					_act(
+						_seq(_lit("u"), _label("digits", _text(_seq(*(_cls([["0", "9"], ["a", "f"], ["A", "F"]]) for _ in range(4)))))),
+						"return chr(int(digits, 16))",
+					),
+				))),
+				"return c",
+			),
+		)),
+	)
+
+
+def json_input(size:int, rng:random.Random) -> str:
+	def word() -> str:
+		return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz\u00e9\n\"") for _ in range(rng.randint(1, 12)))
+
+	records:list[str] = []
+	length = 0
+	while length < size:
+		record = json.dumps({
+			"id": rng.randint(0, 10**6),
+			"name": word(),
+			"score": rng.random() * 100,
+			"tags": [word() for _ in range(rng.randint(0, 4))],
+			"active": rng.random() < 0.5,
+			"parent": None,
+			"position": {"x": rng.randint(-500, 500), "y": rng.uniform(-1, 1)},
+		}, indent=rng.choice([None, 2]))
+		records.append(record)
+		length += len(record) + 2
+	return "[" + ", ".join(records) + "]"
+
+
+def csv() -> Grammar:
+	"""Comma separated values as in RFC 4180, to a list of lists of fields"""
+	return _grammar(
+		_rule("file", _act(
+			_seq(
+				_label("head", _ref("record")),
+				_label("tail", _star(_act(_seq(_ref("newline"), _label("r", _ref("record"))), "return r"))),
+			),
+			"return [head] + tail",
+		)),
+		_rule("record", _act(
+			_seq(
+				_label("head", _ref("field")),
+				_label("tail", _star(_act(_seq(_lit(","), _label("f", _ref("field"))), "return f"))),
+			),
+			"return [head] + tail",
+		)),
+		_rule("field", _choice(_ref("escaped"), _text(_star(_cls([",", "\r", "\n", "\""], inverted=True))))),
+		_rule("escaped", _act(
+			_seq(
+				_lit("\""),
+				_label("chars", _star(_choice(_cls(["\""], inverted=True), _act(_lit("\"\""), "return '\"'")))),
+				_lit("\""),
+			),
+			"return \"\".join(chars)",
+		)),
+		_rule("newline", _choice(_lit("\r\n"), _lit("\n"))),
+	)
+
+
+def csv_input(size:int, rng:random.Random) -> str:
+	def field() -> str:
+		kind = rng.random()
+		if kind < 0.4:
+			return str(rng.randint(0, 10**6))
+		if kind < 0.8:
+			return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(rng.randint(0, 16)))
+		return "\"" + "".join(rng.choice("abc, \n\"").replace("\"", "\"\"") for _ in range(rng.randint(0, 16))) + "\""
+
+	columns = 8
+	rows:list[str] = []
+	length = 0
+	while length < size:
+		row = ",".join(field() for _ in range(columns))
+		rows.append(row)
+		length += len(row) + 2
+	return "\r\n".join(rows)
+
+
+def peggy() -> Grammar:
+	"""
+	The syntax of peggy grammars, as in `parser/parser.pegpy`: rules, display
+	names, choices, actions, labels and plucks, prefix and suffix operators,
+	literals, classes, groups, predicates and comments. Initializers and the
+	unicode details of identifiers and escapes are left out.
+	"""
+	__ = lambda: _ref("__")
+	return _grammar(
+		_rule("Grammar", _act(
+			_seq(__(), _label("rules", _plus(_act(_seq(_label("rule", _ref("Rule")), __()), "return rule")))),
+			"return rules",
+		)),
+		_rule("Rule", _act(
+			_seq(
+				_label("name", _ref("IdentifierName")),
+				__(),
+				_label("displayName", _optional(_act(_seq(_label("display", _ref("StringLiteral")), __()), "return display"))),
+				_lit("="),
+				__(),
+				_label("expression", _ref("ChoiceExpression")),
+				_optional(_seq(__(), _lit(";"))),
+			),
+			"return (name, displayName, expression)",
+		)),
+		_rule("ChoiceExpression", _act(
+			_seq(
+				_label("head", _ref("ActionExpression")),
+				_label("tail", _star(_act(
+					_seq(__(), _lit("/"), __(), _label("alternative", _ref("ActionExpression"))),
+					"return alternative",
+				))),
+			),
+			"return (\"choice\", [head] + tail) if len(tail) > 0 else head",
+		)),
+		_rule("ActionExpression", _act(
+			_seq(
+				_label("expression", _ref("SequenceExpression")),
+				_label("code", _optional(_act(_seq(__(), _label("code", _ref("CodeBlock"))), "return code"))),
+			),
+			"return (\"action\", expression, code) if code is not None else expression",
+		)),
+		_rule("SequenceExpression", _act(
+			_seq(
+				_label("head", _ref("LabeledExpression")),
+				_label("tail", _star(_act(_seq(__(), _label("element", _ref("LabeledExpression"))), "return element"))),
+			),
+			"return (\"sequence\", [head] + tail) if len(tail) > 0 else head",
+		)),
+		_rule("LabeledExpression", _choice(
+			_act(
+				_seq(_lit("@"), _label("label", _optional(_ref("LabelColon"))), __(), _label("expression", _ref("PrefixedExpression"))),
+				"return (\"pluck\", label, expression)",
+			),
+			_act(
+				_seq(_label("label", _ref("LabelColon")), __(), _label("expression", _ref("PrefixedExpression"))),
+				"return (\"labeled\", label, expression)",
+			),
+			_ref("PrefixedExpression"),
+		)),
+		_rule("LabelColon", _act(_seq(_label("label", _ref("IdentifierName")), __(), _lit(":")), "return label")),
+		_rule("PrefixedExpression", _choice(
+			_act(
+				_seq(_label("operator", _cls(["$", "&", "!"])), __(), _label("expression", _ref("SuffixedExpression"))),
+				"return (operator, expression)",
+			),
+			_ref("SuffixedExpression"),
+		)),
+		_rule("SuffixedExpression", _choice(
+			_act(
+				_seq(_label("expression", _ref("PrimaryExpression")), __(), _label("operator", _cls(["?", "*", "+"]))),
+				"return (operator, expression)",
+			),
+			_ref("PrimaryExpression"),
+		)),
+		_rule("PrimaryExpression", _choice(
+			_ref("LiteralMatcher"),
+			_ref("CharacterClassMatcher"),
+			_act(_lit("."), "return (\"any\",)"),
+			_ref("RuleReferenceExpression"),
+			_act(
+				_seq(_label("operator", _cls(["&", "!"])), __(), _label("code", _ref("CodeBlock"))),
+				"return (\"semantic\", operator, code)",
+			),
+			_act(
+				_seq(_lit("("), __(), _label("expression", _ref("ChoiceExpression")), __(), _lit(")")),
+				"return (\"group\", expression)",
+			),
+		)),
+		_rule("RuleReferenceExpression", _act(
+			_seq(
+				_label("name", _ref("IdentifierName")),
+				_not(_seq(__(), _optional(_seq(_ref("StringLiteral"), __())), _lit("="))),
+			),
+			"return (\"rule_ref\", name)",
+		)),
+		_rule("LiteralMatcher", _named("literal", _act(
+			_seq(_label("value", _ref("StringLiteral")), _label("ignoreCase", _optional(_lit("i")))),
+			"return (\"literal\", value, ignoreCase is not None)",
+		))),
+		_rule("StringLiteral", _named("string", _choice(
+			_act(_seq(_lit("\""), _label("chars", _text(_star(_ref("DoubleStringCharacter")))), _lit("\"")), "return chars"),
+			_act(_seq(_lit("'"), _label("chars", _text(_star(_ref("SingleStringCharacter")))), _lit("'")), "return chars"),
+		))),
+		_rule("DoubleStringCharacter", _choice(_cls(["\"", "\\", "\n", "\r"], inverted=True), _seq(_lit("\\"), _any()))),
+		_rule("SingleStringCharacter", _choice(_cls(["'", "\\", "\n", "\r"], inverted=True), _seq(_lit("\\"), _any()))),
+		_rule("CharacterClassMatcher", _named("character class", _act(
+			_text(_seq(
+				_lit("["),
+				_optional(_lit("^")),
+				_star(_choice(_cls(["]", "\\", "\n", "\r"], inverted=True), _seq(_lit("\\"), _any()))),
+				_lit("]"),
+				_optional(_lit("i")),
+			)),
+			"return (\"class\", text())",
+		))),
+		_rule("CodeBlock", _named("code block", _act(
+			_seq(_lit("{"), _label("code", _ref("Code")), _lit("}")),
+			"return code",
+		))),
+		_rule("Code", _text(_star(_choice(
+			_plus(_cls(["{", "}"], inverted=True)),
+			_seq(_lit("{"), _ref("Code"), _lit("}")),
+		)))),
+		_rule("IdentifierName", _named("identifier", _text(_seq(
+			_cls([["a", "z"], ["A", "Z"], "_", "$"]),
+			_star(_cls([["a", "z"], ["A", "Z"], ["0", "9"], "_", "$"])),
+		)))),
+		_rule("__", _star(_choice(_plus(_cls([" ", "\t", "\n", "\r"])), _ref("Comment")))),
+		_rule("Comment", _named("comment", _choice(
+			_seq(_lit("//"), _star(_cls(["\n", "\r"], inverted=True))),
+			_seq(_lit("/*"), _star(_seq(_not(_lit("*/")), _any())), _lit("*/")),
+		))),
+	)
+
+
+def peggy_input(size:int, rng:random.Random) -> str:
+	index = 0
+
+	def name() -> str:
+		return rng.choice(["Expression", "Term", "value", "_", "ws", "Identifier"]) + str(rng.randint(0, index))
+
+	def primary(depth:int) -> str:
+		kind = rng.random()
+		if kind < 0.35:
+			return name()
+		if kind < 0.55:
+			return rng.choice(["\"+\"", "'if'i", "\"\\n\"", "\"while\""])
+		if kind < 0.75:
+			return rng.choice(["[a-z]", "[^\\n\\r]", "[0-9a-fA-F]i", "[ \\t]"])
+		if kind < 0.8:
+			return "."
+		if kind < 0.9 and depth < 2:
+			return "(" + choice(depth + 1) + ")"
+		return "&{ return True }"
+
+	def element(depth:int) -> str:
+		result = primary(depth) + rng.choice(["", "", "*", "+", "?"])
+		result = rng.choice(["", "", "", "!", "&", "$"]) + result
+		if rng.random() < 0.3:
+			result = rng.choice(["a", "head", "tail", "value"]) + ":" + result
+		return result
+
+	def choice(depth:int) -> str:
+		alternatives = []
+		for _ in range(rng.randint(1, 3)):
+			alternative = " ".join(element(depth) for _ in range(rng.randint(1, 4)))
+			if depth == 0 and rng.random() < 0.4:
+				alternative += " {\n    return { \"value\": " + name() + " }\n  }"
+			alternatives.append(alternative)
+		return ("\n  / " if depth == 0 else " / ").join(alternatives)
+
+	rules:list[str] = []
+	length = 0
+	while length < size:
+		comment = "// rule " + str(index) + "\n" if rng.random() < 0.2 else ""
+		display = " \"display " + str(index) + "\"" if rng.random() < 0.2 else ""
+		rule = f"{comment}Rule{index}{display}\n  = {choice(0)}\n"
+		rules.append(rule)
+		length += len(rule) + 1
+		index += 1
+	return "\n".join(rules)
+
+
+def synthetic(rule_count:int, rng:random.Random) -> Grammar:
+	"""
+	A grammar of `rule_count` keyword-led rules, for measuring how compile time
+	grows with the number of rules. Rule `i` references its parent and
+	children in a binary heap at random, so references are at most about
+	log2(`rule_count`) deep and the passes that follow them do not hit the
+	recursion limit. Every tenth rule is a proxy of the rule before it, for
+	`removeProxyRules`.
+	"""
+	def alternative(index:int, number:int) -> Rule_Expression:
+		keyword = _lit(f"k{index}_{number}")
+		related = [each for each in (index * 2 + 1, index * 2 + 2, (index - 1) // 2) if 0 <= each < rule_count and each != index]
+		other = _ref(f"r{rng.choice(related)}")
+		shape = rng.randrange(3)
+		if shape == 0:
+			return _seq(keyword, _optional(other))
+		elif shape == 1:
+			return _seq(keyword, _star(_group(_seq(_lit(","), other))))
+		else:
+			return _act(_seq(keyword, _label("value", other)), "return value")
+
+	rules:list[Rule] = []
+	for index in range(rule_count):
+		if index % 10 == 9:
+			rules.append(_rule(f"r{index}", _ref(f"r{index - 1}")))
+		else:
+			rules.append(_rule(f"r{index}", _choice(*(alternative(index, number) for number in range(rng.randint(2, 4))))))
+	return _grammar(*rules)
+
+
+GRAMMARS:dict[str, Reference_Grammar] = {
+	grammar.name: grammar for grammar in [
+		Reference_Grammar("arithmetic", arithmetic, arithmetic_input),
+		Reference_Grammar("json", json_, json_input),
+		Reference_Grammar("csv", csv, csv_input),
+		Reference_Grammar("peggy", peggy, peggy_input),
+	]
+}
@@ -0,0 +1,47 @@
+"""Compile time as the number of rules in a grammar grows"""
+import random
+import time
+from typing import Any
+
+from peggypy.compiler import Pass_Report, compile_ast_code
+from peggypy.compiler.passes import passes
+
+from .grammars import synthetic
+
+
+def measure_scaling(rule_counts:list[int], repeat:int, seed:int, options:dict[str, Any]) -> list[dict[str, Any]]:
+	"""
+	Compiles a `synthetic` grammar of each of `rule_counts` rules, and returns
+	the fastest of `repeat` compilations of each, and of each pass, with the
+	time per rule. The time per rule of a pass stays about the same when the
+	pass takes linear time.
+	"""
+	results:list[dict[str, Any]] = []
+	for rule_count in rule_counts:
+		best = float("inf")
+		best_passes:dict[str, float] = {}
+
+		def record(report:Pass_Report):
+			best_passes[report.name] = min(best_passes.get(report.name, report.seconds), report.seconds)
+
+		for _ in range(repeat):
+			ast = synthetic(rule_count, random.Random(seed))
+			start = time.perf_counter()
+			compile_ast_code(
+				ast,
+				[each_pass for stage_passes in passes.values() for each_pass in stage_passes],
+				**options,
+				pass_hook=record
+			)
+			best = min(best, time.perf_counter() - start)
+
+		results.append({
+			"rules": rule_count,
+			"seconds": best,
+			"us_per_rule": best / rule_count * 1e6,
+			"passes": {
+				name: {"seconds": seconds, "us_per_rule": seconds / rule_count * 1e6}
+				for name, seconds in best_passes.items()
+			},
+		})
+	return results
@@ -0,0 +1,51 @@
+"""Generated parser throughput and memory use"""
+import random
+import time
+import tracemalloc
+from typing import Any
+
+from peggypy.compiler import compile_parser
+from peggypy.compiler.passes import passes
+
+from .grammars import Reference_Grammar
+
+
+def measure_parse(grammar:Reference_Grammar, sizes:list[int], repeat:int, seed:int, options:dict[str, Any]) -> list[dict[str, Any]]:
+	"""
+	Compiles `grammar` once, then for each of `sizes` parses a generated input
+	of about that many characters. Returns, per input, the fastest of `repeat`
+	parses and the peak memory allocated during one more parse.
+	"""
+	parser = compile_parser(
+		grammar.build(),
+		[each_pass for stage_passes in passes.values() for each_pass in stage_passes],
+		**options
+	)
+
+	results:list[dict[str, Any]] = []
+	for size in sizes:
+		input = grammar.make_input(size, random.Random(seed))
+		length = len(input.encode("utf-8"))
+
+		best = float("inf")
+		for _ in range(repeat):
+			start = time.perf_counter()
+			parser.parse(input)
+			best = min(best, time.perf_counter() - start)
+
+		# traced separately, since tracing slows allocation down
+		tracemalloc.start()
+		try:
+			parser.parse(input)
+			_, peak = tracemalloc.get_traced_memory()
+		finally:
+			tracemalloc.stop()
+
+		results.append({
+			"size": size,
+			"bytes": length,
+			"seconds": best,
+			"mb_per_s": length / 1e6 / best,
+			"peak_allocated_bytes": peak,
+		})
+	return results
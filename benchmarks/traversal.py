@@ -0,0 +1,49 @@
+"""Syntax tree traversal overhead of the compiler passes"""
+import random
+import time
+from typing import Any
+
+from peggypy.compiler.utils_and_types.visitor import Visitor, Walker
+from peggypy.compiler.passes import passes
+
+from .grammars import synthetic
+
+
+_noop_visitor = Visitor({})
+_noop_walker = Walker()
+
+
+def measure_traversal(rule_counts:list[int], repeat:int, seed:int, options:dict[str, Any]) -> list[dict[str, Any]]:
+	"""
+	For a `synthetic` grammar of each of `rule_counts` rules, returns the
+	fastest of `repeat` runs of a `Visitor` and a `Walker` that visit every
+	node and do nothing else, and of the check and transform passes, which
+	are mostly traversal.
+	"""
+	results:list[dict[str, Any]] = []
+	for rule_count in rule_counts:
+		best_visitor = best_walker = best_passes = float("inf")
+		for _ in range(repeat):
+			ast = synthetic(rule_count, random.Random(seed))
+
+			start = time.perf_counter()
+			_noop_visitor.visit(ast, {})
+			best_visitor = min(best_visitor, time.perf_counter() - start)
+
+			start = time.perf_counter()
+			_noop_walker.walk(ast)
+			best_walker = min(best_walker, time.perf_counter() - start)
+
+			pass_options = {**options, "allowed_start_rules":[ast.rules[0].name]}
+			start = time.perf_counter()
+			for each_pass in passes["check"] + passes["transform"]:
+				each_pass(ast, pass_options)
+			best_passes = min(best_passes, time.perf_counter() - start)
+
+		results.append({
+			"rules": rule_count,
+			"visitor_seconds": best_visitor,
+			"walker_seconds": best_walker,
+			"passes_seconds": best_passes,
+		})
+	return results
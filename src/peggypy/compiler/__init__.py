@@ -1,9 +1,15 @@
 
 
 
+from types import ModuleType
 from typing import Any, Callable
 
+from .bytecode_interpreter import BytecodeParser
+from .generate_py import generatePY
+from .pass_hooks import Pass_Report, Pass_Table, run_passes_with_hook
+from .parse_many import Parse_Failure, parse_many
 from .utils_and_types.syntax_tree import Grammar
+from ..parser_cache import compile_source, load_module
 
 
 def compile_ast_code(ast:Grammar, passes:list[Callable[..., Any]], **options:Any) -> str:
@@ -12,6 +18,9 @@ def compile_ast_code(ast:Grammar, passes:list[Callable[..., Any]], **options:Any
 	if the AST contains a semantic error. Note that not all errors are detected
 	during the generation and some may protrude to the generated parser and
 	cause its malfunction.
+
+	If `options["pass_hook"]` is given, it is called with a `Pass_Report` after
+	each pass. `Pass_Table` is a hook that prints the reports as a table.
 	"""
 
 	if "allowed_start_rules" not in options or options["allowed_start_rules"] is None:
@@ -29,19 +38,36 @@ def compile_ast_code(ast:Grammar, passes:list[Callable[..., Any]], **options:Any
 		if not rule in allRules:
 			raise Exception(f'Unknown start rule "{rule}"')
 		
-	for each_pass in passes:
+	pass_hook = options.get("pass_hook", None)
+	if pass_hook is None:
+		for each_pass in passes:
 			# mutates ast
 			each_pass(ast, options)
+	else:
+		run_passes_with_hook(ast, passes, options, pass_hook)
 
 	# TODO: is this right? if not go back and check the definition of Grammar.
 	#   Maybe ast is not actually a grammar by this point... I think it has been mutated.
 	return ast.code if ast.code is not None else "" 
 
 
-def compile_parser(ast:Grammar, passes:list[Callable[..., Any]], **options:Any) -> Callable[..., Any]:
-	return eval(
-		compile_ast_code(ast, passes, **options)
-	)
+def compile_parser(ast:Grammar, passes:list[Callable[..., Any]], **options:Any) -> ModuleType:
+	"""
+	Generates a parser and executes it as a new module. The module exposes
+	`parse(input, options)` and the `SyntaxError` raised by it.
+	"""
+	return load_module(compile_source(compile_ast_code(ast, passes, **options)))
+
+
+def compile_interpreter(ast:Grammar, passes:list[Callable[..., Any]], **options:Any) -> BytecodeParser:
+	"""
+	Runs the passes and loads the resulting bytecode into a `BytecodeParser`,
+	skipping code generation. `passes` may be the full list, ending in
+	`generatePY`; that pass is left out, and every other pass, including the
+	ones that rewrite the bytecode such as `optimize_bytecode`, is run.
+	"""
+	compile_ast_code(ast, [each_pass for each_pass in passes if each_pass is not generatePY], **options)
+	return BytecodeParser(ast, options)
 
 
 def compile_to_source(ast:Grammar, passes:list[Callable[..., Any]], **options:Any) -> str:
@@ -4,11 +4,13 @@ from .utils_and_types.syntax_tree import (
 	Choice,
 	Grammar,
 	Node,
+	Rule,
 	Rule_Ref,
 	Sequence,
 	Literal
 )
 from .utils_and_types.visitor import Visitor
+from .utils_and_types.rules import collect_rule_refs_walker
 
 
 
@@ -32,7 +34,8 @@ def consumesLiteral(self:Visitor, node:Literal, options:dict[str, Any]):
 	return node.value != ""
 
 def consumesRuleRef(self:Visitor, node:Rule_Ref, options:dict[str, Any]) -> bool:
-		return self.visit(options["grammar"].findRule(node.name), options)
+	# undefined rules are reported by `report_undefined_rules`
+	return options["rules_consume"].get(node.name, False)
 
 
 always_consumes_on_success_visitor = Visitor({
@@ -51,5 +54,42 @@ always_consumes_on_success_visitor = Visitor({
 })
 
 
+def infer_rules_consume(grammar:Grammar) -> dict[str, bool]:
+	"""
+	Whether each rule always consumes input when it succeeds, by rule name.
+
+	Every rule starts out as not consuming, and a worklist re-checks the
+	rules that reference a rule whenever it is found to consume, until
+	nothing changes. Each rule is re-checked at most once per rule it
+	references, rather than each reference visiting the referenced rule again.
+	Rules that only consume through left recursion stay not consuming.
+	"""
+	rules_consume = {rule.name: False for rule in grammar.rules}
+	users:dict[str, list[Rule]] = {rule.name: [] for rule in grammar.rules}
+	for rule in grammar.rules:
+		refs:set[str] = set()
+		collect_rule_refs_walker.walk(rule, refs)
+		for name in refs:
+			if name in users:
+				users[name].append(rule)
+
+	context = {"rules_consume":rules_consume}
+	pending = list(grammar.rules)
+	while len(pending) > 0:
+		rule = pending.pop()
+		if rules_consume[rule.name] or not always_consumes_on_success_visitor.visit(rule, context):
+			continue
+		rules_consume[rule.name] = True
+		pending.extend(user for user in users[rule.name] if not rules_consume[user.name])
+	return rules_consume
+
+
 def always_consumes_on_success(grammar:Grammar, node:Node, options:dict[str, Any]) -> bool:
-	return always_consumes_on_success_visitor.visit(node, {**options, "grammar":grammar})
+	"""
+	Whether `node` always consumes input when it succeeds. The facts about
+	each rule are inferred on first use and kept in `grammar.rules_consume`,
+	so that every pass asking about the same grammar shares them.
+	"""
+	if grammar.rules_consume is None:
+		grammar.rules_consume = infer_rules_consume(grammar)
+	return always_consumes_on_success_visitor.visit(node, {"rules_consume":grammar.rules_consume})
@@ -0,0 +1,650 @@
+import re
+import textwrap
+from array import array
+from bisect import bisect_right
+from typing import Any, Callable, Optional
+
+from .parser_runtime import DefaultTracer, ParserSyntaxError, dedentCode
+from .utils_and_types.opcodes import opcodes as op
+from .utils_and_types.rules import isCached
+from .utils_and_types.syntax_tree import Grammar
+from .utils_and_types.utils import literalSetRegexp, regexpClassEscape
+
+
+# Runs the bytecode produced by `generateBytecode` directly, without generating
+# python source for the parser.
+#
+# Each rule's bytecode is kept as an `array("i")`, then pre-decoded once into a
+# flat list of instruction tuples. The first item of every tuple is the handler
+# for that instruction, taken from `DISPATCH` at decode time, so the inner loop
+# is just
+#
+#        ins = code[ip]
+#        ip  = ins[0](machine, ins, ip)
+#
+# The nested |IF t, f| / |WHILE_NOT_ERROR b| blocks of the bytecode are
+# flattened into absolute jump targets while decoding:
+#
+#   IF t, f  <then>  <else>      ->   (IF, else_ip)  <then>  (JUMP, end_ip)  <else>
+#   WHILE_NOT_ERROR b  <body>    ->   (WHILE_NOT_ERROR, end_ip)  <body>  (JUMP, loop_ip)
+#
+# Only action and predicate code blocks (and the initializers) are compiled,
+# since they are python source supplied by the grammar.
+
+
+FAILED = object()
+
+
+class _Machine:
+	"""The state of one call to `BytecodeParser.parse`"""
+	__slots__ = (
+		"parser",
+		"input",
+		"options",
+		"source",
+		"stack",
+		"currPos",
+		"savedPos",
+		"silentFails",
+		"maxFailPos",
+		"maxFailExpected",
+		"lineStarts",
+		"resultsCaches",
+		"cacheSweepPos",
+		"tracer",
+	)
+
+	def __init__(self, parser:"BytecodeParser", input:str, options:dict[str, Any]):
+		self.parser          = parser
+		self.input           = input
+		self.options         = options
+		self.source          = options.get("grammarSource")
+		self.stack:list[Any] = []
+		self.currPos         = 0
+		self.savedPos        = 0
+		self.silentFails     = 0  # 0 = report failures, > 0 = silence failures
+		self.maxFailPos      = 0
+		self.maxFailExpected:list[dict[str, Any]] = []
+		self.lineStarts:Optional[list[int]] = None  # offsets at which each line starts, built on first use
+		self.resultsCaches:list[Optional[dict[int, tuple[int, Any]]]] = [
+			{} if cached else None for cached in parser.cachedRules
+		]
+		self.cacheSweepPos   = parser.cacheWindow or 0
+		self.tracer          = (options["tracer"] if "tracer" in options else DefaultTracer()) if parser.trace else None
+
+	def fail(self, expected:dict[str, Any]):
+		if self.currPos < self.maxFailPos:
+			return
+
+		if self.currPos > self.maxFailPos:
+			self.maxFailPos = self.currPos
+			self.maxFailExpected = []
+
+		self.maxFailExpected.append(expected)
+
+	def computePosDetails(self, pos:int) -> dict[str, int]:
+		if self.lineStarts is None:
+			lineStarts = [0]
+			p = self.input.find("\n")
+			while p != -1:
+				lineStarts.append(p + 1)
+				p = self.input.find("\n", p + 1)
+			self.lineStarts = lineStarts
+
+		line = bisect_right(self.lineStarts, pos)
+
+		return {
+			"line"   : line,
+			"column" : pos - self.lineStarts[line - 1] + 1,
+		}
+
+	def computeLocation(self, startPos:int, endPos:int) -> dict[str, Any]:
+		startPosDetails = self.computePosDetails(startPos)
+		endPosDetails   = self.computePosDetails(endPos)
+
+		return {
+			"source" : self.source,
+			"start"  : {
+				"offset" : startPos,
+				"line"   : startPosDetails["line"],
+				"column" : startPosDetails["column"],
+			},
+			"end"    : {
+				"offset" : endPos,
+				"line"   : endPosDetails["line"],
+				"column" : endPosDetails["column"],
+			},
+		}
+
+	def sweepResultsCache(self, pos:int):
+		horizon = pos - self.parser.cacheWindow
+		for cache in self.resultsCaches:
+			if cache is not None:
+				stale = [key for key in cache if key < horizon]
+				for key in stale:
+					del cache[key]
+		self.cacheSweepPos = pos + self.parser.cacheWindow
+
+	def parseRule(self, index:int) -> Any:
+		tracer = self.tracer
+		name   = self.parser.ruleNames[index]
+		startPos = self.currPos
+
+		if tracer is not None:
+			tracer.trace({
+				"type"     : "rule.enter",
+				"rule"     : name,
+				"location" : self.computeLocation(startPos, startPos),
+			})
+
+		cache = self.resultsCaches[index]
+		if cache is not None:
+			if self.parser.cacheWindow is not None and startPos >= self.cacheSweepPos:
+				self.sweepResultsCache(startPos)
+			cached = cache.get(startPos)
+			if cached is not None:
+				self.currPos = cached[0]
+				if tracer is not None:
+					self.traceResult(name, startPos, cached[1])
+				return cached[1]
+
+		stack = self.stack
+		base  = len(stack)
+		code  = self.parser.programs[index]
+		end   = len(code)
+		ip    = 0
+		while ip < end:
+			ins = code[ip]
+			ip  = ins[0](self, ins, ip)
+		result = stack[base]
+		del stack[base:]
+
+		if cache is not None:
+			cache[startPos] = (self.currPos, result)
+
+		if tracer is not None:
+			self.traceResult(name, startPos, result)
+
+		return result
+
+	def traceResult(self, name:str, startPos:int, result:Any):
+		assert self.tracer is not None
+		if result is not FAILED:
+			self.tracer.trace({
+				"type"     : "rule.match",
+				"rule"     : name,
+				"result"   : result,
+				"location" : self.computeLocation(startPos, self.currPos),
+			})
+		else:
+			self.tracer.trace({
+				"type"     : "rule.fail",
+				"rule"     : name,
+				"location" : self.computeLocation(startPos, startPos),
+			})
+
+
+# Instruction handlers. Each receives the machine, the decoded instruction tuple
+# and its index, and returns the index of the next instruction to run.
+
+Handler = Callable[[_Machine, tuple[Any, ...], int], int]
+
+def _push_empty_string(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.append("")
+	return ip + 1
+
+def _push_none(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.append(None)
+	return ip + 1
+
+def _push_failed(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.append(FAILED)
+	return ip + 1
+
+def _push_empty_array(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.append([])
+	return ip + 1
+
+def _push_curr_pos(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.append(m.currPos)
+	return ip + 1
+
+def _pop(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.pop()
+	return ip + 1
+
+def _pop_curr_pos(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.currPos = m.stack.pop()
+	return ip + 1
+
+def _pop_n(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	del m.stack[-ins[1]:]
+	return ip + 1
+
+def _nip(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	stack = m.stack
+	value = stack.pop()
+	stack[-1] = value
+	return ip + 1
+
+def _append(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	stack = m.stack
+	value = stack.pop()
+	stack[-1].append(value)
+	return ip + 1
+
+def _wrap(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	stack = m.stack
+	n = ins[1]
+	if n > 0:
+		value = stack[-n:]
+		del stack[-n:]
+	else:
+		value = []
+	stack.append(value)
+	return ip + 1
+
+def _text(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	stack = m.stack
+	stack.append(m.input[stack.pop():m.currPos])
+	return ip + 1
+
+def _pluck(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	stack  = m.stack
+	params = ins[2]
+	if len(params) == 1:
+		value = stack[-1 - params[0]]
+	else:
+		value = [stack[-1 - p] for p in params]
+	del stack[-ins[1]:]
+	stack.append(value)
+	return ip + 1
+
+def _if(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ip + 1 if m.stack[-1] else ins[1]
+
+def _if_error(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ip + 1 if m.stack[-1] is FAILED else ins[1]
+
+def _if_not_error(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ip + 1 if m.stack[-1] is not FAILED else ins[1]
+
+def _while_not_error(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ip + 1 if m.stack[-1] is not FAILED else ins[1]
+
+def _match_any(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ip + 1 if m.currPos < len(m.input) else ins[1]
+
+def _match_string(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ip + 1 if m.input.startswith(ins[1], m.currPos) else ins[2]
+
+def _match_string_ic(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ip + 1 if m.input[m.currPos:m.currPos + ins[2]].lower() == ins[1] else ins[3]
+
+def _match_char_class(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ip + 1 if ins[1].match(m.input, m.currPos) else ins[2]
+
+def _accept_n(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	n = ins[1]
+	m.stack.append(m.input[m.currPos:m.currPos + n])
+	m.currPos += n
+	return ip + 1
+
+def _accept_string(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.append(ins[1])
+	m.currPos += ins[2]
+	return ip + 1
+
+def _fail(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.append(FAILED)
+	if m.silentFails == 0:
+		m.fail(ins[1])
+	return ip + 1
+
+def _accept_class_run(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	match = ins[1].match(m.input, m.currPos)
+	if match is not None:
+		value = match.group()
+		m.stack.append(value)
+		m.currPos += len(value)
+	else:
+		m.stack.append(FAILED)
+	if m.silentFails == 0:
+		m.fail(ins[2])
+	return ip + 1
+
+def _accept_literal_set(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	match = ins[1].match(m.input, m.currPos)
+	if match is not None:
+		if m.silentFails == 0:
+			for expected in ins[2][:match.lastindex - 1]:
+				m.fail(expected)
+		value = match.group()
+		m.stack.append(value)
+		m.currPos += len(value)
+	else:
+		m.stack.append(FAILED)
+		if m.silentFails == 0:
+			for expected in ins[2]:
+				m.fail(expected)
+	return ip + 1
+
+def _load_saved_pos(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.savedPos = m.stack[-1 - ins[1]]
+	return ip + 1
+
+def _update_saved_pos(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.savedPos = m.currPos
+	return ip + 1
+
+def _call(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	stack = m.stack
+	value = ins[1](*[stack[-1 - p] for p in ins[3]])
+	if ins[2] > 0:
+		del stack[-ins[2]:]
+	stack.append(value)
+	return ip + 1
+
+def _rule(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.stack.append(m.parseRule(ins[1]))
+	return ip + 1
+
+def _silent_fails_on(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.silentFails += 1
+	return ip + 1
+
+def _silent_fails_off(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	m.silentFails -= 1
+	return ip + 1
+
+def _jump(m:_Machine, ins:tuple[Any, ...], ip:int) -> int:
+	return ins[1]
+
+
+DISPATCH:dict[int, Handler] = {
+	op.PUSH_EMPTY_STRING : _push_empty_string,
+	op.PUSH_UNDEFINED    : _push_none,
+	op.PUSH_NULL         : _push_none,
+	op.PUSH_FAILED       : _push_failed,
+	op.PUSH_EMPTY_ARRAY  : _push_empty_array,
+	op.PUSH_CURR_POS     : _push_curr_pos,
+	op.POP               : _pop,
+	op.POP_CURR_POS      : _pop_curr_pos,
+	op.POP_N             : _pop_n,
+	op.NIP               : _nip,
+	op.APPEND            : _append,
+	op.WRAP              : _wrap,
+	op.TEXT              : _text,
+	op.PLUCK             : _pluck,
+	op.IF                : _if,
+	op.IF_ERROR          : _if_error,
+	op.IF_NOT_ERROR      : _if_not_error,
+	op.WHILE_NOT_ERROR   : _while_not_error,
+	op.MATCH_ANY         : _match_any,
+	op.MATCH_STRING      : _match_string,
+	op.MATCH_STRING_IC   : _match_string_ic,
+	op.MATCH_CHAR_CLASS  : _match_char_class,
+	op.ACCEPT_N          : _accept_n,
+	op.ACCEPT_STRING     : _accept_string,
+	op.FAIL              : _fail,
+	op.ACCEPT_CLASS_RUN  : _accept_class_run,
+	op.ACCEPT_LITERAL_SET: _accept_literal_set,
+	op.LOAD_SAVED_POS    : _load_saved_pos,
+	op.UPDATE_SAVED_POS  : _update_saved_pos,
+	op.CALL              : _call,
+	op.RULE              : _rule,
+	op.SILENT_FAILS_ON   : _silent_fails_on,
+	op.SILENT_FAILS_OFF  : _silent_fails_off,
+}
+
+
+class BytecodeParser:
+	"""
+	A parser that interprets the bytecode of a grammar directly. Construct it
+	from a grammar that has been through `generateBytecode`, for example with
+	`compile_interpreter`. The interface matches a generated parser module:
+	`parse(input, options)` raising `SyntaxError` on failure. Only the options
+	of a plain `str` parser are supported; `input_type` other than "str",
+	`streaming`, `profile` and `lazy_expectations` are rejected.
+
+	The state of a running parse is kept on the parser, where the action and
+	predicate code reads it, so a `BytecodeParser` runs one parse at a time.
+	Parses may nest, but threads parsing at once each need their own parser.
+	"""
+
+	SyntaxError = ParserSyntaxError
+	DefaultTracer = DefaultTracer
+
+	def __init__(self, ast:Grammar, options:dict[str, Any]):
+		inputType = options.get("input_type", "str")
+		if inputType not in ("str", "utf-8", "bytes"):
+			raise Exception("input_type must be \"str\", \"utf-8\" or \"bytes\"")
+		if inputType != "str":
+			raise Exception("the bytecode interpreter only supports input_type \"str\"")
+		for option in ("streaming", "profile", "lazy_expectations"):
+			if options.get(option, False):
+				raise Exception(f"the bytecode interpreter does not support {option}")
+
+		self.ruleNames:list[str]          = [rule.name for rule in ast.rules]
+		self.cachedRules:list[bool]       = [isCached(rule, options) for rule in ast.rules]
+		self.cacheWindow:Optional[int]    = options.get("cache_window", None)
+		self.trace:bool                   = options.get("trace", False)
+		allowedStartRules:list[str]       = options.get("allowed_start_rules") or [ast.rules[0].name]
+		self.startRules:dict[str, int]    = {name: ast.indexOfRule(name) for name in allowedStartRules}
+		self.startRule:str                = allowedStartRules[0]
+		self.code:list[array[int]]        = [array("i", rule.bytecode or []) for rule in ast.rules]
+
+		self.literals:list[str]                   = ast.literals
+		self.classes:list[re.Pattern[str]]        = [self.buildRegexp(cls) for cls in ast.classes]
+		self.expectations:list[dict[str, Any]]    = [self.buildExpectation(e) for e in ast.expectations]
+		self.literalSets:list[tuple[re.Pattern[str], tuple[dict[str, Any], ...]]] = [
+			(
+				re.compile(literalSetRegexp(literalSet["value"], literalSet["ignoreCase"])),
+				tuple(self.expectations[e] for e in literalSet["expected"])
+			)
+			for literalSet in ast.literalSets
+		]
+
+		# Action and predicate code gets the same helpers as it would in a
+		# generated parser. They read the state of the innermost running parse.
+		self.machine:Optional[_Machine] = None
+		self.namespace:dict[str, Any]   = {
+			"text"     : lambda: self.running().input[self.running().savedPos:self.running().currPos],
+			"offset"   : lambda: self.running().savedPos,
+			"range"    : lambda: {"source": self.running().source, "start": self.running().savedPos, "end": self.running().currPos},
+			"location" : lambda: self.running().computeLocation(self.running().savedPos, self.running().currPos),
+			"expected" : self.expected,
+			"error"    : self.error,
+		}
+		if ast.top_level_initializer is not None:
+			exec(dedentCode(ast.top_level_initializer.code), self.namespace)
+		self.initializer = (
+			compile(dedentCode(ast.initializer.code), "<initializer>", "exec")
+			if ast.initializer is not None else None
+		)
+		self.functions:list[Callable[..., Any]] = self.buildFunctions(ast.functions)
+
+		self.programs:list[list[tuple[Any, ...]]] = [self.decode(code) for code in self.code]
+
+	@staticmethod
+	def buildRegexp(cls:dict[str, Any]) -> re.Pattern[str]:
+		return re.compile(
+			"["
+			+ ("^" if cls["inverted"] else "")
+			+ "".join(
+				regexpClassEscape(part[0]) + "-" + regexpClassEscape(part[1])
+				if isinstance(part, list) else
+				regexpClassEscape(part)
+				for part in cls["value"]
+			)
+			+ "]"
+			+ cls.get("run", ""),
+			re.IGNORECASE if cls["ignoreCase"] else 0
+		)
+
+	@staticmethod
+	def buildExpectation(e:dict[str, Any]) -> dict[str, Any]:
+		if e["type"] == "rule":
+			return {"type": "other", "description": e["value"]}
+		elif e["type"] == "literal":
+			return {"type": "literal", "text": e["value"], "ignoreCase": e["ignoreCase"]}
+		elif e["type"] == "class":
+			return {"type": "class", "parts": e["value"], "inverted": e["inverted"], "ignoreCase": e["ignoreCase"]}
+		elif e["type"] == "any":
+			return {"type": "any"}
+		else:
+			raise Exception(f"Unknown expectation type ({e})")
+
+	def buildFunctions(self, functions:list[dict[str, Any]]) -> list[Callable[..., Any]]:
+		source = "\n".join(
+			f"def peg_f{i}({', '.join(a['params'])}):\n" + textwrap.indent(dedentCode(a["body"]), "    ")
+			for i, a in enumerate(functions)
+		)
+		exec(compile(source, "<actions>", "exec"), self.namespace)
+		return [self.namespace[f"peg_f{i}"] for i in range(len(functions))]
+
+	def decode(self, bc:"array[int]") -> list[tuple[Any, ...]]:
+		"""Pre-decodes the bytecode of one rule into flat instruction tuples with absolute jump targets"""
+		program:list[tuple[Any, ...]] = []
+
+		def block(ip:int, end:int):
+			while ip < end:
+				opcode = bc[ip]
+				handler = DISPATCH[opcode]
+
+				if opcode in (op.IF, op.IF_ERROR, op.IF_NOT_ERROR, op.MATCH_ANY):
+					ip = condition(ip, 0, lambda target: (handler, target))
+
+				elif opcode == op.MATCH_STRING:
+					literal = self.literals[bc[ip + 1]]
+					ip = condition(ip, 1, lambda target: (handler, literal, target))
+
+				elif opcode == op.MATCH_STRING_IC:
+					literal = self.literals[bc[ip + 1]]
+					ip = condition(ip, 1, lambda target: (handler, literal, len(literal), target))
+
+				elif opcode == op.MATCH_CHAR_CLASS:
+					regexp = self.classes[bc[ip + 1]]
+					ip = condition(ip, 1, lambda target: (handler, regexp, target))
+
+				elif opcode == op.WHILE_NOT_ERROR:
+					bodyLength = bc[ip + 1]
+					loop = len(program)
+					program.append((handler, -1))
+					block(ip + 2, ip + 2 + bodyLength)
+					program.append((_jump, loop))
+					program[loop] = (handler, len(program))
+					ip += 2 + bodyLength
+
+				elif opcode in (op.POP_N, op.WRAP, op.ACCEPT_N, op.LOAD_SAVED_POS, op.RULE):
+					program.append((handler, bc[ip + 1]))
+					ip += 2
+
+				elif opcode == op.ACCEPT_STRING:
+					literal = self.literals[bc[ip + 1]]
+					program.append((handler, literal, len(literal)))
+					ip += 2
+
+				elif opcode == op.ACCEPT_CLASS_RUN:
+					program.append((handler, self.classes[bc[ip + 1]], self.expectations[bc[ip + 2]]))
+					ip += 3
+
+				elif opcode == op.ACCEPT_LITERAL_SET:
+					program.append((handler, *self.literalSets[bc[ip + 1]]))
+					ip += 2
+
+				elif opcode == op.FAIL:
+					program.append((handler, self.expectations[bc[ip + 1]]))
+					ip += 2
+
+				elif opcode == op.PLUCK:
+					paramsLength = bc[ip + 2]
+					program.append((handler, bc[ip + 1], tuple(bc[ip + 3:ip + 3 + paramsLength])))
+					ip += 3 + paramsLength
+
+				elif opcode == op.CALL:
+					paramsLength = bc[ip + 3]
+					program.append((handler, self.functions[bc[ip + 1]], bc[ip + 2], tuple(bc[ip + 4:ip + 4 + paramsLength])))
+					ip += 4 + paramsLength
+
+				else:
+					program.append((handler,))
+					ip += 1
+
+		def condition(ip:int, argCount:int, build:Callable[[int], tuple[Any, ...]]) -> int:
+			baseLength = argCount + 3
+			thenLength = bc[ip + baseLength - 2]
+			elseLength = bc[ip + baseLength - 1]
+			test = len(program)
+			program.append(())
+			block(ip + baseLength, ip + baseLength + thenLength)
+			if elseLength > 0:
+				jump = len(program)
+				program.append(())
+				program[test] = build(len(program))
+				block(ip + baseLength + thenLength, ip + baseLength + thenLength + elseLength)
+				program[jump] = (_jump, len(program))
+			else:
+				program[test] = build(len(program))
+			return ip + baseLength + thenLength + elseLength
+
+		block(0, len(bc))
+		return program
+
+	def running(self) -> _Machine:
+		if self.machine is None:
+			raise Exception("Parser helper functions may only be called from within a running parse")
+		return self.machine
+
+	def expected(self, description:str, location:Optional[dict[str, Any]]=None):
+		m = self.running()
+		location = location if location is not None else m.computeLocation(m.savedPos, m.currPos)
+		raise ParserSyntaxError(
+			ParserSyntaxError.buildMessage([{"type": "other", "description": description}], m.input[m.savedPos:m.currPos]),
+			[{"type": "other", "description": description}],
+			m.input[m.savedPos:m.currPos],
+			location
+		)
+
+	def error(self, message:str, location:Optional[dict[str, Any]]=None):
+		m = self.running()
+		location = location if location is not None else m.computeLocation(m.savedPos, m.currPos)
+		raise ParserSyntaxError(message, None, None, location)
+
+	def parse(self, input:str, options:Optional[dict[str, Any]]=None) -> Any:
+		options = options if options is not None else {}
+
+		startRule = options.get("startRule", self.startRule)
+		if startRule not in self.startRules:
+			raise Exception("Can't start parsing from rule \"" + startRule + "\".")
+
+		m = _Machine(self, input, options)
+
+		# Parses may nest (an action may call `parse` again), so restore the
+		# outer parse's state once this one finishes.
+		outer = self.machine, self.namespace.get("input"), self.namespace.get("options")
+		self.machine = m
+		self.namespace["input"]   = input
+		self.namespace["options"] = options
+		try:
+			if self.initializer is not None:
+				exec(self.initializer, self.namespace)
+
+			result = m.parseRule(self.startRules[startRule])
+		finally:
+			self.machine, self.namespace["input"], self.namespace["options"] = outer
+
+		if result is not FAILED and m.currPos == len(input):
+			return result
+
+		if result is not FAILED and m.currPos < len(input):
+			m.fail({"type": "end"})
+
+		raise ParserSyntaxError(
+			ParserSyntaxError.buildMessage(m.maxFailExpected, input[m.maxFailPos] if m.maxFailPos < len(input) else None),
+			m.maxFailExpected,
+			input[m.maxFailPos] if m.maxFailPos < len(input) else None,
+			m.computeLocation(m.maxFailPos, m.maxFailPos + 1)
+			if m.maxFailPos < len(input) else
+			m.computeLocation(m.maxFailPos, m.maxFailPos)
+		)
@@ -1,29 +1,50 @@
-
-
-from typing import Any
+from typing import Any, Literal as Typing_Literal, Optional as Typing_Optional, Union, cast
 from .utils_and_types.syntax_tree import (
+	MATCH,
 	Action,
 	Choice,
 	Class,
+	Code,
 	Grammar,
 	Group,
 	Labeled,
+	Literal,
 	Named,
+	Node,
 	One_or_More,
 	Optional,
 	Rule,
+	Rule_Expression,
+	Rule_Ref,
+	Semantic_And,
 	Semantic_Not,
 	Sequence,
 	Simple_And,
 	Simple_Not,
 	Text,
-	Zero_or_More
+	Zero_or_More,
+	Any as st_Any,
+	match_of
 )
-from .utils_and_types.stack import Stack
 from .utils_and_types.visitor import Visitor
+from ..grammar_error import GrammarError
 from .utils_and_types.opcodes import opcodes as op
 
 
+# Choices with at least this many literal alternatives in a row match them with
+# one |ACCEPT_LITERAL_SET|. A regular expression match costs about as much as
+# comparing eight literals one after the other, so for fewer that is faster.
+MIN_LITERAL_SET_SIZE = 8
+
+
+def _constKey(value:Any) -> Any:
+	"""A hashable form of a constant built from dicts, lists and scalars"""
+	if isinstance(value, dict):
+		return tuple((key, _constKey(item)) for key, item in cast(dict[str, Any], value).items())
+	if isinstance(value, list):
+		return tuple(_constKey(item) for item in cast(list[Any], value))
+	return value
+
 
 # Generates bytecode.
 #
@@ -182,6 +203,40 @@ from .utils_and_types.opcodes import opcodes as op
 #        stack.push(FAILED);
 #        fail(expectations[e]);
 #
+# [37] ACCEPT_CLASS_RUN c, e
+#
+#        match = classes[c].exec(input.substring(currPos));  // c is a "run" class: [...]* or [...]+
+#        if (match) {
+#          stack.push(match[0]);
+#          currPos += match[0].length;
+#        } else {
+#          stack.push(FAILED);
+#        }
+#        fail(expectations[e]);
+#
+#      Generated for `$([...]*)` and `$([...]+)`. It consumes the whole run with
+#      one regular expression match instead of looping per character, and
+#      reports the same failure the last (failing) repetition would have.
+#
+# [38] ACCEPT_LITERAL_SET s
+#
+#        match = literalSets[s].exec(input.substring(currPos));  // ordered alternation of literals
+#        if (match) {
+#          // the literals before the one that matched
+#          literalSets[s].expected.slice(0, match.index).forEach(fail);
+#          stack.push(match[0]);
+#          currPos += match[0].length;
+#        } else {
+#          literalSets[s].expected.forEach(fail);
+#          stack.push(FAILED);
+#        }
+#
+#      Generated for a run of `MIN_LITERAL_SET_SIZE` or more alternatives of a
+#      choice that are each a literal, with the same case-sensitivity. Rather
+#      than comparing each literal in turn, one regular expression match finds
+#      the first that matches, and reports the same failures the literals
+#      before it would have.
+#
 # Calls
 # -----
 #
@@ -232,173 +287,209 @@ from .utils_and_types.opcodes import opcodes as op
 #          need to add a check for |FAILED|, because it is impossible
 #
 # To handle the situation, when the |inferenceMatchResult| has not run (that
-# happens, for example, in tests), the |match| value extracted using the
-# `|0` trick, which performing cast of any value to an integer with value `0`
-# that is equivalent of an unknown match result and signals the generator that
-# runtime check for the |FAILED| is required. Trick is explained on the
-# Wikipedia page (https://en.wikipedia.org/wiki/Asm.js#Code_generation)
+# happens, for example, in tests), the |match| value is read with `match_of`,
+# which treats a missing (`None`) result as `MATCH.SOMETIMES`. That is
+# equivalent of an unknown match result and signals the generator that
+# runtime check for the |FAILED| is required.
 def generateBytecode(grammar:Grammar, options:dict[str, Any]):
 
-	literals     = []
-	classes      = []
-	expectations = []
-	functions    = []
-
-	def addLiteralConst(value):
-		if value in literals:
-			return literals.index(value)
-		else:
-			literals.append(value)
-			return len(literals) - 1
-	
-
-	def addClassConst(node:Class):
-		cls = {
-			"value": node.parts,
-			"inverted": node.inverted,
-			"ignoreCase": node.ignoreCase,
+	literals:list[str]                = []
+	classes:list[dict[str, Any]]      = []
+	literalSets:list[dict[str, Any]]  = []
+	expectations:list[dict[str, Any]] = []
+	functions:list[dict[str, Any]]    = []
+
+	# With `input_type == "bytes"` the parser matches bytes. A character in a
+	# literal or class stands for the byte with the same value (as in latin-1),
+	# and only ASCII letters are folded when ignoring case.
+	bytesMode = options.get("input_type", "str") == "bytes"
+
+	def checkBytes(node:Node, chars:str, kind:str):
+		if bytesMode and any(ord(ch) > 0xFF for ch in chars):
+			raise GrammarError(
+				f"{kind} contains characters above \"\\xFF\", which cannot be matched against bytes input",
+				node.location
+			)
+
+	def lowerCase(value:str) -> str:
+		if bytesMode:
+			return "".join(chr(ord(ch) + 32) if "A" <= ch <= "Z" else ch for ch in value)
+		return value.lower()
+
+	# Each pool is indexed by a hashable key of its constants, so that adding
+	# a constant that is already in the pool is a dictionary lookup.
+	literalIndices:dict[str, int]       = {}
+	classIndices:dict[Any, int]         = {}
+	literalSetIndices:dict[Any, int]    = {}
+	expectationIndices:dict[Any, int]   = {}
+	functionIndices:dict[Any, int]      = {}
+
+	def addConst(pool:list[Any], indices:dict[Any, int], key:Any, value:Any) -> int:
+		index = indices.get(key)
+		if index is None:
+			index = indices[key] = len(pool)
+			pool.append(value)
+		return index
+
+
+	def addLiteralConst(value:str) -> int:
+		return addConst(literals, literalIndices, value, value)
+
+
+	def addClassConst(node:Class, run:Typing_Optional[Typing_Literal["*", "+"]]=None) -> int:
+		cls:dict[str, Any] = {
+			"value"      : node.parts,
+			"inverted"   : node.inverted,
+			"ignoreCase" : node.ignoreCase,
 		}
-		# TODO
-		pattern = JSON.stringify(cls)
-		index = classes.findIndex(lambda c: JSON.stringify(c) == pattern)
-		return index == -1 ? classes.push(cls) - 1 : index
-	
-
-	def addExpectedConst(expected):
-		pattern = JSON.stringify(expected)
-		index = expectations.findIndex(e => JSON.stringify(e) == pattern)
-		return index == -1 ? expectations.push(expected) - 1 : index
-	
-
-	def addFunctionConst(predicate, params, code):
-		func = { predicate, params, body: code };
-		pattern = JSON.stringify(func);
-		index = functions.findIndex(f => JSON.stringify(f) == pattern)
-		return index == -1 ? functions.push(func) - 1 : index
-
-	def cloneEnv(env):
-		clone = {};
-		Object.keys(env).forEach(name => {
-			clone[name] = env[name];
-		})
-		return clone
-	
+		if run is not None:
+			# matches a run of characters of the class, rather than one
+			cls["run"] = run
+		return addConst(classes, classIndices, _constKey(cls), cls)
+
+
+	def addLiteralSetConst(values:list[str], ignoreCase:bool, expected:list[int]) -> int:
+		literalSet = {
+			"value"      : values,
+			"ignoreCase" : ignoreCase,
+			"expected"   : expected,
+		}
+		return addConst(literalSets, literalSetIndices, _constKey(literalSet), literalSet)
+
+
+	def addExpectedConst(expected:dict[str, Any]) -> int:
+		return addConst(expectations, expectationIndices, _constKey(expected), expected)
+
+
+	def addFunctionConst(predicate:bool, params:list[str], code:str) -> int:
+		func = {
+			"predicate" : predicate,
+			"params"    : params,
+			"body"      : code,
+		}
+		return addConst(functions, functionIndices, _constKey(func), func)
+
+
+	def buildSequence(*parts:list[int]) -> list[int]:
+		return [code for part in parts for code in part]
 
-	def buildSequence(first, ...args):
-		return first.concat(...args)
-	
 
-	def buildCondition(match, condCode, thenCode, elseCode):
-		if (match == ALWAYS_MATCH) { return thenCode; }
-		if (match == NEVER_MATCH)  { return elseCode; }
+	def buildCondition(match:MATCH, condCode:list[int], thenCode:list[int], elseCode:list[int]) -> list[int]:
+		if match == MATCH.ALWAYS:
+			return thenCode
+		if match == MATCH.NEVER:
+			return elseCode
+		return condCode + [len(thenCode), len(elseCode)] + thenCode + elseCode
 
-		return condCode.concat(
-			[thenCode.length, elseCode.length],
-			thenCode,
-			elseCode
-		);
-	
 
-	def buildLoop(condCode, bodyCode):
-		return condCode.concat([bodyCode.length], bodyCode)
+	def buildLoop(condCode:list[int], bodyCode:list[int]) -> list[int]:
+		return condCode + [len(bodyCode)] + bodyCode
 
-	def buildCall(functionIndex, delta, env, sp):
-		params = Object.keys(env).map(name => sp - env[name])
-		return [op.CALL, functionIndex, delta, params.length].concat(params)
 
-	def buildSimplePredicate(expression, negative, context):
-		match = expression.match or 0
+	def buildCall(functionIndex:int, delta:int, env:dict[str, int], sp:int) -> list[int]:
+		params = [sp - env_sp for env_sp in env.values()]
+		return [op.CALL, functionIndex, delta, len(params)] + params
+
+
+	def buildSimplePredicate(expression:Node, negative:bool, context:dict[str, Any]) -> list[int]:
+		match = match_of(expression)
 
 		return buildSequence(
 			[op.PUSH_CURR_POS],
 			[op.SILENT_FAILS_ON],
-			generate(expression, {
-				sp: context.sp + 1,
-				env: cloneEnv(context.env),
-				action: None,
+			generate.visit(expression, {
+				"sp"     : context["sp"] + 1,
+				"env"    : context["env"].copy(),
+				"action" : None,
 			}),
 			[op.SILENT_FAILS_OFF],
 			buildCondition(
-				negative ? -match : match,
-				[negative ? op.IF_ERROR : op.IF_NOT_ERROR],
+				match.invert() if negative else match,
+				[op.IF_ERROR if negative else op.IF_NOT_ERROR],
 				buildSequence(
 					[op.POP],
-					[negative ? op.POP : op.POP_CURR_POS],
+					[op.POP if negative else op.POP_CURR_POS],
 					[op.PUSH_UNDEFINED]
 				),
 				buildSequence(
 					[op.POP],
-					[negative ? op.POP_CURR_POS : op.POP],
+					[op.POP_CURR_POS if negative else op.POP],
 					[op.PUSH_FAILED]
 				)
 			)
-		);
-	
+		)
 
-	def buildSemanticPredicate(node, negative, context):
-		functionIndex = addFunctionConst(
-			True, Object.keys(context.env), node.code
-		);
+
+	def buildSemanticPredicate(node:Code, negative:bool, context:dict[str, Any]) -> list[int]:
+		functionIndex = addFunctionConst(True, list(context["env"].keys()), node.code)
 
 		return buildSequence(
 			[op.UPDATE_SAVED_POS],
-			buildCall(functionIndex, 0, context.env, context.sp),
+			buildCall(functionIndex, 0, context["env"], context["sp"]),
 			buildCondition(
-				node.match | 0,
+				match_of(node),
 				[op.IF],
 				buildSequence(
 					[op.POP],
-					negative ? [op.PUSH_FAILED] : [op.PUSH_UNDEFINED]
+					[op.PUSH_FAILED] if negative else [op.PUSH_UNDEFINED]
 				),
 				buildSequence(
 					[op.POP],
-					negative ? [op.PUSH_UNDEFINED] : [op.PUSH_FAILED]
+					[op.PUSH_UNDEFINED] if negative else [op.PUSH_FAILED]
 				)
 			)
 		)
-	
 
-	def buildAppendLoop(expressionCode):
+
+	def buildAppendLoop(expressionCode:list[int]) -> list[int]:
 		return buildLoop(
 			[op.WHILE_NOT_ERROR],
 			buildSequence([op.APPEND], expressionCode)
-		);
-	
-
-
-
-
-
-
-
-
-
-
+		)
 
-	
-	def grammar(self:Visitor, node:Grammar):
-		node.rules.forEach(generate);
 
-		node.literals = literals;
-		node.classes = classes;
-		node.expectations = expectations;
-		node.functions = functions;
-	
+	def classRunOf(node:Node) -> Typing_Optional[tuple[Union[Zero_or_More, One_or_More], Class]]:
+		"""
+		Returns the repetition and the class if `node` is `[...]*` or `[...]+`,
+		so that the text of it can be matched as one run
+		"""
+		while node.type == "group":
+			node = cast(Group, node).expression
+		if node.type not in ("zero_or_more", "one_or_more"):
+			return None
+		repetition = cast(Union[Zero_or_More, One_or_More], node)
+		cls:Node = repetition.expression
+		while cls.type == "group":
+			cls = cast(Group, cls).expression
+		if cls.type != "class" or match_of(cls) != MATCH.SOMETIMES or len(cast(Class, cls).parts) == 0:
+			return None
+		return repetition, cast(Class, cls)
+
+
+	def _grammar(self:Visitor, node:Grammar, context:dict[str, Any]):
+		for rule in node.rules:
+			self.visit(rule, context)
+
+		node.literals     = literals
+		node.classes      = classes
+		node.literalSets  = literalSets
+		node.expectations = expectations
+		node.functions    = functions
+
+
+	def rule(self:Visitor, node:Rule, context:dict[str, Any]):
+		node.bytecode = self.visit(node.expression, {
+			"sp"     : -1,    # Stack pointer
+			"env"    : {},    # Mapping of label names to stack positions
+			"pluck"  : [],    # Fields that have been picked
+			"action" : None,  # Action nodes pass themselves to children here
+		})
 
-	def rule(self:Visitor, node:Rule):
-		node.bytecode = generate(node.expression, {
-			sp: -1,        # Stack pointer
-			env: {},       # Mapping of label names to stack positions
-			pluck: [],     # Fields that have been picked
-			action: None,  # Action nodes pass themselves to children here
-		});
 
-	def named(self:Visitor, node:Named, context):
-		match = node.match | 0;
-		# Expectation not required if node always fail
-		nameIndex = (match == NEVER_MATCH)
-			? None
-			: addExpectedConst({ type: "rule", value: node.name });
+	def named(self:Visitor, node:Named, context:dict[str, Any]) -> list[int]:
+		match = match_of(node)
+		# Expectation not required if node always match
+		nameIndex = None if match == MATCH.ALWAYS else addExpectedConst({"type": "rule", "value": node.name})
 
 		# The code generated below is slightly suboptimal because |FAIL| pushes
 		# to the stack, so we need to stick a |POP| in front of it. We lack a
@@ -406,345 +497,415 @@ def generateBytecode(grammar:Grammar, options:dict[str, Any]):
 		# the stack.
 		return buildSequence(
 			[op.SILENT_FAILS_ON],
-			generate(node.expression, context),
+			self.visit(node.expression, context),
 			[op.SILENT_FAILS_OFF],
-			buildCondition(match, [op.IF_ERROR], [op.FAIL, nameIndex], [])
-		);
-
-	def choice(self:Visitor, node:Choice, context):
-		def buildAlternativesCode(alternatives, context) {
-			match = alternatives[0].match | 0;
-			first = generate(alternatives[0], {
-				sp: context.sp,
-				env: cloneEnv(context.env),
-				action: None,
-			});
+			buildCondition(match.invert(), [op.IF_ERROR], [op.POP, op.FAIL, nameIndex], [])
+		)
+
+
+	def choice(self:Visitor, node:Choice, context:dict[str, Any]) -> list[int]:
+		def literalSetSize(alternatives:list[Rule_Expression]) -> int:
+			"""The number of leading `alternatives` to match with one |ACCEPT_LITERAL_SET|, if any"""
+			size = 0
+			for alternative in alternatives:
+				if (
+					alternative.type != "literal"
+					or len(cast(Literal, alternative).value) == 0
+					or cast(Literal, alternative).ignoreCase != cast(Literal, alternatives[0]).ignoreCase
+					# see `literalSetRegexp`
+					or (cast(Literal, alternative).ignoreCase and not lowerCase(cast(Literal, alternative).value).isascii())
+				):
+					break
+				size += 1
+			return size if size >= MIN_LITERAL_SET_SIZE else 0
+
+		def buildLiteralSet(literals:list[Literal]) -> list[int]:
+			for literal in literals:
+				checkBytes(literal, literal.value, "Literal")
+			ignoreCase = literals[0].ignoreCase
+			setIndex = addLiteralSetConst(
+				[lowerCase(literal.value) if ignoreCase else literal.value for literal in literals],
+				ignoreCase,
+				[
+					addExpectedConst({
+						"type"       : "literal",
+						"value"      : literal.value,
+						"ignoreCase" : literal.ignoreCase,
+					})
+					for literal in literals
+				]
+			)
+			return [op.ACCEPT_LITERAL_SET, setIndex]
+
+		def buildAlternativesCode(alternatives:list[Rule_Expression], context:dict[str, Any]) -> list[int]:
+			setSize = literalSetSize(alternatives)
+			if setSize > 0:
+				match = MATCH.SOMETIMES
+				first = buildLiteralSet(cast(list[Literal], alternatives[:setSize]))
+				rest = alternatives[setSize:]
+			else:
+				match = match_of(alternatives[0])
+				first = self.visit(alternatives[0], {
+					"sp"     : context["sp"],
+					"env"    : context["env"].copy(),
+					"action" : None,
+				})
+				rest = alternatives[1:]
+				dispatch = node.dispatch[len(node.alternatives) - len(alternatives)] if node.dispatch is not None else None
+				if dispatch is not None:
+					# Only try the alternative if it can start with the current character.
+					# Otherwise it would fail here after reporting `expected`, so report
+					# those instead. |FAIL| pushes, so all but the first are popped.
+					firstClass, expected = dispatch
+					first = buildCondition(
+						MATCH.SOMETIMES,
+						[op.MATCH_CHAR_CLASS, addClassConst(firstClass)],
+						first,
+						buildSequence(
+							*([op.FAIL, addExpectedConst(expectation)] + ([op.POP] if index > 0 else []) for index, expectation in enumerate(expected))
+						) if len(expected) > 0 else [op.PUSH_FAILED]
+					)
 			# If an alternative always match, no need to generate code for the next
 			# alternatives. Because their will never tried to match, any side-effects
 			# from next alternatives is impossible so we can skip their generation
-			if (match == ALWAYS_MATCH) {
-				return first;
-			}
+			if match == MATCH.ALWAYS:
+				return first
+
 			# Even if an alternative never match it can have side-effects from
 			# a semantic predicates or an actions, so we can not skip generation
 			# of the first alternative.
 			# We can do that when analysis for possible side-effects will be introduced
 			return buildSequence(
 				first,
-				alternatives.length > 1
-					? buildCondition(
-						SOMETIMES_MATCH,
-						[op.IF_ERROR],
-						buildSequence(
-							[op.POP],
-							buildAlternativesCode(alternatives.slice(1), context)
-						),
-						[]
-					)
-					: []
-			);
-		}
-		return buildAlternativesCode(node.alternatives, context);
-	
-
-	def action(self:Visitor, node:Action, context):
-		env = cloneEnv(context.env);
-		emitCall = node.expression.type != "sequence" or node.expression.elements.length == 0
-		expressionCode = generate(node.expression, {
-			sp: context.sp + (1 if emitCall else 0),
-			env,
-			action: node,
-		});
-		match = node.expression.match | 0;
-		# Function only required if expression can match
-		functionIndex = addFunctionConst(False, Object.keys(env), node.code) if emitCall and match != NEVER_MATCH else None;
-
-		return buildSequence(
-				[op.PUSH_CURR_POS],
-				expressionCode,
 				buildCondition(
-					match,
-					[op.IF_NOT_ERROR],
+					MATCH.SOMETIMES,
+					[op.IF_ERROR],
 					buildSequence(
-						[op.LOAD_SAVED_POS, 1],
-						buildCall(functionIndex, 1, env, context.sp + 2)
+						[op.POP],
+						buildAlternativesCode(rest, context)
 					),
 					[]
+				) if len(rest) > 0 else []
+			)
+
+		return buildAlternativesCode(node.alternatives, context)
+
+
+	def action(self:Visitor, node:Action, context:dict[str, Any]) -> list[int]:
+		env = context["env"].copy()
+		emitCall = node.expression.type != "sequence" or len(cast(Sequence, node.expression).elements) == 0
+		expressionCode = self.visit(node.expression, {
+			"sp"     : context["sp"] + (1 if emitCall else 0),
+			"env"    : env,
+			"action" : node,
+		})
+		match = match_of(node.expression)
+		# Function only required if expression can match
+		functionIndex = addFunctionConst(False, list(env.keys()), node.code) if emitCall and match != MATCH.NEVER else None
+
+		if not emitCall:
+			return expressionCode
+
+		return buildSequence(
+			[op.PUSH_CURR_POS],
+			expressionCode,
+			buildCondition(
+				match,
+				[op.IF_NOT_ERROR],
+				buildSequence(
+					[op.LOAD_SAVED_POS, 1],
+					buildCall(cast(int, functionIndex), 1, env, context["sp"] + 2)
 				),
-				[op.NIP]
-			) if emitCall else expressionCode
-	
+				[]
+			),
+			[op.NIP]
+		)
+
 
-	def sequence(self:Visitor, node:Sequence, context):
-		def buildElementsCode(elements, context) {
-			if (elements.length > 0) {
-				processedCount = node.elements.length - elements.length + 1;
+	def sequence(self:Visitor, node:Sequence, context:dict[str, Any]) -> list[int]:
+		def buildElementsCode(elements:list[Rule_Expression], context:dict[str, Any]) -> list[int]:
+			if len(elements) > 0:
+				processedCount = len(node.elements) - len(elements) + 1
 
 				return buildSequence(
-					generate(elements[0], {
-						sp: context.sp,
-						env: context.env,
-						pluck: context.pluck,
-						action: None,
+					self.visit(elements[0], {
+						"sp"     : context["sp"],
+						"env"    : context["env"],
+						"pluck"  : context["pluck"],
+						"action" : None,
 					}),
 					buildCondition(
-						elements[0].match | 0,
+						match_of(elements[0]),
 						[op.IF_NOT_ERROR],
-						buildElementsCode(elements.slice(1), {
-							sp: context.sp + 1,
-							env: context.env,
-							pluck: context.pluck,
-							action: context.action,
+						buildElementsCode(elements[1:], {
+							"sp"     : context["sp"] + 1,
+							"env"    : context["env"],
+							"pluck"  : context["pluck"],
+							"action" : context["action"],
 						}),
 						buildSequence(
-							processedCount > 1 ? [op.POP_N, processedCount] : [op.POP],
+							[op.POP_N, processedCount] if processedCount > 1 else [op.POP],
 							[op.POP_CURR_POS],
 							[op.PUSH_FAILED]
 						)
 					)
-				);
-			} else {
-				if (context.pluck.length > 0) {
-					return buildSequence(
-						[op.PLUCK, node.elements.length + 1, context.pluck.length],
-						context.pluck.map(eSP => context.sp - eSP)
-					);
-				}
-
-				if (context.action) {
-					functionIndex = addFunctionConst(
-						False,
-						Object.keys(context.env),
-						context.action.code
-					);
-
-					return buildSequence(
-						[op.LOAD_SAVED_POS, node.elements.length],
-						buildCall(
-							functionIndex,
-							node.elements.length + 1,
-							context.env,
-							context.sp
-						)
-					);
-				} else {
-					return buildSequence([op.WRAP, node.elements.length], [op.NIP]);
-				}
-			}
-		}
+				)
+
+			if len(context["pluck"]) > 0:
+				return buildSequence(
+					[op.PLUCK, len(node.elements) + 1, len(context["pluck"])],
+					[context["sp"] - eSP for eSP in context["pluck"]]
+				)
+
+			if context["action"] is not None:
+				functionIndex = addFunctionConst(
+					False,
+					list(context["env"].keys()),
+					context["action"].code
+				)
+
+				return buildSequence(
+					[op.LOAD_SAVED_POS, len(node.elements)],
+					buildCall(
+						functionIndex,
+						len(node.elements) + 1,
+						context["env"],
+						context["sp"]
+					)
+				)
+
+			return buildSequence([op.WRAP, len(node.elements)], [op.NIP])
 
 		return buildSequence(
 			[op.PUSH_CURR_POS],
 			buildElementsCode(node.elements, {
-				sp: context.sp + 1,
-				env: context.env,
-				pluck: [],
-				action: context.action,
+				"sp"     : context["sp"] + 1,
+				"env"    : context["env"],
+				"pluck"  : [],
+				"action" : context["action"],
 			})
-		);
+		)
 
-	def labeled(self:Visitor, node:Labeled, context):
-		let env = context.env;
-		label = node.label;
-		sp = context.sp + 1;
 
-		if (label) {
-			env = cloneEnv(context.env);
-			context.env[node.label] = sp;
-		}
+	def labeled(self:Visitor, node:Labeled, context:dict[str, Any]) -> list[int]:
+		env = context["env"]
+		sp  = context["sp"] + 1
 
-		if (node.pick) {
-			context.pluck.push(sp);
-		}
+		if node.label:
+			env = context["env"].copy()
+			context["env"][node.label] = sp
+
+		if node.pick:
+			context["pluck"].append(sp)
+
+		return self.visit(node.expression, {
+			"sp"     : context["sp"],
+			"env"    : env,
+			"action" : None,
+		})
 
-		return generate(node.expression, {
-			sp: context.sp,
-			env,
-			action: None,
-		});
-	
 
-	def text(self:Visitor, node:Text, context):
+	def text(self:Visitor, node:Text, context:dict[str, Any]) -> list[int]:
+		run = classRunOf(node.expression)
+		if run is not None:
+			repetition, cls = run
+			checkBytes(cls, "".join("".join(part) for part in cls.parts), "Character class")
+			return [
+				op.ACCEPT_CLASS_RUN,
+				addClassConst(cls, "*" if repetition.type == "zero_or_more" else "+"),
+				addExpectedConst({
+					"type"       : "class",
+					"value"      : cls.parts,
+					"inverted"   : cls.inverted,
+					"ignoreCase" : cls.ignoreCase,
+				}),
+			]
+
 		return buildSequence(
 			[op.PUSH_CURR_POS],
-			generate(node.expression, {
-				sp: context.sp + 1,
-				env: cloneEnv(context.env),
-				action: None,
+			self.visit(node.expression, {
+				"sp"     : context["sp"] + 1,
+				"env"    : context["env"].copy(),
+				"action" : None,
 			}),
 			buildCondition(
-				node.match | 0,
+				match_of(node),
 				[op.IF_NOT_ERROR],
 				buildSequence([op.POP], [op.TEXT]),
 				[op.NIP]
 			)
-		);
-	
+		)
+
+
+	def simple_and(self:Visitor, node:Simple_And, context:dict[str, Any]) -> list[int]:
+		return buildSimplePredicate(node.expression, False, context)
+
 
-	def simple_and(self:Visitor, node:Simple_And, context):
-		return buildSimplePredicate(node.expression, False, context);
-	
+	def simple_not(self:Visitor, node:Simple_Not, context:dict[str, Any]) -> list[int]:
+		return buildSimplePredicate(node.expression, True, context)
 
-	def simple_not(self:Visitor, node:Simple_Not, context):
-		return buildSimplePredicate(node.expression, True, context);
-	
 
-	def optional(self:Visitor, node:Optional, context):
+	def optional(self:Visitor, node:Optional, context:dict[str, Any]) -> list[int]:
 		return buildSequence(
-			generate(node.expression, {
-				sp: context.sp,
-				env: cloneEnv(context.env),
-				action: None,
+			self.visit(node.expression, {
+				"sp"     : context["sp"],
+				"env"    : context["env"].copy(),
+				"action" : None,
 			}),
 			buildCondition(
 				# Check expression match, not the node match
 				# If expression always match, no need to replace FAILED to NULL,
 				# because FAILED will never appeared
-				-(node.expression.match | 0),
+				match_of(node.expression).invert(),
 				[op.IF_ERROR],
 				buildSequence([op.POP], [op.PUSH_NULL]),
 				[]
 			)
-		);
-	
+		)
+
 
-	def zero_or_more(self:Visitor, node:Zero_or_More, context):
-		expressionCode = generate(node.expression, {
-			sp: context.sp + 1,
-			env: cloneEnv(context.env),
-			action: None,
-		});
+	def zero_or_more(self:Visitor, node:Zero_or_More, context:dict[str, Any]) -> list[int]:
+		expressionCode = self.visit(node.expression, {
+			"sp"     : context["sp"] + 1,
+			"env"    : context["env"].copy(),
+			"action" : None,
+		})
 
 		return buildSequence(
 			[op.PUSH_EMPTY_ARRAY],
 			expressionCode,
 			buildAppendLoop(expressionCode),
 			[op.POP]
-		);
-	
+		)
 
-	def one_or_more(self:Visitor, node:One_or_More, context) {
-		expressionCode = generate(node.expression, {
-			sp: context.sp + 1,
-			env: cloneEnv(context.env),
-			action: None,
-		});
+
+	def one_or_more(self:Visitor, node:One_or_More, context:dict[str, Any]) -> list[int]:
+		expressionCode = self.visit(node.expression, {
+			"sp"     : context["sp"] + 1,
+			"env"    : context["env"].copy(),
+			"action" : None,
+		})
 
 		return buildSequence(
 			[op.PUSH_EMPTY_ARRAY],
 			expressionCode,
 			buildCondition(
 				# Condition depends on the expression match, not the node match
-				node.expression.match | 0,
+				match_of(node.expression),
 				[op.IF_NOT_ERROR],
 				buildSequence(buildAppendLoop(expressionCode), [op.POP]),
 				buildSequence([op.POP], [op.POP], [op.PUSH_FAILED])
 			)
-		);
-	
-
-	def group(self:Visitor, node:Group, context) {
-		return generate(node.expression, {
-			sp: context.sp,
-			env: cloneEnv(context.env),
-			action: None,
-		});
-	
-
-	def semantic_and(self:Visitor, node, context) {
-		return buildSemanticPredicate(node, False, context);
-	
-
-	def semantic_not(self:Visitor, node:Semantic_Not, context) {
-		return buildSemanticPredicate(node, True, context);
-	
-
-	def rule_ref(self:Visitor, node:Class, options:dict[str, Any]):
-		return [op.RULE, asts.indexOfRule(ast, node.name)];
-	
-
-	def literal(self:Visitor, node:Class, options:dict[str, Any]):
-		if (node.value.length > 0) {
-			match = node.match | 0;
+		)
+
+
+	def group(self:Visitor, node:Group, context:dict[str, Any]) -> list[int]:
+		return self.visit(node.expression, {
+			"sp"     : context["sp"],
+			"env"    : context["env"].copy(),
+			"action" : None,
+		})
+
+
+	def semantic_and(self:Visitor, node:Semantic_And, context:dict[str, Any]) -> list[int]:
+		return buildSemanticPredicate(node, False, context)
+
+
+	def semantic_not(self:Visitor, node:Semantic_Not, context:dict[str, Any]) -> list[int]:
+		return buildSemanticPredicate(node, True, context)
+
+
+	def rule_ref(self:Visitor, node:Rule_Ref, context:dict[str, Any]) -> list[int]:
+		return [op.RULE, grammar.indexOfRule(node.name)]
+
+
+	def literal(self:Visitor, node:Literal, context:dict[str, Any]) -> list[int]:
+		if len(node.value) > 0:
+			checkBytes(node, node.value, "Literal")
+			match = match_of(node)
 			# String only required if condition is generated or string is
 			# case-sensitive and node always match
-			need= match == SOMETIMES_MATCH
-										or (match == ALWAYS_MATCH and !node.ignoreCase);
-			stringIndex = needConst
-				? addLiteralConst(
-					node.ignoreCase ? node.value.toLowerCase() : node.value
-				)
-				: None;
+			needConst = match == MATCH.SOMETIMES or (match == MATCH.ALWAYS and not node.ignoreCase)
+			stringIndex = addLiteralConst(
+				lowerCase(node.value) if node.ignoreCase else node.value
+			) if needConst else None
 			# Expectation not required if node always match
-			expectedIndex = (match != ALWAYS_MATCH)
-				? addExpectedConst({
-					type: "literal",
-					value: node.value,
-					ignoreCase: node.ignoreCase,
-				})
-				: None;
+			expectedIndex = addExpectedConst({
+				"type"       : "literal",
+				"value"      : node.value,
+				"ignoreCase" : node.ignoreCase,
+			}) if match != MATCH.ALWAYS else None
 
 			# For case-sensitive strings the value must match the beginning of the
 			# remaining input exactly. As a result, we can use |ACCEPT_STRING| and
 			# save one |substr| call that would be needed if we used |ACCEPT_N|.
 			return buildCondition(
 				match,
-				node.ignoreCase
-					? [op.MATCH_STRING_IC, stringIndex]
-					: [op.MATCH_STRING, stringIndex],
-				node.ignoreCase
-					? [op.ACCEPT_N, node.value.length]
-					: [op.ACCEPT_STRING, stringIndex],
+				[op.MATCH_STRING_IC, stringIndex] if node.ignoreCase else [op.MATCH_STRING, stringIndex],
+				[op.ACCEPT_N, len(node.value)] if node.ignoreCase else [op.ACCEPT_STRING, stringIndex],
 				[op.FAIL, expectedIndex]
-			);
-		}
+			)
 
-		return [op.PUSH_EMPTY_STRING];
-	
+		return [op.PUSH_EMPTY_STRING]
 
-	def _class(self:Visitor, node:Class, options:dict[str, Any]):
-		match = node.match | 0;
+
+	def _class(self:Visitor, node:Class, context:dict[str, Any]) -> list[int]:
+		checkBytes(node, "".join("".join(part) for part in node.parts), "Character class")
+		match = match_of(node)
 		# Character class constant only required if condition is generated
-		classIndex = match == SOMETIMES_MATCH ? addClassConst(node) : None;
+		classIndex = addClassConst(node) if match == MATCH.SOMETIMES else None
 		# Expectation not required if node always match
-		expectedIndex = (match != ALWAYS_MATCH)
-			? addExpectedConst({
-				type: "class",
-				value: node.parts,
-				inverted: node.inverted,
-				ignoreCase: node.ignoreCase,
-			})
-			: None;
+		expectedIndex = addExpectedConst({
+			"type"       : "class",
+			"value"      : node.parts,
+			"inverted"   : node.inverted,
+			"ignoreCase" : node.ignoreCase,
+		}) if match != MATCH.ALWAYS else None
 
 		return buildCondition(
 			match,
 			[op.MATCH_CHAR_CLASS, classIndex],
 			[op.ACCEPT_N, 1],
 			[op.FAIL, expectedIndex]
-		);
-	
+		)
+
 
-	def any(self:Visitor, node:Class, options:dict[str, Any]):
-		match = node.match | 0;
+	def _any(self:Visitor, node:st_Any, context:dict[str, Any]) -> list[int]:
+		match = match_of(node)
 		# Expectation not required if node always match
-		expectedIndex = (match != ALWAYS_MATCH)
-			? addExpectedConst({
-				type: "any",
-			})
-			: None;
+		expectedIndex = addExpectedConst({
+			"type": "any",
+		}) if match != MATCH.ALWAYS else None
 
 		return buildCondition(
 			match,
 			[op.MATCH_ANY],
 			[op.ACCEPT_N, 1],
 			[op.FAIL, expectedIndex]
-		);
-
-	generate = visitor.build({
-		
-	});
-
-	generate(ast);
-}
+		)
 
 
+	generate = Visitor({
+		"grammar"      : _grammar,
+		"rule"         : rule,
+		"named"        : named,
+		"choice"       : choice,
+		"action"       : action,
+		"sequence"     : sequence,
+		"labeled"      : labeled,
+		"text"         : text,
+		"simple_and"   : simple_and,
+		"simple_not"   : simple_not,
+		"optional"     : optional,
+		"zero_or_more" : zero_or_more,
+		"one_or_more"  : one_or_more,
+		"group"        : group,
+		"semantic_and" : semantic_and,
+		"semantic_not" : semantic_not,
+		"rule_ref"     : rule_ref,
+		"literal"      : literal,
+		"class"        : _class,
+		"any"          : _any,
+	})
+
+	generate.visit(grammar, options)
@@ -1,1141 +1,1306 @@
-"use strict";
-
-const asts = require("../asts");
-const op = require("../opcodes");
-const Stack = require("../stack");
-const VERSION = require("../../version");
-const { stringEscape, regexpClassEscape } = require("../utils");
-
-// Generates parser JavaScript code.
-function generateJS(ast, options) {
-  // These only indent non-empty lines to avoid trailing whitespace.
-  function indent2(code) { return code.replace(/^(.+)$/gm, "  $1"); }
-
-  function l(i) { return "peg$c" + i; } // |literals[i]| of the abstract machine
-  function r(i) { return "peg$r" + i; } // |classes[i]| of the abstract machine
-  function e(i) { return "peg$e" + i; } // |expectations[i]| of the abstract machine
-  function f(i) { return "peg$f" + i; } // |actions[i]| of the abstract machine
-
-  function generateTables() {
-    function buildLiteral(literal) {
-      return "\"" + stringEscape(literal) + "\"";
-    }
-
-    function buildRegexp(cls) {
-      return "/^["
-        + (cls.inverted ? "^" : "")
-        + cls.value.map(part => Array.isArray(part)
-          ? regexpClassEscape(part[0])
-            + "-"
-            + regexpClassEscape(part[1])
-          : regexpClassEscape(part)).join("")
-        + "]/" + (cls.ignoreCase ? "i" : "");
-    }
-
-    function buildExpectation(e) {
-      switch (e.type) {
-        case "rule": {
-          return "peg$otherExpectation(\"" + stringEscape(e.value) + "\")";
-        }
-        case "literal": {
-          return "peg$literalExpectation(\""
-                  + stringEscape(e.value)
-                  + "\", "
-                  + e.ignoreCase
-                  + ")";
-        }
-        case "class": {
-          const parts = e.value.map(part => Array.isArray(part)
-            ? "[\"" + stringEscape(part[0]) + "\", \"" + stringEscape(part[1]) + "\"]"
-            : "\""  + stringEscape(part) + "\"").join(", ");
-
-          return "peg$classExpectation(["
-                  + parts + "], "
-                  + e.inverted + ", "
-                  + e.ignoreCase
-                  + ")";
-        }
-        case "any": return "peg$anyExpectation()";
-        default: throw new Error("Unknown expectation type (" + JSON.stringify(e) + ")");
-      }
-    }
-
-    function buildFunc(a) {
-      return "function(" + a.params.join(", ") + ") {"
-             + a.body
-             + "}";
-    }
-
-    return ast.literals.map(
-      (c, i) => "var " + l(i) + " = " + buildLiteral(c) + ";"
-    ).concat("", ast.classes.map(
-      (c, i) => "var " + r(i) + " = " + buildRegexp(c) + ";"
-    )).concat("", ast.expectations.map(
-      (c, i) => "var " + e(i) + " = " + buildExpectation(c) + ";"
-    )).concat("", ast.functions.map(
-      (c, i) => "var " + f(i) + " = " + buildFunc(c) + ";"
-    )).join("\n");
-  }
-
-  function generateRuleHeader(ruleNameCode, ruleIndexCode) {
-    const parts = [];
-
-    parts.push("");
-
-    if (options.trace) {
-      parts.push([
-        "peg$tracer.trace({",
-        "  type: \"rule.enter\",",
-        "  rule: " + ruleNameCode + ",",
-        "  location: peg$computeLocation(startPos, startPos)",
-        "});",
-        "",
-      ].join("\n"));
-    }
-
-    if (options.cache) {
-      parts.push([
-        "var key = peg$currPos * " + ast.rules.length + " + " + ruleIndexCode + ";",
-        "var cached = peg$resultsCache[key];",
-        "",
-        "if (cached) {",
-        "  peg$currPos = cached.nextPos;",
-        "",
-      ].join("\n"));
-
-      if (options.trace) {
-        parts.push([
-          "if (cached.result !== peg$FAILED) {",
-          "  peg$tracer.trace({",
-          "    type: \"rule.match\",",
-          "    rule: " + ruleNameCode + ",",
-          "    result: cached.result,",
-          "    location: peg$computeLocation(startPos, peg$currPos)",
-          "  });",
-          "} else {",
-          "  peg$tracer.trace({",
-          "    type: \"rule.fail\",",
-          "    rule: " + ruleNameCode + ",",
-          "    location: peg$computeLocation(startPos, startPos)",
-          "  });",
-          "}",
-          "",
-        ].join("\n"));
-      }
-
-      parts.push([
-        "  return cached.result;",
-        "}",
-        "",
-      ].join("\n"));
-    }
-
-    return parts.join("\n");
-  }
-
-  function generateRuleFooter(ruleNameCode, resultCode) {
-    const parts = [];
-
-    if (options.cache) {
-      parts.push([
-        "",
-        "peg$resultsCache[key] = { nextPos: peg$currPos, result: " + resultCode + " };",
-      ].join("\n"));
-    }
-
-    if (options.trace) {
-      parts.push([
-        "",
-        "if (" + resultCode + " !== peg$FAILED) {",
-        "  peg$tracer.trace({",
-        "    type: \"rule.match\",",
-        "    rule: " + ruleNameCode + ",",
-        "    result: " + resultCode + ",",
-        "    location: peg$computeLocation(startPos, peg$currPos)",
-        "  });",
-        "} else {",
-        "  peg$tracer.trace({",
-        "    type: \"rule.fail\",",
-        "    rule: " + ruleNameCode + ",",
-        "    location: peg$computeLocation(startPos, startPos)",
-        "  });",
-        "}",
-      ].join("\n"));
-    }
-
-    parts.push([
-      "",
-      "return " + resultCode + ";",
-    ].join("\n"));
-
-    return parts.join("\n");
-  }
-
-  function generateRuleFunction(rule) {
-    const parts = [];
-    const stack = new Stack(rule.name, "s", "var");
-
-    function compile(bc) {
-      let ip = 0;
-      const end = bc.length;
-      const parts = [];
-      let value;
-
-      function compileCondition(cond, argCount) {
-        const baseLength = argCount + 3;
-        const thenLength = bc[ip + baseLength - 2];
-        const elseLength = bc[ip + baseLength - 1];
-        let thenCode, elseCode;
-
-        stack.checkedIf(
-          ip,
-          () => {
-            ip += baseLength;
-            thenCode = compile(bc.slice(ip, ip + thenLength));
-            ip += thenLength;
-          },
-          (elseLength > 0)
-            ? () => {
-                elseCode = compile(bc.slice(ip, ip + elseLength));
-                ip += elseLength;
-              }
-            : null
-        );
-
-        parts.push("if (" + cond + ") {");
-        parts.push(indent2(thenCode));
-        if (elseLength > 0) {
-          parts.push("} else {");
-          parts.push(indent2(elseCode));
-        }
-        parts.push("}");
-      }
-
-      function compileLoop(cond) {
-        const baseLength = 2;
-        const bodyLength = bc[ip + baseLength - 1];
-        let bodyCode;
-
-        stack.checkedLoop(ip, () => {
-          ip += baseLength;
-          bodyCode = compile(bc.slice(ip, ip + bodyLength));
-          ip += bodyLength;
-        });
-
-        parts.push("while (" + cond + ") {");
-        parts.push(indent2(bodyCode));
-        parts.push("}");
-      }
-
-      function compileCall() {
-        const baseLength = 4;
-        const paramsLength = bc[ip + baseLength - 1];
-
-        const value = f(bc[ip + 1]) + "("
-          + bc.slice(ip + baseLength, ip + baseLength + paramsLength).map(
-            p => stack.index(p)
-          ).join(", ")
-          + ")";
-        stack.pop(bc[ip + 2]);
-        parts.push(stack.push(value));
-        ip += baseLength + paramsLength;
-      }
-
-      while (ip < end) {
-        switch (bc[ip]) {
-          case op.PUSH_EMPTY_STRING:  // PUSH_EMPTY_STRING
-            parts.push(stack.push("''"));
-            ip++;
-            break;
-
-          case op.PUSH_CURR_POS:      // PUSH_CURR_POS
-            parts.push(stack.push("peg$currPos"));
-            ip++;
-            break;
-
-          case op.PUSH_UNDEFINED:     // PUSH_UNDEFINED
-            parts.push(stack.push("undefined"));
-            ip++;
-            break;
-
-          case op.PUSH_NULL:          // PUSH_NULL
-            parts.push(stack.push("null"));
-            ip++;
-            break;
-
-          case op.PUSH_FAILED:        // PUSH_FAILED
-            parts.push(stack.push("peg$FAILED"));
-            ip++;
-            break;
-
-          case op.PUSH_EMPTY_ARRAY:   // PUSH_EMPTY_ARRAY
-            parts.push(stack.push("[]"));
-            ip++;
-            break;
-
-          case op.POP:                // POP
-            stack.pop();
-            ip++;
-            break;
-
-          case op.POP_CURR_POS:       // POP_CURR_POS
-            parts.push("peg$currPos = " + stack.pop() + ";");
-            ip++;
-            break;
-
-          case op.POP_N:              // POP_N n
-            stack.pop(bc[ip + 1]);
-            ip += 2;
-            break;
-
-          case op.NIP:                // NIP
-            value = stack.pop();
-            stack.pop();
-            parts.push(stack.push(value));
-            ip++;
-            break;
-
-          case op.APPEND:             // APPEND
-            value = stack.pop();
-            parts.push(stack.top() + ".push(" + value + ");");
-            ip++;
-            break;
-
-          case op.WRAP:               // WRAP n
-            parts.push(
-              // @ts-expect-error  pop() returns array if argument is specified
-              stack.push("[" + stack.pop(bc[ip + 1]).join(", ") + "]")
-            );
-            ip += 2;
-            break;
-
-          case op.TEXT:               // TEXT
-            parts.push(
-              stack.push("input.substring(" + stack.pop() + ", peg$currPos)")
-            );
-            ip++;
-            break;
-
-          case op.PLUCK: {            // PLUCK n, k, p1, ..., pK
-            const baseLength = 3;
-            const paramsLength = bc[ip + baseLength - 1];
-            const n = baseLength + paramsLength;
-            value = bc.slice(ip + baseLength, ip + n);
-            value = paramsLength === 1
-              ? stack.index(value[0])
-              : `[ ${
-                value.map(p => stack.index(p)).join(", ")
-              } ]`;
-            stack.pop(bc[ip + 1]);
-            parts.push(stack.push(value));
-            ip += n;
-            break;
-          }
-
-          case op.IF:                 // IF t, f
-            compileCondition(stack.top(), 0);
-            break;
-
-          case op.IF_ERROR:           // IF_ERROR t, f
-            compileCondition(stack.top() + " === peg$FAILED", 0);
-            break;
-
-          case op.IF_NOT_ERROR:       // IF_NOT_ERROR t, f
-            compileCondition(stack.top() + " !== peg$FAILED", 0);
-            break;
-
-          case op.WHILE_NOT_ERROR:    // WHILE_NOT_ERROR b
-            compileLoop(stack.top() + " !== peg$FAILED");
-            break;
-
-          case op.MATCH_ANY:          // MATCH_ANY a, f, ...
-            compileCondition("input.length > peg$currPos", 0);
-            break;
-
-          case op.MATCH_STRING:       // MATCH_STRING s, a, f, ...
-            compileCondition(
-              ast.literals[bc[ip + 1]].length > 1
-                ? "input.substr(peg$currPos, "
-                    + ast.literals[bc[ip + 1]].length
-                    + ") === "
-                    + l(bc[ip + 1])
-                : "input.charCodeAt(peg$currPos) === "
-                    + ast.literals[bc[ip + 1]].charCodeAt(0),
-              1
-            );
-            break;
-
-          case op.MATCH_STRING_IC:    // MATCH_STRING_IC s, a, f, ...
-            compileCondition(
-              "input.substr(peg$currPos, "
-                + ast.literals[bc[ip + 1]].length
-                + ").toLowerCase() === "
-                + l(bc[ip + 1]),
-              1
-            );
-            break;
-
-          case op.MATCH_CHAR_CLASS:   // MATCH_CHAR_CLASS c, a, f, ...
-            compileCondition(
-              r(bc[ip + 1]) + ".test(input.charAt(peg$currPos))",
-              1
-            );
-            break;
-
-          case op.ACCEPT_N:           // ACCEPT_N n
-            parts.push(stack.push(
-              bc[ip + 1] > 1
-                ? "input.substr(peg$currPos, " + bc[ip + 1] + ")"
-                : "input.charAt(peg$currPos)"
-            ));
-            parts.push(
-              bc[ip + 1] > 1
-                ? "peg$currPos += " + bc[ip + 1] + ";"
-                : "peg$currPos++;"
-            );
-            ip += 2;
-            break;
-
-          case op.ACCEPT_STRING:      // ACCEPT_STRING s
-            parts.push(stack.push(l(bc[ip + 1])));
-            parts.push(
-              ast.literals[bc[ip + 1]].length > 1
-                ? "peg$currPos += " + ast.literals[bc[ip + 1]].length + ";"
-                : "peg$currPos++;"
-            );
-            ip += 2;
-            break;
-
-          case op.FAIL:               // FAIL e
-            parts.push(stack.push("peg$FAILED"));
-            parts.push("if (peg$silentFails === 0) { peg$fail(" + e(bc[ip + 1]) + "); }");
-            ip += 2;
-            break;
-
-          case op.LOAD_SAVED_POS:     // LOAD_SAVED_POS p
-            parts.push("peg$savedPos = " + stack.index(bc[ip + 1]) + ";");
-            ip += 2;
-            break;
-
-          case op.UPDATE_SAVED_POS:   // UPDATE_SAVED_POS
-            parts.push("peg$savedPos = peg$currPos;");
-            ip++;
-            break;
-
-          case op.CALL:               // CALL f, n, pc, p1, p2, ..., pN
-            compileCall();
-            break;
-
-          case op.RULE:               // RULE r
-            parts.push(stack.push("peg$parse" + ast.rules[bc[ip + 1]].name + "()"));
-            ip += 2;
-            break;
-
-          case op.SILENT_FAILS_ON:    // SILENT_FAILS_ON
-            parts.push("peg$silentFails++;");
-            ip++;
-            break;
-
-          case op.SILENT_FAILS_OFF:   // SILENT_FAILS_OFF
-            parts.push("peg$silentFails--;");
-            ip++;
-            break;
-
-          default:
-            throw new Error("Invalid opcode: " + bc[ip] + ".");
-        }
-      }
-
-      return parts.join("\n");
-    }
-
-    const code = compile(rule.bytecode);
-
-    parts.push("function peg$parse" + rule.name + "() {");
-
-    if (options.trace) {
-      parts.push("  var startPos = peg$currPos;");
-    }
-
-    parts.push(indent2(stack.defines()));
-
-    parts.push(indent2(generateRuleHeader(
-      "\"" + stringEscape(rule.name) + "\"",
-      asts.indexOfRule(ast, rule.name)
-    )));
-    parts.push(indent2(code));
-    parts.push(indent2(generateRuleFooter(
-      "\"" + stringEscape(rule.name) + "\"",
-      stack.result()
-    )));
-
-    parts.push("}");
-
-    return parts.join("\n");
-  }
-
-  function generateToplevel() {
-    const parts = [];
-
-    if (ast.topLevelInitializer) {
-      parts.push(ast.topLevelInitializer.code);
-      parts.push("");
-    }
-
-    parts.push([
-      "function peg$subclass(child, parent) {",
-      "  function C() { this.constructor = child; }",
-      "  C.prototype = parent.prototype;",
-      "  child.prototype = new C();",
-      "}",
-      "",
-      "function peg$SyntaxError(message, expected, found, location) {",
-      "  var self = Error.call(this, message);",
-      "  if (Object.setPrototypeOf) {",
-      "    Object.setPrototypeOf(self, peg$SyntaxError.prototype);",
-      "  }",
-      "  self.expected = expected;",
-      "  self.found = found;",
-      "  self.location = location;",
-      "  self.name = \"SyntaxError\";",
-      "  return self;",
-      "}",
-      "",
-      "peg$subclass(peg$SyntaxError, Error);",
-      "",
-      "function peg$padEnd(str, targetLength, padString) {",
-      "  padString = padString || \" \";",
-      "  if (str.length > targetLength) { return str; }",
-      "  targetLength -= str.length;",
-      "  padString += padString.repeat(targetLength);",
-      "  return str + padString.slice(0, targetLength);",
-      "}",
-      "",
-      "peg$SyntaxError.prototype.format = function(sources) {",
-      "  var str = \"Error: \" + this.message;",
-      "  if (this.location) {",
-      "    var src = null;",
-      "    var k;",
-      "    for (k = 0; k < sources.length; k++) {",
-      "      if (sources[k].source === this.location.source) {",
-      "        src = sources[k].text.split(/\\r\\n|\\n|\\r/g);",
-      "        break;",
-      "      }",
-      "    }",
-      "    var s = this.location.start;",
-      "    var loc = this.location.source + \":\" + s.line + \":\" + s.column;",
-      "    if (src) {",
-      "      var e = this.location.end;",
-      "      var filler = peg$padEnd(\"\", s.line.toString().length, ' ');",
-      "      var line = src[s.line - 1];",
-      "      var last = s.line === e.line ? e.column : line.length + 1;",
-      "      str += \"\\n --> \" + loc + \"\\n\"",
-      "          + filler + \" |\\n\"",
-      "          + s.line + \" | \" + line + \"\\n\"",
-      "          + filler + \" | \" + peg$padEnd(\"\", s.column - 1, ' ')",
-      "          + peg$padEnd(\"\", last - s.column, \"^\");",
-      "    } else {",
-      "      str += \"\\n at \" + loc;",
-      "    }",
-      "  }",
-      "  return str;",
-      "};",
-      "",
-      "peg$SyntaxError.buildMessage = function(expected, found) {",
-      "  var DESCRIBE_EXPECTATION_FNS = {",
-      "    literal: function(expectation) {",
-      "      return \"\\\"\" + literalEscape(expectation.text) + \"\\\"\";",
-      "    },",
-      "",
-      "    class: function(expectation) {",
-      "      var escapedParts = expectation.parts.map(function(part) {",
-      "        return Array.isArray(part)",
-      "          ? classEscape(part[0]) + \"-\" + classEscape(part[1])",
-      "          : classEscape(part);",
-      "      });",
-      "",
-      "      return \"[\" + (expectation.inverted ? \"^\" : \"\") + escapedParts + \"]\";",
-      "    },",
-      "",
-      "    any: function() {",
-      "      return \"any character\";",
-      "    },",
-      "",
-      "    end: function() {",
-      "      return \"end of input\";",
-      "    },",
-      "",
-      "    other: function(expectation) {",
-      "      return expectation.description;",
-      "    }",
-      "  };",
-      "",
-      "  function hex(ch) {",
-      "    return ch.charCodeAt(0).toString(16).toUpperCase();",
-      "  }",
-      "",
-      "  function literalEscape(s) {",
-      "    return s",
-      "      .replace(/\\\\/g, \"\\\\\\\\\")",   // Backslash
-      "      .replace(/\"/g,  \"\\\\\\\"\")",    // Closing double quote
-      "      .replace(/\\0/g, \"\\\\0\")",       // Null
-      "      .replace(/\\t/g, \"\\\\t\")",       // Horizontal tab
-      "      .replace(/\\n/g, \"\\\\n\")",       // Line feed
-      "      .replace(/\\r/g, \"\\\\r\")",       // Carriage return
-      "      .replace(/[\\x00-\\x0F]/g,          function(ch) { return \"\\\\x0\" + hex(ch); })",
-      "      .replace(/[\\x10-\\x1F\\x7F-\\x9F]/g, function(ch) { return \"\\\\x\"  + hex(ch); });",
-      "  }",
-      "",
-      "  function classEscape(s) {",
-      "    return s",
-      "      .replace(/\\\\/g, \"\\\\\\\\\")",   // Backslash
-      "      .replace(/\\]/g, \"\\\\]\")",       // Closing bracket
-      "      .replace(/\\^/g, \"\\\\^\")",       // Caret
-      "      .replace(/-/g,  \"\\\\-\")",        // Dash
-      "      .replace(/\\0/g, \"\\\\0\")",       // Null
-      "      .replace(/\\t/g, \"\\\\t\")",       // Horizontal tab
-      "      .replace(/\\n/g, \"\\\\n\")",       // Line feed
-      "      .replace(/\\r/g, \"\\\\r\")",       // Carriage return
-      "      .replace(/[\\x00-\\x0F]/g,          function(ch) { return \"\\\\x0\" + hex(ch); })",
-      "      .replace(/[\\x10-\\x1F\\x7F-\\x9F]/g, function(ch) { return \"\\\\x\"  + hex(ch); });",
-      "  }",
-      "",
-      "  function describeExpectation(expectation) {",
-      "    return DESCRIBE_EXPECTATION_FNS[expectation.type](expectation);",
-      "  }",
-      "",
-      "  function describeExpected(expected) {",
-      "    var descriptions = expected.map(describeExpectation);",
-      "    var i, j;",
-      "",
-      "    descriptions.sort();",
-      "",
-      "    if (descriptions.length > 0) {",
-      "      for (i = 1, j = 1; i < descriptions.length; i++) {",
-      "        if (descriptions[i - 1] !== descriptions[i]) {",
-      "          descriptions[j] = descriptions[i];",
-      "          j++;",
-      "        }",
-      "      }",
-      "      descriptions.length = j;",
-      "    }",
-      "",
-      "    switch (descriptions.length) {",
-      "      case 1:",
-      "        return descriptions[0];",
-      "",
-      "      case 2:",
-      "        return descriptions[0] + \" or \" + descriptions[1];",
-      "",
-      "      default:",
-      "        return descriptions.slice(0, -1).join(\", \")",
-      "          + \", or \"",
-      "          + descriptions[descriptions.length - 1];",
-      "    }",
-      "  }",
-      "",
-      "  function describeFound(found) {",
-      "    return found ? \"\\\"\" + literalEscape(found) + \"\\\"\" : \"end of input\";",
-      "  }",
-      "",
-      "  return \"Expected \" + describeExpected(expected) + \" but \" + describeFound(found) + \" found.\";",
-      "};",
-      "",
-    ].join("\n"));
-
-    if (options.trace) {
-      parts.push([
-        "function peg$DefaultTracer() {",
-        "  this.indentLevel = 0;",
-        "}",
-        "",
-        "peg$DefaultTracer.prototype.trace = function(event) {",
-        "  var that = this;",
-        "",
-        "  function log(event) {",
-        "    function repeat(string, n) {",
-        "       var result = \"\", i;",
-        "",
-        "       for (i = 0; i < n; i++) {",
-        "         result += string;",
-        "       }",
-        "",
-        "       return result;",
-        "    }",
-        "",
-        "    function pad(string, length) {",
-        "      return string + repeat(\" \", length - string.length);",
-        "    }",
-        "",
-        "    if (typeof console === \"object\") {",   // IE 8-10
-        "      console.log(",
-        "        event.location.start.line + \":\" + event.location.start.column + \"-\"",
-        "          + event.location.end.line + \":\" + event.location.end.column + \" \"",
-        "          + pad(event.type, 10) + \" \"",
-        "          + repeat(\"  \", that.indentLevel) + event.rule",
-        "      );",
-        "    }",
-        "  }",
-        "",
-        "  switch (event.type) {",
-        "    case \"rule.enter\":",
-        "      log(event);",
-        "      this.indentLevel++;",
-        "      break;",
-        "",
-        "    case \"rule.match\":",
-        "      this.indentLevel--;",
-        "      log(event);",
-        "      break;",
-        "",
-        "    case \"rule.fail\":",
-        "      this.indentLevel--;",
-        "      log(event);",
-        "      break;",
-        "",
-        "    default:",
-        "      throw new Error(\"Invalid event type: \" + event.type + \".\");",
-        "  }",
-        "};",
-        "",
-      ].join("\n"));
-    }
-
-    const startRuleFunctions = "{ "
-      + options.allowed_start_rules.map(
-        r => r + ": peg$parse" + r
-      ).join(", ")
-      + " }";
-    const startRuleFunction = "peg$parse" + options.allowed_start_rules[0];
-
-    parts.push([
-      "function peg$parse(input, options) {",
-      "  options = options !== undefined ? options : {};",
-      "",
-      "  var peg$FAILED = {};",
-      "  var peg$source = options.grammarSource;",
-      "",
-      "  var peg$startRuleFunctions = " + startRuleFunctions + ";",
-      "  var peg$startRuleFunction = " + startRuleFunction + ";",
-      "",
-      indent2(generateTables()),
-      "",
-      "  var peg$currPos = 0;",
-      "  var peg$savedPos = 0;",
-      "  var peg$posDetailsCache = [{ line: 1, column: 1 }];",
-      "  var peg$maxFailPos = 0;",
-      "  var peg$maxFailExpected = [];",
-      "  var peg$silentFails = 0;",   // 0 = report failures, > 0 = silence failures
-      "",
-    ].join("\n"));
-
-    if (options.cache) {
-      parts.push([
-        "  var peg$resultsCache = {};",
-        "",
-      ].join("\n"));
-    }
-
-    if (options.trace) {
-      parts.push([
-        "  var peg$tracer = \"tracer\" in options ? options.tracer : new peg$DefaultTracer();",
-        "",
-      ].join("\n"));
-    }
-
-    parts.push([
-      "  var peg$result;",
-      "",
-      "  if (\"startRule\" in options) {",
-      "    if (!(options.startRule in peg$startRuleFunctions)) {",
-      "      throw new Error(\"Can't start parsing from rule \\\"\" + options.startRule + \"\\\".\");",
-      "    }",
-      "",
-      "    peg$startRuleFunction = peg$startRuleFunctions[options.startRule];",
-      "  }",
-      "",
-      "  function text() {",
-      "    return input.substring(peg$savedPos, peg$currPos);",
-      "  }",
-      "",
-      "  function offset() {",
-      "    return peg$savedPos;",
-      "  }",
-      "",
-      "  function range() {",
-      "    return {",
-      "      source: peg$source,",
-      "      start: peg$savedPos,",
-      "      end: peg$currPos",
-      "    };",
-      "  }",
-      "",
-      "  function location() {",
-      "    return peg$computeLocation(peg$savedPos, peg$currPos);",
-      "  }",
-      "",
-      "  function expected(description, location) {",
-      "    location = location !== undefined",
-      "      ? location",
-      "      : peg$computeLocation(peg$savedPos, peg$currPos);",
-      "",
-      "    throw peg$buildStructuredError(",
-      "      [peg$otherExpectation(description)],",
-      "      input.substring(peg$savedPos, peg$currPos),",
-      "      location",
-      "    );",
-      "  }",
-      "",
-      "  function error(message, location) {",
-      "    location = location !== undefined",
-      "      ? location",
-      "      : peg$computeLocation(peg$savedPos, peg$currPos);",
-      "",
-      "    throw peg$buildSimpleError(message, location);",
-      "  }",
-      "",
-      "  function peg$literalExpectation(text, ignoreCase) {",
-      "    return { type: \"literal\", text: text, ignoreCase: ignoreCase };",
-      "  }",
-      "",
-      "  function peg$classExpectation(parts, inverted, ignoreCase) {",
-      "    return { type: \"class\", parts: parts, inverted: inverted, ignoreCase: ignoreCase };",
-      "  }",
-      "",
-      "  function peg$anyExpectation() {",
-      "    return { type: \"any\" };",
-      "  }",
-      "",
-      "  function peg$endExpectation() {",
-      "    return { type: \"end\" };",
-      "  }",
-      "",
-      "  function peg$otherExpectation(description) {",
-      "    return { type: \"other\", description: description };",
-      "  }",
-      "",
-      "  function peg$computePosDetails(pos) {",
-      "    var details = peg$posDetailsCache[pos];",
-      "    var p;",
-      "",
-      "    if (details) {",
-      "      return details;",
-      "    } else {",
-      "      p = pos - 1;",
-      "      while (!peg$posDetailsCache[p]) {",
-      "        p--;",
-      "      }",
-      "",
-      "      details = peg$posDetailsCache[p];",
-      "      details = {",
-      "        line: details.line,",
-      "        column: details.column",
-      "      };",
-      "",
-      "      while (p < pos) {",
-      "        if (input.charCodeAt(p) === 10) {",
-      "          details.line++;",
-      "          details.column = 1;",
-      "        } else {",
-      "          details.column++;",
-      "        }",
-      "",
-      "        p++;",
-      "      }",
-      "",
-      "      peg$posDetailsCache[pos] = details;",
-      "",
-      "      return details;",
-      "    }",
-      "  }",
-      "",
-      "  function peg$computeLocation(startPos, endPos) {",
-      "    var startPosDetails = peg$computePosDetails(startPos);",
-      "    var endPosDetails = peg$computePosDetails(endPos);",
-      "",
-      "    return {",
-      "      source: peg$source,",
-      "      start: {",
-      "        offset: startPos,",
-      "        line: startPosDetails.line,",
-      "        column: startPosDetails.column",
-      "      },",
-      "      end: {",
-      "        offset: endPos,",
-      "        line: endPosDetails.line,",
-      "        column: endPosDetails.column",
-      "      }",
-      "    };",
-      "  }",
-      "",
-      "  function peg$fail(expected) {",
-      "    if (peg$currPos < peg$maxFailPos) { return; }",
-      "",
-      "    if (peg$currPos > peg$maxFailPos) {",
-      "      peg$maxFailPos = peg$currPos;",
-      "      peg$maxFailExpected = [];",
-      "    }",
-      "",
-      "    peg$maxFailExpected.push(expected);",
-      "  }",
-      "",
-      "  function peg$buildSimpleError(message, location) {",
-      "    return new peg$SyntaxError(message, null, null, location);",
-      "  }",
-      "",
-      "  function peg$buildStructuredError(expected, found, location) {",
-      "    return new peg$SyntaxError(",
-      "      peg$SyntaxError.buildMessage(expected, found),",
-      "      expected,",
-      "      found,",
-      "      location",
-      "    );",
-      "  }",
-      "",
-    ].join("\n"));
-
-    ast.rules.forEach(rule => {
-      parts.push(indent2(generateRuleFunction(rule)));
-      parts.push("");
-    });
-
-    if (ast.initializer) {
-      parts.push(indent2(ast.initializer.code));
-      parts.push("");
-    }
-
-    parts.push([
-      "  peg$result = peg$startRuleFunction();",
-      "",
-      "  if (peg$result !== peg$FAILED && peg$currPos === input.length) {",
-      "    return peg$result;",
-      "  } else {",
-      "    if (peg$result !== peg$FAILED && peg$currPos < input.length) {",
-      "      peg$fail(peg$endExpectation());",
-      "    }",
-      "",
-      "    throw peg$buildStructuredError(",
-      "      peg$maxFailExpected,",
-      "      peg$maxFailPos < input.length ? input.charAt(peg$maxFailPos) : null,",
-      "      peg$maxFailPos < input.length",
-      "        ? peg$computeLocation(peg$maxFailPos, peg$maxFailPos + 1)",
-      "        : peg$computeLocation(peg$maxFailPos, peg$maxFailPos)",
-      "    );",
-      "  }",
-      "}",
-    ].join("\n"));
-
-    return parts.join("\n");
-  }
-
-  function generateWrapper(toplevelCode) {
-    function generateGeneratedByComment() {
-      return [
-        `// Generated by Peggy ${VERSION}.`,
-        "//",
-        "// https://peggyjs.org/",
-      ].join("\n");
-    }
-
-    function generateParserObject() {
-      return options.trace
-        ? [
-            "{",
-            "  SyntaxError: peg$SyntaxError,",
-            "  DefaultTracer: peg$DefaultTracer,",
-            "  parse: peg$parse",
-            "}",
-          ].join("\n")
-        : [
-            "{",
-            "  SyntaxError: peg$SyntaxError,",
-            "  parse: peg$parse",
-            "}",
-          ].join("\n");
-    }
-
-    function generateParserExports() {
-      return options.trace
-        ? [
-            "{",
-            "  peg$SyntaxError as SyntaxError,",
-            "  peg$DefaultTracer as DefaultTracer,",
-            "  peg$parse as parse",
-            "}",
-          ].join("\n")
-        : [
-            "{",
-            "  peg$SyntaxError as SyntaxError,",
-            "  peg$parse as parse",
-            "}",
-          ].join("\n");
-    }
-
-    const generators = {
-      bare() {
-        return [
-          generateGeneratedByComment(),
-          "(function() {",
-          "  \"use strict\";",
-          "",
-          indent2(toplevelCode),
-          "",
-          indent2("return " + generateParserObject() + ";"),
-          "})()",
-        ].join("\n");
-      },
-
-      commonjs() {
-        const parts = [];
-        const dependencyVars = Object.keys(options.dependencies);
-
-        parts.push([
-          generateGeneratedByComment(),
-          "",
-          "\"use strict\";",
-          "",
-        ].join("\n"));
-
-        if (dependencyVars.length > 0) {
-          dependencyVars.forEach(variable => {
-            parts.push(
-              "var " + variable
-              + " = require(\""
-              + stringEscape(options.dependencies[variable])
-              + "\");"
-            );
-          });
-          parts.push("");
-        }
-
-        parts.push([
-          toplevelCode,
-          "",
-          "module.exports = " + generateParserObject() + ";",
-          "",
-        ].join("\n"));
-
-        return parts.join("\n");
-      },
-
-      es() {
-        const parts = [];
-        const dependencyVars = Object.keys(options.dependencies);
-
-        parts.push(
-          generateGeneratedByComment(),
-          ""
-        );
-
-        if (dependencyVars.length > 0) {
-          dependencyVars.forEach(variable => {
-            parts.push(
-              "import " + variable
-              + " from \""
-              + stringEscape(options.dependencies[variable])
-              + "\";"
-            );
-          });
-          parts.push("");
-        }
-
-        parts.push(
-          toplevelCode,
-          "",
-          "export " + generateParserExports() + ";",
-          ""
-        );
-
-        return parts.join("\n");
-      },
-
-      amd() {
-        const dependencyVars = Object.keys(options.dependencies);
-        const dependencyIds = dependencyVars.map(v => options.dependencies[v]);
-        const dependencies = "["
-          + dependencyIds.map(
-            id => "\"" + stringEscape(id) + "\""
-          ).join(", ")
-          + "]";
-        const params = dependencyVars.join(", ");
-
-        return [
-          generateGeneratedByComment(),
-          "define(" + dependencies + ", function(" + params + ") {",
-          "  \"use strict\";",
-          "",
-          indent2(toplevelCode),
-          "",
-          indent2("return " + generateParserObject() + ";"),
-          "});",
-          "",
-        ].join("\n");
-      },
-
-      globals() {
-        return [
-          generateGeneratedByComment(),
-          "(function(root) {",
-          "  \"use strict\";",
-          "",
-          indent2(toplevelCode),
-          "",
-          indent2("root." + options.exportVar + " = " + generateParserObject() + ";"),
-          "})(this);",
-          "",
-        ].join("\n");
-      },
-
-      umd() {
-        const parts = [];
-        const dependencyVars = Object.keys(options.dependencies);
-        const dependencyIds = dependencyVars.map(v => options.dependencies[v]);
-        const dependencies = "["
-          + dependencyIds.map(
-            id => "\"" + stringEscape(id) + "\""
-          ).join(", ")
-          + "]";
-        const requires = dependencyIds.map(
-          id => "require(\"" + stringEscape(id) + "\")"
-        ).join(", ");
-        const params = dependencyVars.join(", ");
-
-        parts.push([
-          generateGeneratedByComment(),
-          "(function(root, factory) {",
-          "  if (typeof define === \"function\" && define.amd) {",
-          "    define(" + dependencies + ", factory);",
-          "  } else if (typeof module === \"object\" && module.exports) {",
-          "    module.exports = factory(" + requires + ");",
-        ].join("\n"));
-
-        if (options.exportVar !== null) {
-          parts.push([
-            "  } else {",
-            "    root." + options.exportVar + " = factory();",
-          ].join("\n"));
-        }
-
-        parts.push([
-          "  }",
-          "})(this, function(" + params + ") {",
-          "  \"use strict\";",
-          "",
-          indent2(toplevelCode),
-          "",
-          indent2("return " + generateParserObject() + ";"),
-          "});",
-          "",
-        ].join("\n"));
-
-        return parts.join("\n");
-      },
-    };
-
-    return generators[options.format]();
-  }
-
-  ast.code = generateWrapper(generateToplevel());
-}
-
-module.exports = generateJS;
+import re
+from typing import Any, Optional
+
+from .parser_runtime import DEFAULT_TRACER_SOURCE, SYNTAX_ERROR_SOURCE, dedentCode
+from .utils_and_types.opcodes import opcodes as op
+from .utils_and_types.rules import isCached
+from .utils_and_types.stack import Stack
+from .utils_and_types.syntax_tree import Grammar, Rule
+from .utils_and_types.utils import bytesEscape, literalSetRegexp, stringEscape, regexpClassEscape, utf8ClassRegexp
+from ..version import VERSION
+
+
+# Classes of at most this many characters are matched by looking the character
+# up in a `frozenset` rather than with a regular expression
+MAX_SET_CLASS_SIZE = 256
+
+
+def generatePY(ast:Grammar, options:dict[str, Any]):
+	"""Generates parser python code."""
+
+	# These only indent non-empty lines to avoid trailing whitespace.
+	def indent4(code:str) -> str:
+		return re.sub("^(.+)$", "    \\1", code, flags=re.MULTILINE)
+
+	def l(i:int) -> str: return f"peg_c{i}"  # |literals[i]| of the abstract machine
+	def r(i:int) -> str: return f"peg_r{i}"  # |classes[i]| of the abstract machine
+	def s(i:int) -> str: return f"peg_s{i}"  # |literalSets[i]| of the abstract machine
+	def e(i:int) -> str: return f"peg_e{i}"  # |expectations[i]| of the abstract machine
+	def f(i:int) -> str: return f"peg_f{i}"  # |actions[i]| of the abstract machine
+
+	def classChars(cls:dict[str, Any]) -> Optional[str]:
+		"""All characters of a class, if it is small enough to match with a `frozenset`"""
+		if cls["ignoreCase"] or "run" in cls or binary:
+			return None
+		if utf8 and any((part[1] if isinstance(part, list) else part) > "\x7F" for part in cls["value"]):
+			return None
+		size = sum(
+			ord(part[1]) - ord(part[0]) + 1 if isinstance(part, list) else 1
+			for part in cls["value"]
+		)
+		if size > MAX_SET_CLASS_SIZE:
+			return None
+		return "".join(
+			"".join(chr(c) for c in range(ord(part[0]), ord(part[1]) + 1))
+			if isinstance(part, list) else
+			part
+			for part in cls["value"]
+		)
+
+	def byteInClass(byte:int, cls:dict[str, Any]) -> bool:
+		"""Whether the byte is in the parts of a class (ignoring `inverted`), for "bytes" input"""
+		chars = [chr(byte)]
+		if cls["ignoreCase"] and chr(byte).isascii() and chr(byte).isalpha():
+			chars.append(chr(byte).swapcase())
+		return any(
+			part[0] <= ch <= part[1] if isinstance(part, list) else part == ch
+			for part in cls["value"]
+			for ch in chars
+		)
+
+	def literalLength(i:int) -> int:
+		"""Length of `literals[i]` in the input, which is in bytes for "utf-8" input"""
+		return len(ast.literals[i].encode("utf-8")) if utf8 else len(ast.literals[i])
+
+	def literalSetLength(i:int) -> int:
+		"""Length of the longest literal of `literalSets[i]` in the input"""
+		return max(len(literal.encode("utf-8")) if utf8 else len(literal) for literal in ast.literalSets[i]["value"])
+
+	cachedRules:list[int]          = [index for index, rule in enumerate(ast.rules) if isCached(rule, options)]
+	cacheWindow:Optional[int]      = options.get("cache_window", None)
+
+	if cacheWindow is not None and cacheWindow <= 0:
+		raise Exception("cache_window must be a positive number of characters")
+
+	# Adds `parse_stream`, and makes each match at the end of the buffer ask the
+	# stream for more input (see `generateStreamDriver`).
+	streaming:bool                 = options.get("streaming", False)
+
+	# With "utf-8" the parser matches the UTF-8 encoding of the input, which may
+	# then be `bytes` or an `mmap`, and `parse_file` is added. Values given to
+	# actions are still `str`; offsets are byte offsets.
+	#
+	# With "bytes" the grammar itself is over bytes (see `generateBytecode`).
+	# The input is any bytes-like object, viewed through a `memoryview`, so
+	# `text()` and matched characters are zero-copy slices of it.
+	inputType:str                  = options.get("input_type", "str")
+	utf8:bool                      = inputType == "utf-8"
+	binary:bool                    = inputType == "bytes"
+
+	if inputType not in ("str", "utf-8", "bytes"):
+		raise Exception("input_type must be \"str\", \"utf-8\" or \"bytes\"")
+
+	if streaming and inputType != "str":
+		raise Exception("streaming is only supported with input_type \"str\"")
+
+	# Parses with every failure silenced, so that a successful parse does no
+	# error bookkeeping. If the parse fails, it is run again reporting failures,
+	# to build the same error as it otherwise would. Tracing would show the
+	# second run, so expectations are always tracked when tracing.
+	lazyExpectations:bool          = options.get("lazy_expectations", False) and not options.get("trace", False)
+
+	# Counts calls, successes, failures, memo hits, characters consumed and time
+	# of each rule into a `Profile` (see `generateProfile`).
+	profile:bool                   = options.get("profile", False)
+
+	if lazyExpectations and streaming:
+		raise Exception("lazy_expectations is not supported with streaming, which can not read the input again")
+
+	def generateTables() -> str:
+		def buildLiteral(literal:str) -> str:
+			if binary:
+				return "b\"" + bytesEscape(literal.encode("latin-1")) + "\""
+			if utf8:
+				return "b\"" + bytesEscape(literal.encode("utf-8")) + "\""
+			return "\"" + stringEscape(literal) + "\""
+
+		def buildRegexp(cls:dict[str, Any]) -> str:
+			if binary and "run" not in cls:
+				# 256 entry table, indexed by byte value
+				return "b\"" + bytesEscape(bytes(
+					int(byteInClass(byte, cls) != cls["inverted"]) for byte in range(256)
+				)) + "\""
+			if binary:
+				pattern = (
+					"["
+					+ ("^" if cls["inverted"] else "")
+					+ "".join(
+						f"\\x{ord(part[0]):0>2X}-\\x{ord(part[1]):0>2X}"
+						if isinstance(part, list) else
+						f"\\x{ord(part):0>2X}"
+						for part in cls["value"]
+					)
+					+ "]"
+					+ cls["run"]
+				)
+				return (
+					"re.compile(b\""
+					+ bytesEscape(pattern.encode("ascii"))
+					+ "\""
+					+ (", re.IGNORECASE" if cls["ignoreCase"] else "")
+					+ ")"
+				)
+			chars = classChars(cls)
+			if chars is not None and utf8:
+				return "frozenset(b\"" + bytesEscape(chars.encode("ascii")) + "\")"
+			if chars is not None:
+				return "frozenset(\"" + stringEscape(chars) + "\")"
+			if utf8:
+				pattern = utf8ClassRegexp(cls["value"], cls["inverted"], cls["ignoreCase"])
+				if "run" in cls:
+					pattern = "(?:" + pattern + ")" + cls["run"]
+				return (
+					"re.compile(b\""
+					+ bytesEscape(pattern.encode("ascii"))
+					+ "\""
+					+ (", re.IGNORECASE" if cls["ignoreCase"] else "")
+					+ ")"
+				)
+			return (
+				"re.compile(\"["
+				+ ("^" if cls["inverted"] else "")
+				+ "".join(
+					stringEscape(regexpClassEscape(part[0]) + "-" + regexpClassEscape(part[1]))
+					if isinstance(part, list) else
+					stringEscape(regexpClassEscape(part))
+					for part in cls["value"]
+				)
+				+ "]"
+				+ cls.get("run", "")
+				+ "\""
+				+ (", re.IGNORECASE" if cls["ignoreCase"] else "")
+				+ ")"
+			)
+
+		def buildLiteralSet(literalSet:dict[str, Any]) -> str:
+			if binary or utf8:
+				pattern = literalSetRegexp(literalSet["value"], literalSet["ignoreCase"], "latin-1" if binary else "utf-8")
+				return "re.compile(b\"" + bytesEscape(pattern.encode("ascii")) + "\")"
+			return "re.compile(\"" + stringEscape(literalSetRegexp(literalSet["value"], literalSet["ignoreCase"])) + "\")"
+
+		def buildExpectation(e:dict[str, Any]) -> str:
+			if e["type"] == "rule":
+				return "peg_otherExpectation(\"" + stringEscape(e["value"]) + "\")"
+			elif e["type"] == "literal":
+				return (
+					"peg_literalExpectation(\""
+					+ stringEscape(e["value"])
+					+ "\", "
+					+ str(e["ignoreCase"])
+					+ ")"
+				)
+			elif e["type"] == "class":
+				parts = ", ".join(
+					"[\"" + stringEscape(part[0]) + "\", \"" + stringEscape(part[1]) + "\"]"
+					if isinstance(part, list) else
+					"\"" + stringEscape(part) + "\""
+					for part in e["value"]
+				)
+				return (
+					"peg_classExpectation(["
+					+ parts + "], "
+					+ str(e["inverted"]) + ", "
+					+ str(e["ignoreCase"])
+					+ ")"
+				)
+			elif e["type"] == "any":
+				return "peg_anyExpectation()"
+			else:
+				raise Exception(f"Unknown expectation type ({e})")
+
+		return "\n".join(
+			[f"{l(i)} = {buildLiteral(c)}" for i, c in enumerate(ast.literals)]
+			+ [""]
+			+ [f"{r(i)} = {buildRegexp(c)}" for i, c in enumerate(ast.classes)]
+			+ [""]
+			+ [f"{e(i)} = {buildExpectation(c)}" for i, c in enumerate(ast.expectations)]
+			+ [""]
+			+ [
+				line
+				for i, c in enumerate(ast.literalSets)
+				for line in [
+					f"{s(i)} = {buildLiteralSet(c)}",
+					f"{s(i)}_expected = ({', '.join(e(index) for index in c['expected'])})",
+				]
+			]
+		)
+
+	def generateFunctions() -> str:
+		# Actions and predicates call `text()`, `location()` etc., which read the
+		# state of the current parse, so they are defined inside `peg_parse`
+		def buildFunc(i:int, a:dict[str, Any]) -> str:
+			return (
+				f"def {f(i)}({', '.join(a['params'])}):\n"
+				+ indent4(dedentCode(a["body"]))
+			)
+
+		return "\n".join(buildFunc(i, c) + "\n" for i, c in enumerate(ast.functions))
+
+
+	def generateRuleHeader(ruleNameCode:str, ruleIndex:int, cached:bool) -> str:
+		parts:list[str] = []
+
+		parts.append("")
+
+		if options.get("trace", False):
+			parts.append("\n".join([
+				"peg_tracer.trace({",
+				"    \"type\": \"rule.enter\",",
+				"    \"rule\": " + ruleNameCode + ",",
+				"    \"location\": peg_computeLocation(startPos, startPos)",
+				"})",
+				"",
+			]))
+
+		if cached:
+			parts.append("key = peg_currPos")
+			if cacheWindow is not None:
+				parts.append("\n".join([
+					"if key >= peg_cacheSweepPos:",
+					"    peg_sweepResultsCache(key)",
+				]))
+			parts.append("\n".join([
+				f"cached = peg_resultsCache{ruleIndex}.get(key)",
+				"",
+				"if cached is not None:",
+				"    peg_currPos = cached[0]",
+				"",
+			]))
+
+			if options.get("trace", False):
+				parts.append("\n".join([
+					"    if cached[1] is not peg_FAILED:",
+					"        peg_tracer.trace({",
+					"            \"type\": \"rule.match\",",
+					"            \"rule\": " + ruleNameCode + ",",
+					"            \"result\": cached[1],",
+					"            \"location\": peg_computeLocation(startPos, peg_currPos)",
+					"        })",
+					"    else:",
+					"        peg_tracer.trace({",
+					"            \"type\": \"rule.fail\",",
+					"            \"rule\": " + ruleNameCode + ",",
+					"            \"location\": peg_computeLocation(startPos, startPos)",
+					"        })",
+					"",
+				]))
+
+			if profile:
+				parts.append(indent4(generateProfileExit(ruleIndex, "cached[1]", True)))
+
+			parts.append("\n".join([
+				"    return cached[1]",
+				"",
+			]))
+
+		return "\n".join(parts)
+
+
+	def generateRuleFooter(ruleNameCode:str, ruleIndex:int, cached:bool, resultCode:str) -> str:
+		parts:list[str] = []
+
+		if cached:
+			parts.append("\n".join([
+				"",
+				f"peg_resultsCache{ruleIndex}[key] = (peg_currPos, {resultCode})",
+			]))
+
+		if options.get("trace", False):
+			parts.append("\n".join([
+				"",
+				"if " + resultCode + " is not peg_FAILED:",
+				"    peg_tracer.trace({",
+				"        \"type\": \"rule.match\",",
+				"        \"rule\": " + ruleNameCode + ",",
+				"        \"result\": " + resultCode + ",",
+				"        \"location\": peg_computeLocation(startPos, peg_currPos)",
+				"    })",
+				"else:",
+				"    peg_tracer.trace({",
+				"        \"type\": \"rule.fail\",",
+				"        \"rule\": " + ruleNameCode + ",",
+				"        \"location\": peg_computeLocation(startPos, startPos)",
+				"    })",
+			]))
+
+		if profile:
+			parts.append("")
+			parts.append(generateProfileExit(ruleIndex, resultCode, False))
+
+		parts.append("\n".join([
+			"",
+			"return " + resultCode,
+		]))
+
+		return "\n".join(parts)
+
+
+	def generateProfileExit(ruleIndex:int, resultCode:str, memoHit:bool) -> str:
+		base = "peg_offsetBase + " if streaming else ""
+		return "\n".join(([
+			f"peg_profileMemoHits[{ruleIndex}] += 1",
+		] if memoHit else []) + [
+			f"if {resultCode} is not peg_FAILED:",
+			f"    peg_profileSuccesses[{ruleIndex}] += 1",
+			f"    peg_profileConsumed[{ruleIndex}] += peg_currPos - startPos",
+			"else:",
+			f"    peg_profileFailures[{ruleIndex}] += 1",
+			f"    peg_profileFailedAt[{base}startPos] = peg_profileFailedAt.get({base}startPos, 0) + 1",
+			f"peg_profileSeconds[{ruleIndex}] += peg_perfCounter() - startTime",
+		])
+
+
+	def generateRuleFunction(rule:Rule) -> str:
+		parts:list[str] = []
+		stack = Stack(rule.name, "s", "var")
+
+		def compile(bc:list[int]) -> str:
+			ip = 0
+			end = len(bc)
+			parts:list[str] = []
+
+			def compileCondition(cond:str, argCount:int, needMore:Optional[str]=None):
+				"""
+				`needMore` is the condition, when the match fails, under which more
+				input could have made it succeed. It only applies when streaming.
+				"""
+				nonlocal ip
+				baseLength = argCount + 3
+				thenLength = bc[ip + baseLength - 2]
+				elseLength = bc[ip + baseLength - 1]
+				thenCode = ""
+				elseCode = ""
+
+				def generateIf():
+					nonlocal ip, thenCode
+					ip += baseLength
+					thenCode = compile(bc[ip:ip + thenLength])
+					ip += thenLength
+
+				def generateElse():
+					nonlocal ip, elseCode
+					elseCode = compile(bc[ip:ip + elseLength])
+					ip += elseLength
+
+				stack.checkedIf(ip, generateIf, generateElse if elseLength > 0 else None)
+
+				if streaming and needMore is not None:
+					elseCode = "\n".join(
+						[f"if not peg_eof and {needMore}: raise peg_NeedMore()"]
+						+ ([elseCode] if elseCode else [])
+					)
+
+				parts.append(f"if {cond}:")
+				parts.append(indent4(thenCode or "pass"))
+				if elseCode:
+					parts.append("else:")
+					parts.append(indent4(elseCode))
+
+			def compileLoop(cond:str):
+				nonlocal ip
+				baseLength = 2
+				bodyLength = bc[ip + baseLength - 1]
+				bodyCode = ""
+
+				def generateBody():
+					nonlocal ip, bodyCode
+					ip += baseLength
+					bodyCode = compile(bc[ip:ip + bodyLength])
+					ip += bodyLength
+
+				stack.checkedLoop(ip, generateBody)
+
+				parts.append(f"while {cond}:")
+				parts.append(indent4(bodyCode or "pass"))
+
+			def compileCall():
+				nonlocal ip
+				baseLength = 4
+				paramsLength = bc[ip + baseLength - 1]
+
+				value = (
+					f(bc[ip + 1]) + "("
+					+ ", ".join(stack.index(p) for p in bc[ip + baseLength:ip + baseLength + paramsLength])
+					+ ")"
+				)
+				stack.pop_many(bc[ip + 2])
+				parts.append(stack.push(value))
+				ip += baseLength + paramsLength
+
+			while ip < end:
+				opcode = bc[ip]
+				if opcode == op.PUSH_EMPTY_STRING:   # PUSH_EMPTY_STRING
+					parts.append(stack.push("\"\""))
+					ip += 1
+
+				elif opcode == op.PUSH_CURR_POS:     # PUSH_CURR_POS
+					parts.append(stack.push("peg_currPos"))
+					ip += 1
+
+				elif opcode == op.PUSH_UNDEFINED:    # PUSH_UNDEFINED
+					parts.append(stack.push("None"))
+					ip += 1
+
+				elif opcode == op.PUSH_NULL:         # PUSH_NULL
+					parts.append(stack.push("None"))
+					ip += 1
+
+				elif opcode == op.PUSH_FAILED:       # PUSH_FAILED
+					parts.append(stack.push("peg_FAILED"))
+					ip += 1
+
+				elif opcode == op.PUSH_EMPTY_ARRAY:  # PUSH_EMPTY_ARRAY
+					parts.append(stack.push("[]"))
+					ip += 1
+
+				elif opcode == op.POP:               # POP
+					stack.pop()
+					ip += 1
+
+				elif opcode == op.POP_CURR_POS:      # POP_CURR_POS
+					parts.append(f"peg_currPos = {stack.pop()}")
+					ip += 1
+
+				elif opcode == op.POP_N:             # POP_N n
+					stack.pop_many(bc[ip + 1])
+					ip += 2
+
+				elif opcode == op.NIP:               # NIP
+					value = stack.pop()
+					stack.pop()
+					parts.append(stack.push(value))
+					ip += 1
+
+				elif opcode == op.APPEND:            # APPEND
+					value = stack.pop()
+					parts.append(f"{stack.top()}.append({value})")
+					ip += 1
+
+				elif opcode == op.WRAP:              # WRAP n
+					parts.append(
+						stack.push("[" + ", ".join(stack.pop_many(bc[ip + 1])) + "]")
+					)
+					ip += 2
+
+				elif opcode == op.TEXT:              # TEXT
+					parts.append(
+						stack.push(f"str(input[{stack.pop()}:peg_currPos], \"utf-8\")")
+						if utf8 else
+						stack.push(f"input[{stack.pop()}:peg_currPos]")
+					)
+					ip += 1
+
+				elif opcode == op.PLUCK:             # PLUCK n, k, p1, ..., pK
+					baseLength = 3
+					paramsLength = bc[ip + baseLength - 1]
+					n = baseLength + paramsLength
+					params = bc[ip + baseLength:ip + n]
+					value = (
+						stack.index(params[0])
+						if paramsLength == 1 else
+						"[" + ", ".join(stack.index(p) for p in params) + "]"
+					)
+					stack.pop_many(bc[ip + 1])
+					parts.append(stack.push(value))
+					ip += n
+
+				elif opcode == op.IF:                # IF t, f
+					compileCondition(stack.top(), 0)
+
+				elif opcode == op.IF_ERROR:          # IF_ERROR t, f
+					compileCondition(f"{stack.top()} is peg_FAILED", 0)
+
+				elif opcode == op.IF_NOT_ERROR:      # IF_NOT_ERROR t, f
+					compileCondition(f"{stack.top()} is not peg_FAILED", 0)
+
+				elif opcode == op.WHILE_NOT_ERROR:   # WHILE_NOT_ERROR b
+					compileLoop(f"{stack.top()} is not peg_FAILED")
+
+				elif opcode == op.MATCH_ANY:         # MATCH_ANY a, f, ...
+					compileCondition("peg_currPos < len(input)", 0, "True")
+
+				elif opcode == op.MATCH_STRING:      # MATCH_STRING s, a, f, ...
+					compileCondition(
+						f"input[peg_currPos:peg_currPos + {literalLength(bc[ip + 1])}] == {l(bc[ip + 1])}"
+						if utf8 or binary else
+						f"input.startswith({l(bc[ip + 1])}, peg_currPos)",
+						1,
+						f"peg_currPos + {literalLength(bc[ip + 1])} > len(input)"
+					)
+
+				elif opcode == op.MATCH_STRING_IC:   # MATCH_STRING_IC s, a, f, ...
+					# "utf-8" input is decoded to lower case it as a `str`, like the
+					# literal was, since `bytes.lower()` only folds ASCII
+					compileCondition(
+						f"str(input[peg_currPos:peg_charsEnd(peg_currPos, {len(ast.literals[bc[ip + 1]])})], \"utf-8\").lower()"
+						+ " == \"" + stringEscape(ast.literals[bc[ip + 1]]) + "\""
+						if utf8 else
+						f"bytes(input[peg_currPos:peg_currPos + {literalLength(bc[ip + 1])}]).lower() == {l(bc[ip + 1])}"
+						if binary else
+						f"input[peg_currPos:peg_currPos + {literalLength(bc[ip + 1])}].lower() == {l(bc[ip + 1])}",
+						1,
+						f"peg_currPos + {literalLength(bc[ip + 1])} > len(input)"
+					)
+
+				elif opcode == op.MATCH_CHAR_CLASS:  # MATCH_CHAR_CLASS c, a, f, ...
+					cls = ast.classes[bc[ip + 1]]
+					if binary:
+						compileCondition(f"peg_currPos < len(input) and {r(bc[ip + 1])}[input[peg_currPos]]", 1)
+					elif classChars(cls) is None:
+						compileCondition(f"{r(bc[ip + 1])}.match(input, peg_currPos)", 1, "peg_currPos >= len(input)")
+					elif cls["inverted"]:
+						compileCondition(f"peg_currPos < len(input) and input[peg_currPos] not in {r(bc[ip + 1])}", 1, "peg_currPos >= len(input)")
+					elif utf8:
+						# indexing bytes gives the byte value, which the set holds
+						compileCondition(f"peg_currPos < len(input) and input[peg_currPos] in {r(bc[ip + 1])}", 1)
+					else:
+						compileCondition(f"input[peg_currPos:peg_currPos + 1] in {r(bc[ip + 1])}", 1, "peg_currPos >= len(input)")
+
+				elif opcode == op.ACCEPT_N and utf8: # ACCEPT_N n
+					# n characters, which is from 1 to 4 bytes each
+					parts.append(stack.push(
+						f"peg_currPos + peg_charLength[input[peg_currPos]]"
+						if bc[ip + 1] == 1 else
+						f"peg_charsEnd(peg_currPos, {bc[ip + 1]})"
+					))
+					parts.append(f"peg_currPos, {stack.top()} = {stack.top()}, str(input[peg_currPos:{stack.top()}], \"utf-8\")")
+					ip += 2
+
+				elif opcode == op.ACCEPT_N:          # ACCEPT_N n
+					parts.append(stack.push(
+						f"input[peg_currPos:peg_currPos + {bc[ip + 1]}]"
+						if bc[ip + 1] > 1 or binary else
+						"input[peg_currPos]"
+					))
+					parts.append(f"peg_currPos += {bc[ip + 1]}")
+					ip += 2
+
+				elif opcode == op.ACCEPT_STRING:     # ACCEPT_STRING s
+					parts.append(stack.push(
+						"\"" + stringEscape(ast.literals[bc[ip + 1]]) + "\""
+						if utf8 else
+						l(bc[ip + 1])
+					))
+					parts.append(f"peg_currPos += {literalLength(bc[ip + 1])}")
+					ip += 2
+
+				elif opcode == op.FAIL:              # FAIL e
+					parts.append(stack.push("peg_FAILED"))
+					parts.append(f"if peg_silentFails == 0: peg_fail({e(bc[ip + 1])})")
+					ip += 2
+
+				elif opcode == op.ACCEPT_CLASS_RUN:  # ACCEPT_CLASS_RUN c, e
+					parts.append(stack.push(f"{r(bc[ip + 1])}.match(input, peg_currPos)"))
+					if streaming:
+						# the run could continue past the end of the buffer
+						parts.append(
+							f"if not peg_eof and ({stack.top()}.end() if {stack.top()} is not None else peg_currPos) >= len(input): raise peg_NeedMore()"
+						)
+					accept = (
+						f"peg_currPos, {stack.top()} = {stack.top()}.end(), str({stack.top()}.group(), \"utf-8\")"
+						if utf8 else
+						f"peg_currPos, {stack.top()} = {stack.top()}.end(), input[peg_currPos:{stack.top()}.end()]"
+						if binary else
+						f"{stack.top()} = {stack.top()}.group()\npeg_currPos += len({stack.top()})"
+					)
+					if ast.classes[bc[ip + 1]]["run"] == "*":
+						parts.append(accept)
+					else:
+						parts.append("\n".join([
+							f"if {stack.top()} is not None:",
+							indent4(accept),
+							"else:",
+							f"    {stack.top()} = peg_FAILED",
+						]))
+					parts.append(f"if peg_silentFails == 0: peg_fail({e(bc[ip + 2])})")
+					ip += 3
+
+				elif opcode == op.ACCEPT_LITERAL_SET: # ACCEPT_LITERAL_SET s
+					literalSet = ast.literalSets[bc[ip + 1]]
+					if streaming:
+						# a longer literal could continue past the end of the buffer
+						parts.append(f"if not peg_eof and peg_currPos + {literalSetLength(bc[ip + 1])} > len(input): raise peg_NeedMore()")
+					parts.append(stack.push(f"{s(bc[ip + 1])}.match(input, peg_currPos)"))
+					accept = (
+						f"peg_currPos, {stack.top()} = {stack.top()}.end(), str({stack.top()}.group(), \"utf-8\")"
+						if utf8 else
+						f"peg_currPos, {stack.top()} = {stack.top()}.end(), input[peg_currPos:{stack.top()}.end()]"
+						if binary and literalSet["ignoreCase"] else
+						f"peg_currPos, {stack.top()} = {stack.top()}.end(), {stack.top()}.group()"
+						if binary else
+						f"{stack.top()} = {stack.top()}.group()\npeg_currPos += len({stack.top()})"
+					)
+					parts.append("\n".join([
+						f"if {stack.top()} is not None:",
+						# the literals before the one that matched were tried and failed
+						f"    if {stack.top()}.lastindex > 1 and peg_silentFails == 0: peg_failAll({s(bc[ip + 1])}_expected[:{stack.top()}.lastindex - 1])",
+						indent4(accept),
+						"else:",
+						f"    {stack.top()} = peg_FAILED",
+						f"    if peg_silentFails == 0: peg_failAll({s(bc[ip + 1])}_expected)",
+					]))
+					ip += 2
+
+				elif opcode == op.LOAD_SAVED_POS:    # LOAD_SAVED_POS p
+					parts.append(f"peg_savedPos = {stack.index(bc[ip + 1])}")
+					ip += 2
+
+				elif opcode == op.UPDATE_SAVED_POS:  # UPDATE_SAVED_POS
+					parts.append("peg_savedPos = peg_currPos")
+					ip += 1
+
+				elif opcode == op.CALL:              # CALL f, n, pc, p1, p2, ..., pN
+					compileCall()
+
+				elif opcode == op.RULE:              # RULE r
+					parts.append(stack.push(f"peg_parse{ast.rules[bc[ip + 1]].name}()"))
+					ip += 2
+
+				elif opcode == op.SILENT_FAILS_ON:   # SILENT_FAILS_ON
+					parts.append("peg_silentFails += 1")
+					ip += 1
+
+				elif opcode == op.SILENT_FAILS_OFF:  # SILENT_FAILS_OFF
+					parts.append("peg_silentFails -= 1")
+					ip += 1
+
+				else:
+					raise Exception(f"Invalid opcode: {bc[ip]}.")
+
+			return "\n".join(parts)
+
+		code = compile(rule.bytecode if rule.bytecode is not None else [])
+
+		ruleIndex = ast.indexOfRule(rule.name)
+		cached    = ruleIndex in cachedRules
+
+		parts.append(f"def peg_parse{rule.name}():")
+		parts.append("    nonlocal peg_currPos, peg_savedPos, peg_silentFails")
+
+		if options.get("trace", False) or profile:
+			parts.append("    startPos = peg_currPos")
+
+		if profile:
+			parts.append("\n".join([
+				"    startTime = peg_perfCounter()",
+				f"    peg_profileCalls[{ruleIndex}] += 1",
+			]))
+
+		parts.append(indent4(generateRuleHeader(
+			"\"" + stringEscape(rule.name) + "\"",
+			ruleIndex,
+			cached
+		)))
+		parts.append(indent4(code))
+		parts.append(indent4(generateRuleFooter(
+			"\"" + stringEscape(rule.name) + "\"",
+			ruleIndex,
+			cached,
+			stack.result()
+		)))
+
+		return "\n".join(parts)
+
+
+	def generateStreamDriver() -> str:
+		"""
+		The body of `parse_stream`, inside `peg_parse`. It parses the start rule
+		over and over, yielding each result as it finishes.
+
+		Only the part of the stream that has not been consumed yet is buffered in
+		`input`. A match that fails, or a run that stops, at the end of the buffer
+		might have gone the other way with more input, so it raises
+		`peg_NeedMore`. The driver then reads more and re-parses the current
+		result from its start. Memoized results survive the retry: a rule
+		that returned without raising never looked past the end of the buffer.
+
+		No backtracking reaches back before the start of the current result, so
+		that start is the oldest live position. Everything before it is dropped
+		from the buffer before reading more, or once it is half of the buffer.
+		Memoized results are keyed by buffer offset, so those before the start
+		are dropped too, and the others are moved back by the dropped length.
+		"""
+		caches = ", ".join(f"peg_resultsCache{index}" for index in cachedRules)
+		return "\n".join([
+			"peg_chunkSize = options.get(\"chunkSize\", 65536)",
+			"peg_chunks = None if peg_stream is None or hasattr(peg_stream, \"read\") else iter(peg_stream)",
+			"",
+			"def peg_readMore(wanted):",
+			"    nonlocal input, peg_eof, peg_lineStarts",
+			"    chunks = [input]",
+			"    total = 0",
+			"    while not peg_eof and (total == 0 or total < wanted):",
+			"        if peg_chunks is None:",
+			"            chunk = peg_stream.read(max(wanted - total, peg_chunkSize))",
+			"            if not chunk:",
+			"                peg_eof = True",
+			"        else:",
+			"            chunk = next(peg_chunks, None)",
+			"            if chunk is None:",
+			"                peg_eof = True",
+			"        if chunk:",
+			"            chunks.append(chunk)",
+			"            total += len(chunk)",
+			"    input = \"\".join(chunks)",
+			"    peg_lineStarts = None",
+			"",
+			"def peg_dropConsumed():",
+			"    nonlocal input, peg_currPos, peg_savedPos, peg_lineStarts, peg_offsetBase, peg_lineBase, peg_columnBase"
+			+ (", peg_cacheSweepPos" if len(cachedRules) > 0 and cacheWindow is not None else ""),
+			"    if peg_currPos == 0:",
+			"        return",
+			"    dropped = input[:peg_currPos]",
+			"    lastLineEnd = dropped.rfind(\"\\n\")",
+			"    if lastLineEnd == -1:",
+			"        peg_columnBase += len(dropped)",
+			"    else:",
+			"        peg_lineBase += dropped.count(\"\\n\")",
+			"        peg_columnBase = len(dropped) - lastLineEnd - 1",
+			"    peg_offsetBase += peg_currPos",
+			"    input = input[peg_currPos:]",
+		] + ([
+			f"    for cache in ({caches},):",
+			"        kept = [",
+			"            (key - peg_currPos, (end - peg_currPos, result))",
+			"            for key, (end, result) in cache.items() if key >= peg_currPos",
+			"        ]",
+			"        cache.clear()",
+			"        cache.update(kept)",
+		] if len(cachedRules) > 0 else []) + ([
+			"    peg_cacheSweepPos = max(peg_cacheSweepPos - peg_currPos, 0)",
+		] if len(cachedRules) > 0 and cacheWindow is not None else []) + [
+			"    peg_currPos = 0",
+			"    peg_savedPos = 0",
+			"    peg_lineStarts = None",
+			"",
+			"def peg_streamResults():",
+			"    nonlocal peg_currPos, peg_silentFails, peg_maxFailPos, peg_maxFailExpected",
+			"    while True:",
+			"        if peg_currPos == len(input):",
+			"            if peg_eof:",
+			"                return",
+			"            peg_dropConsumed()",
+			"            peg_readMore(0)",
+			"            continue",
+			"",
+			"        startPos = peg_currPos",
+			"        peg_maxFailPos = startPos",
+			"        peg_maxFailExpected = []",
+		] + ([
+			# A result memoized at `startPos` while matching the previous result
+			# may be a failure that was silenced there, which would now fail
+			# without reporting what was expected. Those are parsed again.
+			f"        for cache in ({caches},):",
+			"            cache.pop(startPos, None)",
+		] if len(cachedRules) > 0 else []) + [
+			"        try:",
+			"            result = peg_startRuleFunction()",
+			"        except peg_NeedMore:",
+			"            peg_currPos = startPos",
+			"            peg_silentFails = 0",
+			"            peg_dropConsumed()",
+			"            peg_readMore(len(input))",  # doubles the buffered part of the result, so retries stay linear overall
+			"            continue",
+			"",
+			"        if result is peg_FAILED or peg_currPos == startPos:",
+			"            if result is not peg_FAILED:",
+			"                peg_fail(peg_endExpectation())",
+			"",
+			"            raise peg_buildStructuredError(",
+			"                peg_maxFailExpected,",
+			"                input[peg_maxFailPos] if peg_maxFailPos < len(input) else None,",
+			"                peg_computeLocation(peg_maxFailPos, peg_maxFailPos + 1)",
+			"                if peg_maxFailPos < len(input) else",
+			"                peg_computeLocation(peg_maxFailPos, peg_maxFailPos)",
+			"            )",
+			"",
+			"        yield result",
+			"",
+			"        if peg_currPos * 2 >= len(input):",
+			"            peg_dropConsumed()",
+			"",
+			"if peg_stream is not None:",
+			"    return peg_streamResults()",
+		])
+
+
+	def generateProfile() -> str:
+		# Counters are plain lists indexed by rule index, so that counting in a
+		# rule function is an index into a list bound in `peg_parse`.
+		return "\n".join([
+			"class peg_Profile:",
+			"    ruleNames = (" + "".join("\"" + stringEscape(rule.name) + "\", " for rule in ast.rules) + ")",
+			"",
+			"    def __init__(self):",
+			"        self.reset()",
+			"",
+			"    def reset(self):",
+			"        count = len(self.ruleNames)",
+			"        self.calls = [0] * count",
+			"        self.successes = [0] * count",
+			"        self.failures = [0] * count",
+			"        self.memoHits = [0] * count",
+			"        self.consumed = [0] * count",
+			"        self.seconds = [0.0] * count",
+			"        self.failedAt = {}",  # offset -> rule calls that started there and failed
+			"",
+			"    def rule(self, index):",
+			"        return {",
+			"            \"rule\": self.ruleNames[index],",
+			"            \"calls\": self.calls[index],",
+			"            \"successes\": self.successes[index],",
+			"            \"failures\": self.failures[index],",
+			"            \"memoHits\": self.memoHits[index],",
+			"            \"consumed\": self.consumed[index],",
+			"            \"seconds\": self.seconds[index],",
+			"        }",
+			"",
+			"    def hottest(self, count=10, key=\"seconds\"):",
+			"        rules = [self.rule(index) for index, _ in enumerate(self.ruleNames)]",
+			"        rules.sort(key=lambda rule: rule[key], reverse=True)",
+			"        return [rule for rule in rules[:count] if rule[\"calls\"]]",
+			"",
+			"    def mostBacktracked(self, count=10):",
+			"        positions = sorted(self.failedAt.items(), key=lambda item: item[1], reverse=True)",
+			"        return positions[:count]",
+			"",
+			"    def report(self, count=10):",
+			"        width = max([len(\"rule\")] + [len(name) for name in self.ruleNames])",
+			"        lines = [f\"{'rule':<{width}}  {'calls':>9}  {'fails':>9}  {'memo':>9}  {'consumed':>9}  {'ms':>9}\"]",
+			"        for rule in self.hottest(count):",
+			"            lines.append(",
+			"                f\"{rule['rule']:<{width}}  {rule['calls']:>9}  {rule['failures']:>9}  {rule['memoHits']:>9}\"",
+			"                + f\"  {rule['consumed']:>9}  {rule['seconds'] * 1e3:9.3f}\"",
+			"            )",
+			"        lines.append(\"\")",
+			"        lines.append(f\"{'offset':>9}  {'failed calls':>12}\")",
+			"        for offset, failures in self.mostBacktracked(count):",
+			"            lines.append(f\"{offset:>9}  {failures:>12}\")",
+			"        return \"\\n\".join(lines)",
+			"",
+			"peg_defaultProfile = peg_Profile()",
+			"",
+		])
+
+	def generateToplevel() -> str:
+		parts:list[str] = []
+
+		if ast.top_level_initializer is not None:
+			parts.append(dedentCode(ast.top_level_initializer.code))
+			parts.append("")
+
+		if utf8:
+			parts.append("\n".join([
+				"# bytes in the UTF-8 encoding of a character, by its first byte",
+				"peg_charLength = bytes(1 if b < 0xC0 else 2 if b < 0xE0 else 3 if b < 0xF0 else 4 for b in range(256))",
+				"",
+			]))
+
+		if streaming:
+			parts.append("\n".join([
+				"class peg_NeedMore(Exception):",
+				"    \"\"\"Raised when a match reaches the end of the buffered part of a stream\"\"\"",
+				"",
+			]))
+
+		parts.append(SYNTAX_ERROR_SOURCE)
+
+		if options.get("trace", False):
+			parts.append(DEFAULT_TRACER_SOURCE)
+
+		if profile:
+			parts.append(generateProfile())
+
+		# Everything that does not depend on the input is built once, when the
+		# parser module is executed, rather than on each call to `peg_parse`.
+		parts.append("\n".join([
+			"peg_FAILED = object()",
+			"",
+			"def peg_literalExpectation(text, ignoreCase):",
+			"    return {\"type\": \"literal\", \"text\": text, \"ignoreCase\": ignoreCase}",
+			"",
+			"def peg_classExpectation(parts, inverted, ignoreCase):",
+			"    return {\"type\": \"class\", \"parts\": parts, \"inverted\": inverted, \"ignoreCase\": ignoreCase}",
+			"",
+			"def peg_anyExpectation():",
+			"    return {\"type\": \"any\"}",
+			"",
+			"def peg_endExpectation():",
+			"    return {\"type\": \"end\"}",
+			"",
+			"def peg_otherExpectation(description):",
+			"    return {\"type\": \"other\", \"description\": description}",
+			"",
+			"def peg_buildSimpleError(message, location):",
+			"    return peg_SyntaxError(message, None, None, location)",
+			"",
+			"def peg_buildStructuredError(expected, found, location):",
+			"    return peg_SyntaxError(",
+			"        peg_SyntaxError.buildMessage(expected, found),",
+			"        expected,",
+			"        found,",
+			"        location",
+			"    )",
+			"",
+			generateTables(),
+			"",
+		]))
+
+		startRuleFunctions = (
+			"{"
+			+ ", ".join(f"\"{rule}\": peg_parse{rule}" for rule in options["allowed_start_rules"])
+			+ "}"
+		)
+		startRuleFunction = f"peg_parse{options['allowed_start_rules'][0]}"
+
+		# Offsets reported to actions and errors are relative to the whole stream
+		# when streaming, so they add the length of the input already dropped.
+		base = "peg_offsetBase + " if streaming else ""
+		newline = "b\"\\n\"" if utf8 else "\"\\n\""
+
+		parts.append("\n".join([
+			"def peg_parse(input, options=None, peg_stream=None):" if streaming else
+			"def peg_parse(input, options=None, peg_report=False):" if lazyExpectations else
+			"def peg_parse(input, options=None):",
+			"    options = options if options is not None else {}",
+			"",
+		] + ([
+			"    if isinstance(input, str):",
+			"        input = input.encode(\"utf-8\")",
+			"",
+		] if utf8 else [
+			"    input = memoryview(input).cast(\"B\")",
+			"",
+		] if binary else []) + [
+			"    peg_source = options.get(\"grammarSource\")",
+			"",
+			"    peg_currPos = 0",
+			"    peg_savedPos = 0",
+			"    peg_lineStarts = None",  # offsets at which each line starts, built on first use
+			"    peg_maxFailPos = 0",
+			"    peg_maxFailExpected = []",
+			"    peg_silentFails = 0 if peg_report else 1" if lazyExpectations else
+			"    peg_silentFails = 0",   # 0 = report failures, > 0 = silence failures
+			"",
+		]))
+
+		if streaming:
+			parts.append("\n".join([
+				"    peg_eof = peg_stream is None",  # no more input can be read
+				"    peg_offsetBase = 0",  # characters dropped from the front of `input`
+				"    peg_lineBase = 0",    # lines ended in the dropped characters
+				"    peg_columnBase = 0",  # characters dropped since the last line ended
+				"",
+			]))
+
+		if len(cachedRules) > 0:
+			# One compact store per memoized rule, keyed by start position. Each
+			# entry is a `(nextPos, result)` tuple.
+			parts.append("\n".join(
+				[f"    peg_resultsCache{index} = {{}}" for index in cachedRules]
+				+ [""]
+			))
+			if cacheWindow is not None:
+				# Entries further than `cacheWindow` characters behind the furthest
+				# position a memoized rule has been entered at are evicted. This keeps
+				# peak memory flat on long inputs; backtracking further than the window
+				# is still correct, it just re-parses instead of hitting the cache.
+				parts.append("\n".join([
+					"    peg_resultsCaches = [" + ", ".join(f"peg_resultsCache{index}" for index in cachedRules) + "]",
+					f"    peg_cacheSweepPos = {cacheWindow}",
+					"",
+					"    def peg_sweepResultsCache(pos):",
+					"        nonlocal peg_cacheSweepPos",
+					f"        horizon = pos - {cacheWindow}",
+					"        for cache in peg_resultsCaches:",
+					"            stale = [key for key in cache if key < horizon]",
+					"            for key in stale:",
+					"                del cache[key]",
+					f"        peg_cacheSweepPos = pos + {cacheWindow}",
+					"",
+				]))
+
+		if options.get("trace", False):
+			parts.append("\n".join([
+				"    peg_tracer = options[\"tracer\"] if \"tracer\" in options else peg_DefaultTracer()",
+				"",
+			]))
+
+		if profile:
+			parts.append("\n".join([
+				"    peg_profile = options[\"profile\"] if \"profile\" in options else peg_defaultProfile",
+				"    peg_profileCalls = peg_profile.calls",
+				"    peg_profileSuccesses = peg_profile.successes",
+				"    peg_profileFailures = peg_profile.failures",
+				"    peg_profileMemoHits = peg_profile.memoHits",
+				"    peg_profileConsumed = peg_profile.consumed",
+				"    peg_profileSeconds = peg_profile.seconds",
+				"    peg_profileFailedAt = peg_profile.failedAt",
+				"",
+			]))
+
+		parts.append("\n".join([
+			"    def text():",
+			"        return str(input[peg_savedPos:peg_currPos], \"utf-8\")" if utf8 else
+			"        return input[peg_savedPos:peg_currPos]",
+			"",
+			"    def offset():",
+			f"        return {base}peg_savedPos",
+			"",
+			"    def range():",
+			"        return {",
+			"            \"source\": peg_source,",
+			f"            \"start\": {base}peg_savedPos,",
+			f"            \"end\": {base}peg_currPos",
+			"        }",
+			"",
+			"    def location():",
+			"        return peg_computeLocation(peg_savedPos, peg_currPos)",
+			"",
+			"    def expected(description, location=None):",
+			"        location = location if location is not None else peg_computeLocation(peg_savedPos, peg_currPos)",
+			"",
+			"        raise peg_buildStructuredError(",
+			"            [peg_otherExpectation(description)],",
+			"            str(text(), \"latin-1\")," if binary else
+			"            text(),",
+			"            location",
+			"        )",
+			"",
+			"    def error(message, location=None):",
+			"        location = location if location is not None else peg_computeLocation(peg_savedPos, peg_currPos)",
+			"",
+			"        raise peg_buildSimpleError(message, location)",
+			"",
+			"    def peg_computePosDetails(pos):",
+			"        nonlocal peg_lineStarts",
+			"",
+			"        if peg_lineStarts is None:",
+			"            peg_lineStarts = [0]",
+		] + ([
+			# a memoryview has no `find`
+			"            peg_lineStarts.extend(match.end() for match in re.finditer(b\"\\n\", input))",
+		] if binary else [
+			f"            p = input.find({newline})",
+			"            while p != -1:",
+			"                peg_lineStarts.append(p + 1)",
+			f"                p = input.find({newline}, p + 1)",
+		]) + [
+			"",
+			"        line = peg_bisect(peg_lineStarts, pos)",
+			"",
+		] + ([
+			# columns count characters, not bytes
+			"        return {",
+			"            \"line\": line,",
+			"            \"column\": len(str(input[peg_lineStarts[line - 1]:pos], \"utf-8\")) + 1",
+			"        }",
+		] if utf8 else [
+			"        return {",
+			"            \"line\": peg_lineBase + line,",
+			"            \"column\": pos - peg_lineStarts[line - 1] + 1 + (peg_columnBase if line == 1 else 0)",
+			"        }",
+		] if streaming else [
+			"        return {",
+			"            \"line\": line,",
+			"            \"column\": pos - peg_lineStarts[line - 1] + 1",
+			"        }",
+		]) + [
+			"",
+			"    def peg_computeLocation(startPos, endPos):",
+			"        startPosDetails = peg_computePosDetails(startPos)",
+			"        endPosDetails = peg_computePosDetails(endPos)",
+			"",
+			"        return {",
+			"            \"source\": peg_source,",
+			"            \"start\": {",
+			f"                \"offset\": {base}startPos,",
+			"                \"line\": startPosDetails[\"line\"],",
+			"                \"column\": startPosDetails[\"column\"]",
+			"            },",
+			"            \"end\": {",
+			f"                \"offset\": {base}endPos,",
+			"                \"line\": endPosDetails[\"line\"],",
+			"                \"column\": endPosDetails[\"column\"]",
+			"            }",
+			"        }",
+			"",
+		] + ([
+			"    def peg_charsEnd(pos, n):",  # `range` is shadowed by the action helper
+			"        while n > 0 and pos < len(input):",
+			"            pos += peg_charLength[input[pos]]",
+			"            n -= 1",
+			"        return pos",
+			"",
+			"    def peg_charAt(pos):",
+			"        return str(input[pos:pos + peg_charLength[input[pos]]], \"utf-8\")",
+			"",
+		] if utf8 else []) + [
+			"    def peg_fail(expected):",
+			"        nonlocal peg_maxFailPos, peg_maxFailExpected",
+			"        if peg_currPos < peg_maxFailPos:",
+			"            return",
+			"",
+			"        if peg_currPos > peg_maxFailPos:",
+			"            peg_maxFailPos = peg_currPos",
+			"            peg_maxFailExpected = []",
+			"",
+			"        peg_maxFailExpected.append(expected)",
+			"",
+			"    def peg_failAll(expected):",
+			"        nonlocal peg_maxFailPos, peg_maxFailExpected",
+			"        if peg_currPos < peg_maxFailPos:",
+			"            return",
+			"",
+			"        if peg_currPos > peg_maxFailPos:",
+			"            peg_maxFailPos = peg_currPos",
+			"            peg_maxFailExpected = []",
+			"",
+			"        peg_maxFailExpected.extend(expected)",
+			"",
+			indent4(generateFunctions()),
+		]))
+
+		for rule in ast.rules:
+			parts.append(indent4(generateRuleFunction(rule)))
+			parts.append("")
+
+		if ast.initializer is not None:
+			parts.append(indent4(dedentCode(ast.initializer.code)))
+			parts.append("")
+
+		parts.append("\n".join([
+			f"    peg_startRuleFunctions = {startRuleFunctions}",
+			f"    peg_startRuleFunction = {startRuleFunction}",
+			"",
+			"    if \"startRule\" in options:",
+			"        if options[\"startRule\"] not in peg_startRuleFunctions:",
+			"            raise Exception(\"Can't start parsing from rule \\\"\" + options[\"startRule\"] + \"\\\".\")",
+			"",
+			"        peg_startRuleFunction = peg_startRuleFunctions[options[\"startRule\"]]",
+			"",
+		]))
+
+		if streaming:
+			parts.append(indent4(generateStreamDriver()))
+			parts.append("")
+
+		parts.append("\n".join([
+			"    peg_result = peg_startRuleFunction()",
+			"",
+			"    if peg_result is not peg_FAILED and peg_currPos == len(input):",
+			"        return peg_result",
+		] + ([
+			"    elif not peg_report:",
+			"        return peg_parse(input, options, True)",
+		] if lazyExpectations else []) + [
+			"    else:",
+			"        if peg_result is not peg_FAILED and peg_currPos < len(input):",
+			"            peg_fail(peg_endExpectation())",
+			"",
+			"        raise peg_buildStructuredError(",
+			"            peg_maxFailExpected,",
+			"            peg_charAt(peg_maxFailPos) if peg_maxFailPos < len(input) else None," if utf8 else
+			"            str(input[peg_maxFailPos:peg_maxFailPos + 1], \"latin-1\") if peg_maxFailPos < len(input) else None," if binary else
+			"            input[peg_maxFailPos] if peg_maxFailPos < len(input) else None,",
+			"            peg_computeLocation(peg_maxFailPos, peg_charsEnd(peg_maxFailPos, 1))" if utf8 else
+			"            peg_computeLocation(peg_maxFailPos, peg_maxFailPos + 1)",
+			"            if peg_maxFailPos < len(input) else",
+			"            peg_computeLocation(peg_maxFailPos, peg_maxFailPos)",
+			"        )",
+		]))
+
+		if streaming:
+			parts.append("\n".join([
+				"",
+				"def peg_parse_stream(stream, options=None):",
+				"    \"\"\"",
+				"    Parses a file object, or an iterable of string chunks, reading it as",
+				"    needed. Yields the result of each match of the start rule in turn.",
+				"    \"\"\"",
+				"    return peg_parse(\"\", options, stream)",
+			]))
+
+		if utf8:
+			parts.append("\n".join([
+				"",
+				"def peg_parse_file(path, options=None):",
+				"    \"\"\"",
+				"    Parses the file at `path` through a read-only memory map, without",
+				"    reading it into memory or decoding it first.",
+				"    \"\"\"",
+				"    with open(path, \"rb\") as file:",
+				"        if os.fstat(file.fileno()).st_size == 0:",
+				"            return peg_parse(b\"\", options)",  # empty files cannot be mapped
+				"        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as input:",
+				"            return peg_parse(input, options)",
+			]))
+
+		if binary:
+			parts.append("\n".join([
+				"",
+				"def peg_parse_file(path, options=None):",
+				"    \"\"\"",
+				"    Parses the file at `path` through a read-only memory map, without",
+				"    reading it into memory. Slices of the file in the result keep the",
+				"    map open; it is closed once they are released.",
+				"    \"\"\"",
+				"    with open(path, \"rb\") as file:",
+				"        if os.fstat(file.fileno()).st_size == 0:",
+				"            return peg_parse(b\"\", options)",
+				"        input = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)",
+				"    return peg_parse(input, options)",
+			]))
+
+		return "\n".join(parts)
+
+
+	def generateWrapper(toplevelCode:str) -> str:
+		# TODO: the javascript `format` option (amd, commonjs, es, umd, ...) has no
+		#       meaning for python. The generated code is always a plain module.
+		def generateGeneratedByComment() -> str:
+			return "\n".join([
+				f"# Generated by peggypy {VERSION}.",
+				"#",
+				"# https://github.com/thehappycheese/peggypy",
+			])
+
+		def generateParserExports() -> str:
+			return "\n".join(
+				[
+					"SyntaxError = peg_SyntaxError",
+					"parse = peg_parse",
+				] + (
+					["parse_stream = peg_parse_stream"] if streaming else []
+				) + (
+					["parse_file = peg_parse_file"] if utf8 or binary else []
+				) + (
+					["DefaultTracer = peg_DefaultTracer"] if options.get("trace", False) else []
+				) + (
+					[
+						"Profile = peg_Profile",
+						"profile = peg_defaultProfile",
+					] if profile else []
+				)
+			)
+
+		return "\n".join([
+			generateGeneratedByComment(),
+			"",
+			"import re",
+		] + ([
+			"import mmap",
+			"import os",
+		] if utf8 or binary else []) + [
+			"from bisect import bisect_right as peg_bisect",
+		] + ([
+			"from time import perf_counter as peg_perfCounter",
+		] if profile else []) + [
+			"",
+			toplevelCode,
+			"",
+			generateParserExports(),
+			"",
+		])
+
+	ast.code = generateWrapper(generateToplevel())
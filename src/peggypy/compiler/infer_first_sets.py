@@ -0,0 +1,215 @@
+from dataclasses import dataclass
+from typing import Any, Optional as Typing_Optional, Union
+from .utils_and_types.visitor import Visitor
+from .utils_and_types.rules import isCached
+from .utils_and_types.syntax_tree import (
+	MATCH,
+	Choice,
+	Class,
+	Expression,
+	Grammar,
+	Literal,
+	Named,
+	Node,
+	Rule_Ref,
+	Sequence,
+	match_of,
+)
+
+
+@dataclass
+class _First:
+	"""What an expression can start with, and what it does at a character it can not start with"""
+	parts:list[Union[str, list[str]]]  # the characters it can start with, as `Class.parts`
+	ignoreCase:bool
+	nullable:bool                      # it may succeed without consuming anything
+	expected:list[dict[str, Any]]      # the expectations it reports, in order, before it fails
+	tests:int                          # the number of tests and rule calls made before it fails
+
+
+def _union(parts:list[Union[str, list[str]]], more:list[Union[str, list[str]]]) -> list[Union[str, list[str]]]:
+	"""Merges two `Class.parts` into sorted, non-overlapping ranges"""
+	ranges = sorted(
+		(ord(part[0]), ord(part[1])) if isinstance(part, list) else (ord(part), ord(part))
+		for part in parts + more
+	)
+	merged:list[list[int]] = []
+	for start, end in ranges:
+		if len(merged) > 0 and start <= merged[-1][1] + 1:
+			merged[-1][1] = max(merged[-1][1], end)
+		else:
+			merged.append([start, end])
+	return [chr(start) if start == end else [chr(start), chr(end)] for start, end in merged]
+
+
+def _firstUnknown(self:Visitor, node:Node, options:dict[str, Any]) -> Typing_Optional[_First]:
+	# Predicates run code or look ahead without consuming, and `.` starts with
+	# any character, so what they do can not be told from the current character
+	return None
+
+
+def _firstExpression(self:Visitor, node:Expression, options:dict[str, Any]) -> Typing_Optional[_First]:
+	return self.visit(node.expression, options)
+
+
+def _firstOptional(self:Visitor, node:Expression, options:dict[str, Any]) -> Typing_Optional[_First]:
+	first = self.visit(node.expression, options)
+	if first is None:
+		return None
+	return _First(first.parts, first.ignoreCase, True, first.expected, first.tests)
+
+
+def _firstAction(self:Visitor, node:Expression, options:dict[str, Any]) -> Typing_Optional[_First]:
+	first = self.visit(node.expression, options)
+	if first is None or first.nullable:
+		# the action would run even though nothing is consumed
+		return None
+	return first
+
+
+def _firstNamed(self:Visitor, node:Named, options:dict[str, Any]) -> Typing_Optional[_First]:
+	first = self.visit(node.expression, options)
+	if first is None:
+		return None
+	if first.nullable:
+		return _First(first.parts, first.ignoreCase, True, [], first.tests)
+	if match_of(node) == MATCH.ALWAYS:
+		return None
+	return _First(first.parts, first.ignoreCase, False, [{"type": "rule", "value": node.name}], first.tests)
+
+
+def _firstChoice(self:Visitor, node:Choice, options:dict[str, Any]) -> Typing_Optional[_First]:
+	result = _First([], False, False, [], 0)
+	for alternative in node.alternatives:
+		first = self.visit(alternative, options)
+		if first is None:
+			return None
+		result.parts = _union(result.parts, first.parts)
+		result.ignoreCase = result.ignoreCase or first.ignoreCase
+		if not result.nullable:
+			# alternatives after one that succeeds without consuming are not tried
+			result.expected = result.expected + first.expected
+			result.tests += first.tests
+			result.nullable = first.nullable
+	return result
+
+
+def _firstSequence(self:Visitor, node:Sequence, options:dict[str, Any]) -> Typing_Optional[_First]:
+	result = _First([], False, True, [], 0)
+	for element in node.elements:
+		first = self.visit(element, options)
+		if first is None:
+			return None
+		result.parts = _union(result.parts, first.parts)
+		result.ignoreCase = result.ignoreCase or first.ignoreCase
+		result.expected = result.expected + first.expected
+		result.tests += first.tests
+		if not first.nullable:
+			result.nullable = False
+			break
+	return result
+
+
+def _firstRuleRef(self:Visitor, node:Rule_Ref, options:dict[str, Any]) -> Typing_Optional[_First]:
+	firsts:dict[str, Typing_Optional[_First]] = options["firsts"]
+	if node.name not in firsts:
+		rule = options["grammar"].findRule(node.name)
+		# A cached rule does not report its expectations again when it is re-tried
+		# at the same offset, so skipping it would change the reported ones
+		firsts[node.name] = None # recursion
+		if rule is not None and not isCached(rule, options):
+			firsts[node.name] = self.visit(rule, options)
+	first = firsts[node.name]
+	if first is None:
+		return None
+	return _First(first.parts, first.ignoreCase, first.nullable, first.expected, first.tests + 1)
+
+
+def _firstLiteral(self:Visitor, node:Literal, options:dict[str, Any]) -> Typing_Optional[_First]:
+	if len(node.value) == 0:
+		return _First([], False, True, [], 0)
+	return _First([node.value[0]], node.ignoreCase, False, [{
+		"type"       : "literal",
+		"value"      : node.value,
+		"ignoreCase" : node.ignoreCase,
+	}], 1)
+
+
+def _firstClass(self:Visitor, node:Class, options:dict[str, Any]) -> Typing_Optional[_First]:
+	if node.inverted:
+		return None
+	return _First(_union(node.parts, []), node.ignoreCase, False, [{
+		"type"       : "class",
+		"value"      : node.parts,
+		"inverted"   : node.inverted,
+		"ignoreCase" : node.ignoreCase,
+	}], 1)
+
+
+first_set_visitor = Visitor({
+	"rule"         : _firstExpression,
+	"named"        : _firstNamed,
+	"choice"       : _firstChoice,
+	"action"       : _firstAction,
+	"sequence"     : _firstSequence,
+	"labeled"      : _firstExpression,
+	"text"         : _firstExpression,
+	"simple_and"   : _firstUnknown,
+	"simple_not"   : _firstUnknown,
+	"optional"     : _firstOptional,
+	"zero_or_more" : _firstOptional,
+	"one_or_more"  : _firstExpression,
+	"group"        : _firstExpression,
+	"semantic_and" : _firstUnknown,
+	"semantic_not" : _firstUnknown,
+	"rule_ref"     : _firstRuleRef,
+	"literal"      : _firstLiteral,
+	"class"        : _firstClass,
+	"any"          : _firstUnknown,
+})
+
+
+def _dispatchChoice(self:Visitor, node:Choice, options:dict[str, Any]):
+	dispatch:list[Typing_Optional[tuple[Class, list[dict[str, Any]]]]] = []
+	for alternative in node.alternatives:
+		first = first_set_visitor.visit(alternative, options)
+		if (
+			first is None
+			or first.nullable
+			or len(first.parts) == 0
+			or match_of(alternative) == MATCH.ALWAYS
+			# a single test is as cheap as the check that would skip it
+			or first.tests < 2
+		):
+			dispatch.append(None)
+		else:
+			dispatch.append((Class(alternative.location, first.parts, False, first.ignoreCase), first.expected))
+		self.visit(alternative, options)
+	if any(entry is not None for entry in dispatch):
+		node.dispatch = dispatch
+
+
+def infer_first_sets(grammar:Grammar, options:dict[str, Any]):
+	"""
+	Works out the FIRST set of each alternative of each choice: the characters
+	it can start with, from its leading literals, classes and rule references.
+	`generateBytecode` then only tries an alternative if the current character
+	is in its FIRST set, rather than calling the rules it starts with only to
+	see them fail.
+
+	Ordered choice is unchanged: an alternative that is skipped would have
+	failed at the current offset, so the alternatives are still tried in order.
+	A skipped alternative would also have reported some expectations on its way
+	to failing; those are found here, and reported in its place.
+
+	An alternative is always tried if it may succeed without consuming, may
+	start with any character, or runs code before consuming (a predicate, or an
+	action around something that may match nothing). It is also always tried
+	when it starts with a cached rule. Nothing is skipped when tracing or
+	profiling, since that would change the trace events and the rule counts.
+	"""
+	if options.get("trace", False) or options.get("profile", False):
+		return
+	Visitor({
+		"choice" : _dispatchChoice,
+	}).visit(grammar, {**options, "grammar":grammar, "firsts":{}})
@@ -0,0 +1,221 @@
+import copy
+from typing import Any, Callable, Optional as Typing_Optional
+from .utils_and_types.visitor import Visitor
+from .utils_and_types.rules import collect_rule_refs_walker, isCached
+from .utils_and_types.syntax_tree import (
+	Choice,
+	Expression,
+	Grammar,
+	Group,
+	Location,
+	Node,
+	Rule,
+	Rule_Ref,
+	Sequence,
+)
+
+
+# Rules with an expression of at most this many nodes are inlined, unless
+# `options["inline_budget"]` says otherwise
+DEFAULT_INLINE_BUDGET = 8
+
+
+def _sizeWithChildren(self:Visitor, children:list[Node], options:dict[str, Any]) -> Typing_Optional[int]:
+	"""One for the node itself, plus the size of each child, or `None` if any child is `None`"""
+	size = 1
+	for child in children:
+		childSize = self.visit(child, options)
+		if childSize is None:
+			return None
+		size += childSize
+	return size
+
+
+def _sizeExpression(self:Visitor, node:Expression, options:dict[str, Any]) -> Typing_Optional[int]:
+	return _sizeWithChildren(self, [node.expression], options)
+
+
+def _sizeChoice(self:Visitor, node:Choice, options:dict[str, Any]) -> Typing_Optional[int]:
+	return _sizeWithChildren(self, node.alternatives, options)
+
+
+def _sizeSequence(self:Visitor, node:Sequence, options:dict[str, Any]) -> Typing_Optional[int]:
+	return _sizeWithChildren(self, node.elements, options)
+
+
+def _sizeLeaf(self:Visitor, node:Node, options:dict[str, Any]) -> int:
+	return 1
+
+
+def _sizeCode(self:Visitor, node:Node, options:dict[str, Any]) -> Typing_Optional[int]:
+	return None
+
+
+# The number of nodes of an expression, or `None` if it runs code. Action and
+# predicate code sees the labels of the expression around it, so moving it
+# into another rule could change what its names refer to.
+size_visitor = Visitor({
+	"rule"         : _sizeExpression,
+	"named"        : _sizeExpression,
+	"choice"       : _sizeChoice,
+	"action"       : _sizeCode,
+	"sequence"     : _sizeSequence,
+	"labeled"      : _sizeExpression,
+	"text"         : _sizeExpression,
+	"simple_and"   : _sizeExpression,
+	"simple_not"   : _sizeExpression,
+	"optional"     : _sizeExpression,
+	"zero_or_more" : _sizeExpression,
+	"one_or_more"  : _sizeExpression,
+	"group"        : _sizeExpression,
+	"semantic_and" : _sizeCode,
+	"semantic_not" : _sizeCode,
+	"rule_ref"     : _sizeLeaf,
+	"literal"      : _sizeLeaf,
+	"class"        : _sizeLeaf,
+	"any"          : _sizeLeaf,
+})
+
+
+def _sizeOf(node:Node) -> Typing_Optional[int]:
+	return size_visitor.visit(node, {})
+
+
+def _replaceExpression(self:Visitor, node:Expression, options:dict[str, Any]) -> Node:
+	node.expression = self.visit(node.expression, options)
+	return node
+
+
+def _replaceChoice(self:Visitor, node:Choice, options:dict[str, Any]) -> Node:
+	node.alternatives = [self.visit(alternative, options) for alternative in node.alternatives]
+	return node
+
+
+def _replaceSequence(self:Visitor, node:Sequence, options:dict[str, Any]) -> Node:
+	node.elements = [self.visit(element, options) for element in node.elements]
+	return node
+
+
+def _replaceLeaf(self:Visitor, node:Node, options:dict[str, Any]) -> Node:
+	return node
+
+
+def _replaceRuleRef(self:Visitor, node:Rule_Ref, options:dict[str, Any]) -> Node:
+	inlined:dict[str, Node] = options["inlined"]
+	if node.name not in inlined:
+		return node
+	options["counts"][node.name] = options["counts"].get(node.name, 0) + 1
+	# The group keeps the labels of the inlined expression to itself
+	group = Group(node.location, copy.deepcopy(inlined[node.name]))
+	group.match = group.expression.match
+	return group
+
+
+# Replaces each reference to a rule in `options["inlined"]` with a copy of its
+# expression, returning the node that takes the place of the one visited
+replace_visitor = Visitor({
+	"rule"         : _replaceExpression,
+	"named"        : _replaceExpression,
+	"choice"       : _replaceChoice,
+	"action"       : _replaceExpression,
+	"sequence"     : _replaceSequence,
+	"labeled"      : _replaceExpression,
+	"text"         : _replaceExpression,
+	"simple_and"   : _replaceExpression,
+	"simple_not"   : _replaceExpression,
+	"optional"     : _replaceExpression,
+	"zero_or_more" : _replaceExpression,
+	"one_or_more"  : _replaceExpression,
+	"group"        : _replaceExpression,
+	"semantic_and" : _replaceLeaf,
+	"semantic_not" : _replaceLeaf,
+	"rule_ref"     : _replaceRuleRef,
+	"literal"      : _replaceLeaf,
+	"class"        : _replaceLeaf,
+	"any"          : _replaceLeaf,
+})
+
+
+def inline_rules(grammar:Grammar, options:dict[str, Any]):
+	"""
+	Replaces references to small rules with a copy of the rule's expression,
+	saving a function call each time the rule is used. A rule is inlined if:
+
+	- its expression has at most `options["inline_budget"]` nodes (by default
+	  `DEFAULT_INLINE_BUDGET`; `0` disables inlining), counted after the rules
+	  it uses have been inlined into it
+	- it does not use itself, directly or through other rules
+	- it has no actions or semantic predicates
+	- it is not memoized, since that would lose its results cache
+
+	Nothing is inlined when tracing or profiling, so that each rule still
+	reports its enter / match / fail events and keeps its own counters.
+
+	A rule's `Named` expression is copied along with it, so failures are
+	still reported with the rule's name. Inlined rules that are no longer
+	referenced, and are not allowed start rules, are removed. Each inlined
+	rule is reported through `options["info"]`, if given.
+	"""
+	budget:int = options.get("inline_budget", DEFAULT_INLINE_BUDGET)
+	if budget <= 0 or options.get("trace", False) or options.get("profile", False):
+		return
+
+	rules = {rule.name: rule for rule in grammar.rules}
+	uses:dict[str, set[str]] = {}
+	for rule in grammar.rules:
+		refs:set[str] = set()
+		collect_rule_refs_walker.walk(rule, refs)
+		uses[rule.name] = refs & rules.keys()
+
+	def reaches(name:str, target:str) -> bool:
+		seen:set[str] = set()
+		pending = list(uses[name])
+		while len(pending) > 0:
+			current = pending.pop()
+			if current == target:
+				return True
+			if current not in seen:
+				seen.add(current)
+				pending.extend(uses[current])
+		return False
+
+	inlined:dict[str, Node] = {}
+	context = {**options, "inlined":inlined, "counts":{}}
+
+	# Rules are visited after the rules they use, so those are inlined into
+	# them before their own size is measured
+	done:set[str] = set()
+	def visit(rule:Rule):
+		done.add(rule.name)
+		for name in sorted(uses[rule.name]):
+			if name not in done:
+				visit(rules[name])
+		replace_visitor.visit(rule, context)
+		size = _sizeOf(rule.expression)
+		if (
+			size is not None and size <= budget
+			and not isCached(rule, options)
+			and not reaches(rule.name, rule.name)
+		):
+			inlined[rule.name] = rule.expression
+
+	for rule in grammar.rules:
+		if rule.name not in done:
+			visit(rule)
+
+	counts:dict[str, int] = context["counts"]
+	if len(counts) == 0:
+		return
+
+	refs:set[str] = set()
+	collect_rule_refs_walker.walk(grammar, refs)
+	grammar.rules = [
+		rule for rule in grammar.rules
+		if rule.name not in counts or rule.name in refs or rule.name in options["allowed_start_rules"]
+	]
+	grammar.reindexRules()
+
+	info:Typing_Optional[Callable[[str, Typing_Optional[Location]], None]] = options.get("info", None)
+	if info is not None:
+		for name, count in counts.items():
+			info(f'Rule "{name}" is inlined into {count} call site{"" if count == 1 else "s"}', rules[name].nameLocation)
@@ -0,0 +1,358 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Optional as Typing_Optional, Union
+from .utils_and_types.opcodes import opcodes as op
+from .utils_and_types.syntax_tree import Grammar, Location
+
+
+# Peephole optimizations over the bytecode of each rule, run between
+# `generateBytecode` and `generatePY`.
+#
+# The bytecode is first parsed into blocks: the |IF t, f| and
+# |WHILE_NOT_ERROR b| style instructions own the instructions of their
+# branches / body, rather than encoding them as lengths. Rewrites are then
+# applied to each block until none applies, and the blocks are flattened back
+# into bytecode, which recomputes the lengths.
+#
+# Each rewrite keeps the stack effect of the code it replaces, so that both
+# branches of a condition still leave the stack at the same height.
+
+
+@dataclass
+class _Condition:
+	head:list[int]   # the opcode and its arguments, without the branch lengths
+	thenCode:list["_Instruction"]
+	elseCode:list["_Instruction"]
+
+
+@dataclass
+class _Loop:
+	head:list[int]   # the opcode and its arguments, without the body length
+	body:list["_Instruction"]
+
+
+_Instruction = Union[list[int], _Condition, _Loop]
+
+
+# Opcodes followed by `argCount` arguments and then the lengths of two branches
+_CONDITIONS = {
+	op.IF              : 0,
+	op.IF_ERROR        : 0,
+	op.IF_NOT_ERROR    : 0,
+	op.MATCH_ANY       : 0,
+	op.MATCH_STRING    : 1,
+	op.MATCH_STRING_IC : 1,
+	op.MATCH_CHAR_CLASS: 1,
+}
+
+# The number of arguments of each other opcode, or a function of the
+# instruction's position to it for those with a variable number
+_ARGUMENTS:dict[int, Union[int, Callable[[list[int], int], int]]] = {
+	op.PUSH               : 1,
+	op.PUSH_EMPTY_STRING  : 0,
+	op.PUSH_UNDEFINED     : 0,
+	op.PUSH_NULL          : 0,
+	op.PUSH_FAILED        : 0,
+	op.PUSH_EMPTY_ARRAY   : 0,
+	op.PUSH_CURR_POS      : 0,
+	op.POP                : 0,
+	op.POP_CURR_POS       : 0,
+	op.POP_N              : 1,
+	op.NIP                : 0,
+	op.APPEND             : 0,
+	op.WRAP               : 1,
+	op.TEXT               : 0,
+	op.PLUCK              : lambda bc, ip: 2 + bc[ip + 2],
+	op.ACCEPT_N           : 1,
+	op.ACCEPT_STRING      : 1,
+	op.FAIL               : 1,
+	op.ACCEPT_CLASS_RUN   : 2,
+	op.ACCEPT_LITERAL_SET : 1,
+	op.LOAD_SAVED_POS     : 1,
+	op.UPDATE_SAVED_POS   : 0,
+	op.CALL               : lambda bc, ip: 3 + bc[ip + 3],
+	op.RULE               : 1,
+	op.SILENT_FAILS_ON    : 0,
+	op.SILENT_FAILS_OFF   : 0,
+}
+
+# Instructions which push a value, and do nothing else
+_PURE_PUSHES = {
+	op.PUSH_EMPTY_STRING,
+	op.PUSH_UNDEFINED,
+	op.PUSH_NULL,
+	op.PUSH_FAILED,
+	op.PUSH_EMPTY_ARRAY,
+	op.PUSH_CURR_POS,
+}
+
+# Instructions which may report a failure, and so depend on |silentFails|
+_REPORTING = {
+	op.FAIL,
+	op.ACCEPT_CLASS_RUN,
+	op.ACCEPT_LITERAL_SET,
+	op.CALL,
+	op.RULE,
+}
+
+
+def _parse(bc:list[int], ip:int, end:int) -> list[_Instruction]:
+	code:list[_Instruction] = []
+	while ip < end:
+		opcode = bc[ip]
+		if opcode in _CONDITIONS:
+			baseLength = _CONDITIONS[opcode] + 3
+			thenLength = bc[ip + baseLength - 2]
+			elseLength = bc[ip + baseLength - 1]
+			thenStart = ip + baseLength
+			elseStart = thenStart + thenLength
+			code.append(_Condition(
+				bc[ip:ip + baseLength - 2],
+				_parse(bc, thenStart, elseStart),
+				_parse(bc, elseStart, elseStart + elseLength),
+			))
+			ip = elseStart + elseLength
+		elif opcode == op.WHILE_NOT_ERROR:
+			bodyLength = bc[ip + 1]
+			code.append(_Loop([opcode], _parse(bc, ip + 2, ip + 2 + bodyLength)))
+			ip += 2 + bodyLength
+		else:
+			if opcode not in _ARGUMENTS:
+				raise Exception(f"Invalid opcode: {opcode}.")
+			argCount = _ARGUMENTS[opcode]
+			n = 1 + (argCount if isinstance(argCount, int) else argCount(bc, ip))
+			code.append(bc[ip:ip + n])
+			ip += n
+	return code
+
+
+def _flatten(code:list[_Instruction]) -> list[int]:
+	bc:list[int] = []
+	for instruction in code:
+		if isinstance(instruction, _Condition):
+			thenCode = _flatten(instruction.thenCode)
+			elseCode = _flatten(instruction.elseCode)
+			bc += instruction.head + [len(thenCode), len(elseCode)] + thenCode + elseCode
+		elif isinstance(instruction, _Loop):
+			body = _flatten(instruction.body)
+			bc += instruction.head + [len(body)] + body
+		else:
+			bc += instruction
+	return bc
+
+
+def _count(code:list[_Instruction]) -> int:
+	"""The number of instructions in `code`, including those in branches and loop bodies"""
+	return sum(
+		1 + _count(instruction.thenCode) + _count(instruction.elseCode) if isinstance(instruction, _Condition) else
+		1 + _count(instruction.body) if isinstance(instruction, _Loop) else
+		1
+		for instruction in code
+	)
+
+
+def _reports(code:list[_Instruction]) -> bool:
+	return any(
+		_reports(instruction.thenCode) or _reports(instruction.elseCode) if isinstance(instruction, _Condition) else
+		_reports(instruction.body) if isinstance(instruction, _Loop) else
+		instruction[0] in _REPORTING
+		for instruction in code
+	)
+
+
+def _opcode(instruction:_Instruction) -> Typing_Optional[int]:
+	return instruction[0] if isinstance(instruction, list) else None
+
+
+# What is known about a value on the stack: `True` if it is |FAILED|, `False`
+# if it is not, `None` if it may be either
+_Known = Typing_Optional[bool]
+
+
+def _merge(a:list[_Known], b:list[_Known]) -> list[_Known]:
+	"""What is known about the stack after one of two branches, aligned at the top"""
+	length = min(len(a), len(b))
+	return [x if x == y else None for x, y in zip(a[len(a) - length:], b[len(b) - length:])]
+
+
+def _simulate(code:list[_Instruction], stack:list[_Known]) -> list[_Known]:
+	"""
+	What is known about the values at the top of the stack after `code` runs,
+	given what is known about them before (`stack`). Nothing is known about
+	the values below those in `stack`.
+	"""
+	stack = stack.copy()
+
+	def pop(n:int):
+		del stack[max(len(stack) - n, 0):]
+
+	for instruction in code:
+		if isinstance(instruction, _Condition):
+			# both branches leave the same number of values on the stack
+			stack = _merge(_simulate(instruction.thenCode, stack), _simulate(instruction.elseCode, stack))
+			continue
+		if isinstance(instruction, _Loop):
+			# the loop ends when the value on top is |FAILED|
+			stack = [None] * (len(stack) - 1) + [True]
+			continue
+		opcode = instruction[0]
+		if opcode in (op.PUSH_FAILED, op.FAIL):
+			stack.append(True)
+		elif opcode in (op.PUSH_EMPTY_STRING, op.PUSH_UNDEFINED, op.PUSH_NULL, op.PUSH_EMPTY_ARRAY, op.PUSH_CURR_POS, op.ACCEPT_N, op.ACCEPT_STRING):
+			stack.append(False)
+		elif opcode in (op.PUSH, op.RULE, op.ACCEPT_CLASS_RUN, op.ACCEPT_LITERAL_SET):
+			stack.append(None)
+		elif opcode in (op.POP, op.POP_CURR_POS, op.APPEND):
+			pop(1)
+		elif opcode == op.POP_N:
+			pop(instruction[1])
+		elif opcode == op.NIP:
+			top = stack[-1] if len(stack) > 0 else None
+			pop(2)
+			stack.append(top)
+		elif opcode in (op.WRAP, op.TEXT):
+			pop(instruction[1] if opcode == op.WRAP else 1)
+			stack.append(False)
+		elif opcode in (op.PLUCK, op.CALL):
+			pop(instruction[1] if opcode == op.PLUCK else instruction[2])
+			stack.append(None)
+	return stack
+
+
+def _known(code:list[_Instruction], stack:list[_Known]=[]) -> _Known:
+	"""What is known about the value on top of the stack after `code` runs"""
+	stack = _simulate(code, stack)
+	return stack[-1] if len(stack) > 0 else None
+
+
+def _rewrite(code:list[_Instruction], i:int) -> Typing_Optional[list[_Instruction]]:
+	"""
+	The replacement for the instructions of `code` from `i` on, if one of the
+	rewrites applies there. Returns `code[i:]` rewritten.
+	"""
+	current = code[i]
+	following = code[i + 1] if i + 1 < len(code) else None
+	opcode = _opcode(current)
+
+	# POP_N 0  ->  (nothing)
+	# POP_N 1  ->  POP
+	if opcode == op.POP_N:
+		return ([] if current[1] == 0 else [[op.POP]] if current[1] == 1 else [current]) + code[i + 1:]
+
+	# PUSH_CURR_POS, POP_CURR_POS  ->  (nothing)
+	# <pure push>, POP             ->  (nothing)
+	if following is not None and opcode in _PURE_PUSHES and (
+		_opcode(following) == op.POP
+		or (opcode == op.PUSH_CURR_POS and _opcode(following) == op.POP_CURR_POS)
+	):
+		return code[i + 2:]
+
+	# IF_ERROR 0, 0  ->  (nothing)
+	if (
+		isinstance(current, _Condition)
+		and current.head[0] in (op.IF, op.IF_ERROR, op.IF_NOT_ERROR)
+		and len(current.thenCode) == 0 and len(current.elseCode) == 0
+	):
+		return code[i + 1:]
+
+	# SILENT_FAILS_ON, <code that reports nothing>, SILENT_FAILS_OFF  ->  <code>
+	if opcode == op.SILENT_FAILS_ON:
+		for j in range(i + 1, len(code)):
+			if _opcode(code[j]) == op.SILENT_FAILS_OFF:
+				if not _reports(code[i + 1:j]):
+					return code[i + 1:j] + code[j + 1:]
+				break
+
+	# A condition on the value on top of the stack, when it is known whether
+	# that is |FAILED|, is replaced with the branch that would be taken.
+	#
+	# PUSH_FAILED, IF_ERROR t, f      ->  PUSH_FAILED, <t>
+	# PUSH_NULL, IF_NOT_ERROR t, f    ->  PUSH_NULL, <t>
+	# PUSH_FAILED, WHILE_NOT_ERROR b  ->  PUSH_FAILED
+	if (
+		(isinstance(current, _Condition) and current.head[0] in (op.IF_ERROR, op.IF_NOT_ERROR))
+		or isinstance(current, _Loop)
+	):
+		known = _known(code[:i])
+		if isinstance(current, _Condition) and known is not None:
+			taken = (current.head[0] == op.IF_ERROR) == known
+			return (current.thenCode if taken else current.elseCode) + code[i + 1:]
+		if isinstance(current, _Loop) and known == True:
+			return code[i + 1:]
+
+	# A condition on the value on top of the stack, following a condition
+	# after each branch of which it is known whether that is |FAILED|, is
+	# moved into those branches, where it is replaced with the branch that
+	# would be taken. No code is duplicated, and a test is saved.
+	#
+	# MATCH_STRING s, <ACCEPT_STRING s>, <FAIL e>      MATCH_STRING s
+	# IF_NOT_ERROR <a>, <b>                        ->    <ACCEPT_STRING s, a>
+	#                                                    <FAIL e, b>
+	if (
+		isinstance(current, _Condition)
+		and isinstance(following, _Condition) and following.head[0] in (op.IF_ERROR, op.IF_NOT_ERROR)
+	):
+		stack = _simulate(code[:i], [])
+		knownThen = _known(current.thenCode, stack)
+		knownElse = _known(current.elseCode, stack)
+		if knownThen is not None and knownElse is not None:
+			def taken(known:bool) -> list[_Instruction]:
+				return following.thenCode if (following.head[0] == op.IF_ERROR) == known else following.elseCode
+			return [_Condition(
+				current.head,
+				_optimize(current.thenCode + taken(knownThen)),
+				_optimize(current.elseCode + taken(knownElse)),
+			)] + code[i + 2:]
+
+	return None
+
+
+def _optimize(code:list[_Instruction]) -> list[_Instruction]:
+	for instruction in code:
+		if isinstance(instruction, _Condition):
+			instruction.thenCode = _optimize(instruction.thenCode)
+			instruction.elseCode = _optimize(instruction.elseCode)
+		elif isinstance(instruction, _Loop):
+			instruction.body = _optimize(instruction.body)
+
+	i = 0
+	while i < len(code):
+		rewritten = _rewrite(code, i)
+		if rewritten is None or rewritten == code[i:]:
+			i += 1
+		else:
+			code = code[:i] + rewritten
+			# a rewrite can make one apply to the instruction before it
+			i = max(i - 1, 0)
+	return code
+
+
+def optimize_bytecode(grammar:Grammar, options:dict[str, Any]):
+	"""
+	Removes redundant instructions from the bytecode of each rule, so the
+	generated rule functions are shorter and faster:
+
+	- |PUSH_CURR_POS| immediately followed by |POP_CURR_POS|, and a push of a
+	  constant immediately followed by |POP|
+	- |IF|, |IF_ERROR| and |IF_NOT_ERROR| with two empty branches
+	- |POP_N 0| and |POP_N 1|
+	- |SILENT_FAILS_ON| / |SILENT_FAILS_OFF| around code that can not fail
+	- conditions on a value that is known to be, or not to be, |FAILED|,
+	  which are replaced by the branch that is always taken
+	- a condition on whether the value on top is |FAILED|, right after a
+	  condition that leaves a known value in each branch, which is moved into
+	  those branches
+
+	Rules whose bytecode got shorter are reported through `options["info"]`,
+	if given, with their instruction counts before and after.
+	"""
+	info:Typing_Optional[Callable[[str, Typing_Optional[Location]], None]] = options.get("info", None)
+	for rule in grammar.rules:
+		if rule.bytecode is None:
+			continue
+		code = _parse(rule.bytecode, 0, len(rule.bytecode))
+		before = _count(code)
+		code = _optimize(code)
+		after = _count(code)
+		rule.bytecode = _flatten(code)
+		if info is not None and after < before:
+			info(f'Rule "{rule.name}" bytecode reduced from {before} to {after} instructions', rule.nameLocation)
@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+import multiprocessing
+import os
+from types import ModuleType
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+from .utils_and_types.syntax_tree import Grammar
+from ..parser_cache import compile_source, load_module
+
+
+@dataclass
+class Parse_Failure:
+	"""
+	Takes the place of the result of an input that `parse_many` could not parse.
+
+	The generated parser's `SyntaxError` class only exists in the process that
+	executed the parser source, so the error is copied into this class, which
+	can be sent between processes.
+	"""
+	name:str      # "SyntaxError" or "GrammarError"
+	message:str
+	expected:Optional[list[dict[str, Any]]]
+	found:Any
+	location:Any
+
+
+# The parser of a worker process, executed from the source sent by `parse_many`
+_worker_parser:Optional[ModuleType] = None
+_worker_options:dict[str, Any] = {}
+
+
+def _start_worker(source:str, parse_options:dict[str, Any]):
+	global _worker_parser, _worker_options
+	_worker_parser = load_module(compile_source(source))
+	_worker_options = parse_options
+
+
+def _parse_one(parser:ModuleType, input:Any, parse_options:dict[str, Any]) -> Any:
+	# imported here since the package imports this module
+	from ..grammar_error import GrammarError
+	try:
+		return parser.parse(input, dict(parse_options))
+	except (parser.SyntaxError, GrammarError) as error:
+		return Parse_Failure(
+			getattr(error, "name", type(error).__name__),
+			getattr(error, "message", str(error)),
+			getattr(error, "expected", None),
+			getattr(error, "found", None),
+			getattr(error, "location", None),
+		)
+
+
+def _parse_in_worker(input:Any) -> Any:
+	assert _worker_parser is not None
+	return _parse_one(_worker_parser, input, _worker_options)
+
+
+def parse_many(
+	ast:Grammar,
+	passes:list[Callable[..., Any]],
+	inputs:Iterable[Any],
+	start_rule:Optional[str] = None,
+	workers:Optional[int] = None,
+	chunksize:int = 64,
+	**options:Any
+) -> Iterator[Union[Any, Parse_Failure]]:
+	"""
+	Generates a parser from `ast` once, then parses each of `inputs` with it,
+	spread over `workers` processes (by default one per CPU). Yields the result
+	of each input in the order of `inputs`, as soon as it and those before it
+	are parsed.
+
+	An input that raises `SyntaxError` or `GrammarError` yields a
+	`Parse_Failure` in place of its result, and the other inputs are still
+	parsed. Other exceptions are raised from the generator.
+
+	The workers are sent the generated source, which each compiles once, and
+	then `chunksize` inputs at a time. Inputs and results must be picklable,
+	unless `workers` is 1, in which case everything is parsed in this process.
+	"""
+	if start_rule is not None:
+		if options.get("allowed_start_rules", None) is None:
+			options["allowed_start_rules"] = [start_rule]
+		elif start_rule not in options["allowed_start_rules"]:
+			raise Exception(f'Start rule "{start_rule}" is not in allowed_start_rules')
+
+	# imported here since the package imports this module
+	from . import compile_to_source
+	source = compile_to_source(ast, passes, **options)
+	parse_options = {"startRule": start_rule} if start_rule is not None else {}
+
+	workers = workers if workers is not None else (os.cpu_count() or 1)
+	if workers < 1:
+		raise Exception("workers must be at least 1")
+	if chunksize < 1:
+		raise Exception("chunksize must be at least 1")
+
+	if workers == 1:
+		parser = load_module(compile_source(source))
+		for input in inputs:
+			yield _parse_one(parser, input, parse_options)
+		return
+
+	with multiprocessing.Pool(workers, _start_worker, (source, parse_options)) as pool:
+		yield from pool.imap(_parse_in_worker, inputs, chunksize)
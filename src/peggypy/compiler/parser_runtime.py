@@ -0,0 +1,161 @@
+import re
+import textwrap
+from typing import Any
+
+
+# Helpers shared by the two backends. The classes are kept as source, which
+# `generatePY` copies into each generated parser, so that the parser runs
+# without peggypy installed, and which is executed here for the bytecode
+# interpreter. They may only use `re`, which every generated parser imports.
+
+
+def dedentCode(code:str) -> str:
+	"""
+	Re-flows the body of an action or predicate so that it can be indented
+	into a function body. Text on the same line as the opening brace is kept
+	as the first statement.
+	"""
+	lines = code.replace("\r\n", "\n").split("\n")
+	first = lines[0].strip()
+	rest  = textwrap.dedent("\n".join(lines[1:])).strip()
+	code  = "\n".join(part for part in [first, rest] if part)
+	return code if code else "pass"
+
+
+# `SyntaxError` of a parser
+SYNTAX_ERROR_SOURCE = r'''
+class peg_SyntaxError(Exception):
+    """Raised by `parse` when the input does not match the grammar"""
+
+    def __init__(self, message, expected, found, location):
+        super().__init__(message)
+        self.message  = message
+        self.expected = expected
+        self.found    = found
+        self.location = location
+        self.name     = "SyntaxError"
+
+    def format(self, sources):
+        result = "Error: " + self.message
+        if self.location:
+            src = None
+            for source in sources:
+                if source["source"] == self.location["source"]:
+                    src = re.split("\r\n|\n|\r", source["text"])
+                    break
+            s = self.location["start"]
+            loc = f"{self.location['source']}:{s['line']}:{s['column']}"
+            if src:
+                e = self.location["end"]
+                filler = " " * len(str(s["line"]))
+                line = src[s["line"] - 1]
+                last = e["column"] if s["line"] == e["line"] else len(line) + 1
+                result += (
+                    "\n --> " + loc + "\n"
+                    + filler + " |\n"
+                    + str(s["line"]) + " | " + line + "\n"
+                    + filler + " | " + " " * (s["column"] - 1)
+                    + "^" * (last - s["column"])
+                )
+            else:
+                result += "\n at " + loc
+        return result
+
+    @staticmethod
+    def buildMessage(expected, found):
+        def hex(ch):
+            return format(ord(ch), "02X")
+
+        def literalEscape(s):
+            s = (s
+                .replace("\\", "\\\\")
+                .replace("\"", "\\\"")
+                .replace("\0", "\\0")
+                .replace("\t", "\\t")
+                .replace("\n", "\\n")
+                .replace("\r", "\\r")
+            )
+            return re.sub("[\x01-\x1F\x7F-\x9F]", lambda ch: "\\x" + hex(ch.group()), s)
+
+        def classEscape(s):
+            s = (s
+                .replace("\\", "\\\\")
+                .replace("]", "\\]")
+                .replace("^", "\\^")
+                .replace("-", "\\-")
+                .replace("\0", "\\0")
+                .replace("\t", "\\t")
+                .replace("\n", "\\n")
+                .replace("\r", "\\r")
+            )
+            return re.sub("[\x01-\x1F\x7F-\x9F]", lambda ch: "\\x" + hex(ch.group()), s)
+
+        def describeExpectation(expectation):
+            if expectation["type"] == "literal":
+                return "\"" + literalEscape(expectation["text"]) + "\""
+            elif expectation["type"] == "class":
+                escapedParts = "".join(
+                    classEscape(part[0]) + "-" + classEscape(part[1])
+                    if isinstance(part, list) else
+                    classEscape(part)
+                    for part in expectation["parts"]
+                )
+                return "[" + ("^" if expectation["inverted"] else "") + escapedParts + "]"
+            elif expectation["type"] == "any":
+                return "any character"
+            elif expectation["type"] == "end":
+                return "end of input"
+            else:
+                return expectation["description"]
+
+        descriptions = sorted(set(describeExpectation(expectation) for expectation in expected))
+        if len(descriptions) == 1:
+            describedExpected = descriptions[0]
+        elif len(descriptions) == 2:
+            describedExpected = descriptions[0] + " or " + descriptions[1]
+        else:
+            describedExpected = ", ".join(descriptions[:-1]) + ", or " + descriptions[-1]
+
+        describedFound = "\"" + literalEscape(found) + "\"" if found else "end of input"
+
+        return "Expected " + describedExpected + " but " + describedFound + " found."
+'''.lstrip()
+
+
+# `DefaultTracer` of a parser, which prints rule enter / match / fail events
+DEFAULT_TRACER_SOURCE = r'''
+class peg_DefaultTracer:
+    """Prints rule enter / match / fail events, when tracing"""
+
+    def __init__(self):
+        self.indentLevel = 0
+
+    def trace(self, event):
+        def log(event):
+            start = event["location"]["start"]
+            end   = event["location"]["end"]
+            print(
+                f"{start['line']}:{start['column']}-{end['line']}:{end['column']} "
+                + f"{event['type']:<10} "
+                + "  " * self.indentLevel + event["rule"]
+            )
+
+        if event["type"] == "rule.enter":
+            log(event)
+            self.indentLevel += 1
+        elif event["type"] == "rule.match":
+            self.indentLevel -= 1
+            log(event)
+        elif event["type"] == "rule.fail":
+            self.indentLevel -= 1
+            log(event)
+        else:
+            raise Exception("Invalid event type: " + event["type"] + ".")
+'''.lstrip()
+
+
+# defines `peg_SyntaxError` and `peg_DefaultTracer` in this module
+exec(compile(SYNTAX_ERROR_SOURCE + "\n" + DEFAULT_TRACER_SOURCE, "<peggypy parser runtime>", "exec"), globals())
+
+ParserSyntaxError:Any = globals()["peg_SyntaxError"]
+DefaultTracer:Any = globals()["peg_DefaultTracer"]
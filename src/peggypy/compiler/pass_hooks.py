@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Optional, TextIO
+
+from .utils_and_types.visitor import Walker
+from .utils_and_types.syntax_tree import Grammar, Node
+
+
+@dataclass
+class Pass_Report:
+	"""What running one compiler pass did, as given to the `pass_hook` option"""
+	name:str
+	seconds:float
+	memory_delta:Optional[int]  # change in traced memory in bytes, or `None` if `tracemalloc` is not tracing
+	nodes_before:int            # syntax tree nodes before and after the pass
+	nodes_after:int
+
+
+def _countNode(node:Node, count:list[int]):
+	count[0] += 1
+
+
+# Counts the walked nodes into the one-item list given as the state of the walk
+node_count_walker = Walker({
+	"grammar"               : _countNode,
+	"top_level_initializer" : _countNode,
+	"initializer"           : _countNode,
+	"rule"                  : _countNode,
+	"named"                 : _countNode,
+	"choice"                : _countNode,
+	"action"                : _countNode,
+	"sequence"              : _countNode,
+	"labeled"               : _countNode,
+	"text"                  : _countNode,
+	"simple_and"            : _countNode,
+	"simple_not"            : _countNode,
+	"optional"              : _countNode,
+	"zero_or_more"          : _countNode,
+	"one_or_more"           : _countNode,
+	"group"                 : _countNode,
+	"semantic_and"          : _countNode,
+	"semantic_not"          : _countNode,
+	"rule_ref"              : _countNode,
+	"literal"               : _countNode,
+	"class"                 : _countNode,
+	"any"                   : _countNode,
+})
+
+
+def _nodeCount(ast:Grammar) -> int:
+	count = [0]
+	node_count_walker.walk(ast, count)
+	return count[0]
+
+
+def run_passes_with_hook(ast:Grammar, passes:list[Callable[..., Any]], options:dict[str, Any], hook:Callable[[Pass_Report], None]):
+	"""Runs `passes` like `compile_ast_code`, calling `hook` with a `Pass_Report` after each one"""
+	nodes = _nodeCount(ast)
+	for each_pass in passes:
+		memory_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+		start = time.perf_counter()
+		each_pass(ast, options)
+		seconds = time.perf_counter() - start
+		memory_delta = (
+			tracemalloc.get_traced_memory()[0] - memory_before
+			if memory_before is not None and tracemalloc.is_tracing() else
+			None
+		)
+		nodes_after = _nodeCount(ast)
+		hook(Pass_Report(getattr(each_pass, "__name__", repr(each_pass)), seconds, memory_delta, nodes, nodes_after))
+		nodes = nodes_after
+
+
+class Pass_Table:
+	"""
+	A `pass_hook` that collects the reports of each pass, and prints them as a
+	table when used as a context manager:
+
+	```
+	with Pass_Table(trace_memory=True) as table:
+		compile_parser(ast, passes, pass_hook=table)
+	```
+
+	With `trace_memory`, `tracemalloc` runs inside the `with` block, so that
+	memory deltas are reported. Tracing slows allocation down, so the times of
+	passes that allocate a lot are inflated.
+	"""
+	reports:list[Pass_Report]
+
+	def __init__(self, trace_memory:bool=False, file:Optional[TextIO]=None):
+		self.reports = []
+		self.trace_memory = trace_memory
+		self.file = file
+		self._started_tracing = False
+
+	def __call__(self, report:Pass_Report):
+		self.reports.append(report)
+
+	def __enter__(self) -> "Pass_Table":
+		if self.trace_memory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self._started_tracing = True
+		return self
+
+	def __exit__(self, *exc_info:Any):
+		if self._started_tracing:
+			tracemalloc.stop()
+			self._started_tracing = False
+		if exc_info[0] is None:
+			self.print()
+
+	def format(self) -> str:
+		width = max([len("pass")] + [len(report.name) for report in self.reports])
+		lines = [f"{'pass':<{width}}  {'ms':>9}  {'memory':>10}  {'nodes':>13}"]
+		for report in self.reports:
+			memory = f"{report.memory_delta / 1024:+9.1f}K" if report.memory_delta is not None else f"{'-':>10}"
+			nodes = f"{report.nodes_before}" if report.nodes_before == report.nodes_after else f"{report.nodes_before}->{report.nodes_after}"
+			lines.append(f"{report.name:<{width}}  {report.seconds * 1e3:9.3f}  {memory}  {nodes:>13}")
+		total = sum(report.seconds for report in self.reports)
+		lines.append(f"{'total':<{width}}  {total * 1e3:9.3f}")
+		return "\n".join(lines)
+
+	def print(self):
+		print(self.format(), file=self.file if self.file is not None else sys.stderr)
@@ -0,0 +1,51 @@
+"""
+The compiler passes, by stage, in the order `generate` runs them. Kept apart
+from `peggypy.generate` so that they can be imported without the grammar-text
+parser.
+"""
+from typing import Any, OrderedDict
+
+from .generate_bytecode          import generateBytecode
+from .generate_py                import generatePY
+from .inference_match_result     import inference_match_result
+from .inline_rules               import inline_rules
+from .optimize_bytecode          import optimize_bytecode
+from .infer_first_sets           import infer_first_sets
+from .remove_proxy_rules         import removeProxyRules
+from .select_memoized_rules      import select_memoized_rules
+from .report_duplicate_labels    import report_duplicate_labels
+from .report_duplicate_rules     import reportDuplicateRules
+from .report_infinite_recursion  import report_infinite_recusrsion
+from .report_infinite_repetition import reportInfiniteRepetition
+from .report_undefined_rules     import report_undefined_rules
+from .report_incorrect_plucking  import reportIncorrectPlucking
+
+# Each pass is a function that may mutate the AST. 
+# throws |peg.GrammarError|.
+# TODO: this could be a flat array. 
+# Maybe it is broken up like this for the benefit of 
+# plugins which may modify the stages/passes?
+
+
+passes:Any = OrderedDict([
+	("check", [
+		report_undefined_rules,
+		reportDuplicateRules,
+		report_duplicate_labels,
+		report_infinite_recusrsion,
+		reportInfiniteRepetition,
+		reportIncorrectPlucking,
+	]),
+	("transform", [
+		removeProxyRules,
+		inference_match_result,
+		select_memoized_rules,
+		inline_rules,
+		infer_first_sets,
+	]),
+	("generate", [
+		generateBytecode,
+		optimize_bytecode,
+		generatePY,
+	]),
+])
@@ -1,38 +1,53 @@
 
 
-from typing import Any, cast
+from typing import Any
 
 from .utils_and_types.syntax_tree import Grammar, Rule_Ref
-from .utils_and_types.visitor import Visitor
+from .utils_and_types.visitor import Walker
 
 
 
-def rule_ref(self:Visitor, node:Rule_Ref, options:dict[str, Any]):
-	if node.name == options["from_rule_name"]:
-		node.name = options["to_rule_name"]
-	
-replace_rule_refs_visitor = Visitor({
+def rule_ref(node:Rule_Ref, renames:dict[str, str]):
+	node.name = renames.get(node.name, node.name)
+
+replace_rule_refs_walker = Walker({
 	"rule_ref":rule_ref,
 })
 
-def replace_rule_refs(grammar:Grammar, from_rule_name:str, to_rule_name:str, options:dict[str, Any]):
-		replace_rule_refs_visitor.visit(grammar, {**options, "from_rule_name":from_rule_name, "to_rule_name":to_rule_name})
+def replace_rule_refs(grammar:Grammar, renames:dict[str, str], options:dict[str, Any]):
+		replace_rule_refs_walker.walk(grammar, renames)
 
 # Removes proxy rules -- that is, rules that only delegate to other rule.
 def removeProxyRules(grammar:Grammar, options:dict[str, Any]):
-	
-	indices:list[int] = []
-
-	for index, rule in enumerate(grammar.rules):
-		if rule.expression.type == "rule_ref":
-			rule.expression = cast(Rule_Ref, rule.expression)
-			replace_rule_refs(grammar, rule.name, rule.expression.name, options)
-			# TODO:
-			if rule.name not in options["allowed_start_rules"]:
-				indices.append(index)
-	
-	# Note: indices are already sorted
-	for index in reversed(indices):
-		grammar.rules.pop(index)
-
 
+	targets:dict[str, str] = {
+		rule.name: rule.expression.name
+		for rule in grammar.rules
+		if isinstance(rule.expression, Rule_Ref)
+	}
+
+	# Each proxy is renamed to the first rule along its chain of proxies that
+	# is not a proxy, so that every reference is rewritten in one traversal.
+	# A cycle of proxies is left recursion, reported by
+	# `report_infinite_recusrsion`; it is left as it is.
+	renames:dict[str, str] = {}
+	for name in targets:
+		seen = {name}
+		target = targets[name]
+		while target in targets and target not in seen:
+			seen.add(target)
+			target = renames.get(target, targets[target])
+		if target not in seen:
+			renames[name] = target
+
+	if len(renames) == 0:
+		return
+
+	replace_rule_refs(grammar, renames, options)
+
+	# TODO:
+	grammar.rules = [
+		rule for rule in grammar.rules
+		if rule.name not in renames or rule.name in options["allowed_start_rules"]
+	]
+	grammar.reindexRules()
@@ -1,32 +1,44 @@
-
-from typing import Any
+from typing import Any, Optional
 from peggypy.compiler.utils_and_types.syntax_tree import Action, Grammar, Labeled
 from ..grammar_error import GrammarError, Diagnostic
-from .utils_and_types.visitor import Visitor
+from .utils_and_types.visitor import Walker
+
 
+# The action block that applies to the node being walked, if any, for each
+# action or label walked into. Actions apply down to the first label.
+Plucking_State = list[Optional[Action]]
 
-def action(self:Visitor, node:Action, options:dict[str, Any]):
-	self.visit(node.expression, {**options, "action":node})
+def enter_action(node:Action, actions:Plucking_State):
+	actions.append(node)
 
-def labeled(self:Visitor, node:Labeled, options:dict[str, Any]):
+def enter_labeled(node:Labeled, actions:Plucking_State):
+	action = actions[-1]
 	if node.pick:
-		if action:
+		if action is not None:
 			raise GrammarError(
 				"\"@\" cannot be used with an action block",
 				node.labelLocation,
 				[Diagnostic(
 					message = "Action block location",
-					location = options["action"].codeLocation,
+					location = action.codeLocation,
 				)]
 			)
-
-	self.visit(node.expression, options)
+	actions.append(None)
+
+def leave(node:Any, actions:Plucking_State):
+	actions.pop()
+
+report_incorrect_plucking_walker = Walker(
+	enter={
+		"action"  : enter_action,
+		"labeled" : enter_labeled,
+	},
+	leave={
+		"action"  : leave,
+		"labeled" : leave,
+	},
+)
 
 def reportIncorrectPlucking(grammar:Grammar, options:dict[str, Any]):
 	"""Check that plucking `@` is not attempted with an Action `{}` block (eg the following is forbidden: `SomeRule = "SomeLiteral" @SomePattern {...code}`)"""
-	Visitor({
-		"action"  : action,
-		"labeled" : labeled
-	}).visit(grammar, options)
-
-
+	report_incorrect_plucking_walker.walk(grammar, [None])
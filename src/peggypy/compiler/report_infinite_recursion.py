@@ -1,58 +1,87 @@
-
-
-from typing import Any
+from dataclasses import dataclass, field
+from typing import Any, Optional
 
 from peggypy.compiler.always_consumes_on_success import always_consumes_on_success
 
 from ..grammar_error import Diagnostic, GrammarError
-from .utils_and_types.visitor import Visitor
+from .utils_and_types.visitor import Walker
 from .utils_and_types.syntax_tree import (
 	Grammar,
+	Node,
 	Rule,
 	Rule_Ref,
 	Sequence
 )
 
 
-def rule(self:Visitor, node:Rule, options:dict[str, Any]):
-	options["visited_rules"].append(node.name)
-	self.visit(node.expression, options)
-	options["visited_rules"].pop()
-
-def sequence(self:Visitor, node:Sequence, options:dict[str, Any]):
-	# TODO:  Array.every result is unused in original code???  Array.every appears to be used as a way to stop iteration on the first false result
+@dataclass
+class Recursion_State:
+	grammar:Grammar
+	visited_rules:list[str] = field(default_factory=list)  # rules on the current path
+	checked_rules:set[str] = field(default_factory=set)
+	backtrace_refs:list[Rule_Ref] = field(default_factory=list)
+
+
+def enter_rule(node:Rule, state:Recursion_State) -> Optional[list[Node]]:
+	# a rule that was checked completely does not reach any rule on the
+	# current path, or it would also have reached itself
+	if node.name in state.checked_rules:
+		return []
+	state.visited_rules.append(node.name)
+	return None
+
+def leave_rule(node:Rule, state:Recursion_State):
+	# skipped by `enter_rule`
+	if node.name in state.checked_rules:
+		return
+	state.visited_rules.pop()
+	state.checked_rules.add(node.name)
+
+def enter_sequence(node:Sequence, state:Recursion_State) -> list[Node]:
+	# elements after one that always consumes can not be reached without consuming
+	elements:list[Node] = []
 	for element in node.elements:
-		self.visit(element, options)
-		if not always_consumes_on_success(options["grammar"], element, options):
+		elements.append(element)
+		if always_consumes_on_success(state.grammar, element, {}):
 			break
+	return elements
 
-def rule_ref(self:Visitor, node:Rule_Ref, options:dict[str, Any]):
-	options["backtrace_refs"].push(node)
-	rule = options["grammar"].findRule(node.name)
+def enter_rule_ref(node:Rule_Ref, state:Recursion_State) -> list[Node]:
+	state.backtrace_refs.append(node)
+	rule = state.grammar.findRule(node.name)
 
-	if node.name in options["visited_rules"]:
-		self.visit(rule, options)
-		options["backtrace_refs"].pop()
-	else:
-		options["visited_rules"].push(node.name)
+	if node.name in state.visited_rules:
+		state.visited_rules.append(node.name)
 		diagnostics:list[Diagnostic] = []
-		for index, ref in enumerate(options["backtrace_refs"]):
-			if index + 1 != len(options["backtrace_refs"]):
+		for index, ref in enumerate(state.backtrace_refs):
+			if index + 1 != len(state.backtrace_refs):
 				message = f'Step {index + 1}: call of the rule "{ref.name}" without input consumption' 
 			else:
 				message = f"Step {index + 1}: call itself without input consumption - left recursion"
 			diagnostics.append(Diagnostic(message, ref.location))
 		raise GrammarError(
-			f"Possible infinite loop when parsing (left recursion: {options['visited_rules'].join(' -> ')} )",
+			f"Possible infinite loop when parsing (left recursion: {' -> '.join(state.visited_rules)})",
 			rule.nameLocation,
 			diagnostics
 		)
 
-report_infinite_recusrsion_visitor = Visitor({
-	"rule"     : rule,
-	"sequence" : sequence,
-	"rule_ref" : rule_ref
-})
+	# the referenced rule is walked in place of the reference
+	return [rule] if rule is not None else []
+
+def leave_rule_ref(node:Rule_Ref, state:Recursion_State):
+	state.backtrace_refs.pop()
+
+report_infinite_recusrsion_walker = Walker(
+	enter={
+		"rule"     : enter_rule,
+		"sequence" : enter_sequence,
+		"rule_ref" : enter_rule_ref,
+	},
+	leave={
+		"rule"     : leave_rule,
+		"rule_ref" : leave_rule_ref,
+	},
+)
 
 
 def report_infinite_recusrsion(grammar:Grammar, options:dict[str, Any]):
@@ -67,13 +96,8 @@ def report_infinite_recusrsion(grammar:Grammar, options:dict[str, Any]):
 
 	In general, if a rule reference can be reached without consuming any input,
 	it can lead to left recursion.
-	"""
-
-	report_infinite_recusrsion_visitor.visit(grammar, {
-		**options,
-		"grammar":grammar,
-		"visited_rules":[],
-		"backtrace_refs": []
-	})
 
+	Rules are searched depth first, and each rule is searched only once.
+	"""
 
+	report_infinite_recusrsion_walker.walk(grammar, Recursion_State(grammar))
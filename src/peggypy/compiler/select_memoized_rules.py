@@ -0,0 +1,217 @@
+from typing import Any, Callable, Hashable, Optional as Typing_Optional, cast
+
+from .always_consumes_on_success import always_consumes_on_success
+from .utils_and_types.syntax_tree import (
+	Choice,
+	Code,
+	Expression,
+	Grammar,
+	Literal,
+	Location,
+	Class,
+	Node,
+	Rule_Ref,
+	Sequence,
+)
+from .utils_and_types.visitor import Visitor
+from .utils_and_types.rules import collect_rule_refs_walker
+
+
+def _leadingNone(self:Visitor, node:Node, options:dict[str, Any]) -> set[str]:
+	return set()
+
+
+def _leadingExpression(self:Visitor, node:Expression, options:dict[str, Any]) -> set[str]:
+	return self.visit(node.expression, options)
+
+
+def _leadingChoice(self:Visitor, node:Choice, options:dict[str, Any]) -> set[str]:
+	return set().union(*(self.visit(alternative, options) for alternative in node.alternatives))
+
+
+def _leadingSequence(self:Visitor, node:Sequence, options:dict[str, Any]) -> set[str]:
+	result:set[str] = set()
+	for element in node.elements:
+		result |= self.visit(element, options)
+		if always_consumes_on_success(options["grammar"], element, options):
+			break
+	return result
+
+
+def _leadingRuleRef(self:Visitor, node:Rule_Ref, options:dict[str, Any]) -> set[str]:
+	return {node.name}
+
+
+leading_rule_refs_visitor = Visitor({
+	"rule"         : _leadingExpression,
+	"named"        : _leadingExpression,
+	"choice"       : _leadingChoice,
+	"action"       : _leadingExpression,
+	"sequence"     : _leadingSequence,
+	"labeled"      : _leadingExpression,
+	"text"         : _leadingExpression,
+	"simple_and"   : _leadingExpression,
+	"simple_not"   : _leadingExpression,
+	"optional"     : _leadingExpression,
+	"zero_or_more" : _leadingExpression,
+	"one_or_more"  : _leadingExpression,
+	"group"        : _leadingExpression,
+	"semantic_and" : _leadingNone,
+	"semantic_not" : _leadingNone,
+	"rule_ref"     : _leadingRuleRef,
+	"literal"      : _leadingNone,
+	"class"        : _leadingNone,
+	"any"          : _leadingNone,
+})
+
+
+def _shapeExpression(self:Visitor, node:Expression, options:dict[str, Any]) -> Hashable:
+	return (node.type, self.visit(node.expression, options))
+
+
+def _shapeTransparent(self:Visitor, node:Expression, options:dict[str, Any]) -> Hashable:
+	# Labels and actions do not change which input is consumed.
+	return self.visit(node.expression, options)
+
+
+def _shapeChoice(self:Visitor, node:Choice, options:dict[str, Any]) -> Hashable:
+	return ("choice", tuple(self.visit(alternative, options) for alternative in node.alternatives))
+
+
+def _shapeSequence(self:Visitor, node:Sequence, options:dict[str, Any]) -> Hashable:
+	return ("sequence", tuple(self.visit(element, options) for element in node.elements))
+
+
+def _shapeCode(self:Visitor, node:Code, options:dict[str, Any]) -> Hashable:
+	return (node.type, node.code)
+
+
+def _shapeRuleRef(self:Visitor, node:Rule_Ref, options:dict[str, Any]) -> Hashable:
+	return ("rule_ref", node.name)
+
+
+def _shapeLiteral(self:Visitor, node:Literal, options:dict[str, Any]) -> Hashable:
+	return ("literal", node.value, node.ignoreCase)
+
+
+def _shapeClass(self:Visitor, node:Class, options:dict[str, Any]) -> Hashable:
+	return ("class", tuple(tuple(part) if isinstance(part, list) else part for part in node.parts), node.inverted, node.ignoreCase)
+
+
+def _shapeAny(self:Visitor, node:Node, options:dict[str, Any]) -> Hashable:
+	return ("any",)
+
+
+shape_visitor = Visitor({
+	"named"        : _shapeExpression,
+	"choice"       : _shapeChoice,
+	"action"       : _shapeTransparent,
+	"sequence"     : _shapeSequence,
+	"labeled"      : _shapeTransparent,
+	"text"         : _shapeExpression,
+	"simple_and"   : _shapeExpression,
+	"simple_not"   : _shapeExpression,
+	"optional"     : _shapeExpression,
+	"zero_or_more" : _shapeExpression,
+	"one_or_more"  : _shapeExpression,
+	"group"        : _shapeTransparent,
+	"semantic_and" : _shapeCode,
+	"semantic_not" : _shapeCode,
+	"rule_ref"     : _shapeRuleRef,
+	"literal"      : _shapeLiteral,
+	"class"        : _shapeClass,
+	"any"          : _shapeAny,
+})
+
+
+def _elementsOf(node:Node) -> list[Node]:
+	"""The elements an alternative is a sequence of, looking through actions, labels and groups"""
+	while node.type in ("action", "labeled", "group"):
+		node = cast(Expression, node).expression
+	if node.type == "sequence":
+		return cast(list[Node], cast(Sequence, node).elements)
+	return [node]
+
+
+def select_memoized_rules(grammar:Grammar, options:dict[str, Any]):
+	"""
+	When `options["cache"] == "auto"`, marks the rules which may be re-tried at
+	the same input offset with `Rule.memoize`. Only those rules get a results
+	cache in the generated parser. A rule is re-tried at the same offset when:
+
+	- two alternatives of a choice share a prefix; every rule called in the
+	  shared prefix, and every rule called at the start of both of the
+	  elements that follow it, runs twice at the same offset.
+	  For example `A B / A C` re-tries `A`.
+	- a rule called at the start of an `optional`, `zero_or_more` or
+	  `one_or_more` is also called at the start of what follows it in the
+	  sequence. The last (failing) repetition and the next element start at
+	  the same offset. For example `(A ",")* A` re-tries `A`.
+
+	Each selected rule is reported through `options["info"]`, if given, so the
+	decision can be checked.
+	"""
+	if options.get("cache", False) != "auto":
+		return
+
+	context = {**options, "grammar":grammar}
+	reasons:dict[str, str] = {}
+
+	def leading(node:Node) -> set[str]:
+		return leading_rule_refs_visitor.visit(node, context)
+
+	def all_refs(nodes:list[Node]) -> set[str]:
+		refs:set[str] = set()
+		for node in nodes:
+			collect_rule_refs_walker.walk(node, refs)
+		return refs
+
+	def leading_of_rest(elements:list[Node]) -> set[str]:
+		"""Rules called at the offset the first of `elements` starts at"""
+		result:set[str] = set()
+		for element in elements:
+			result |= leading(element)
+			if always_consumes_on_success(grammar, element, context):
+				break
+		return result
+
+	def select(names:set[str], reason:str):
+		for name in names:
+			if name not in reasons:
+				reasons[name] = reason
+
+	def choice(self:Visitor, node:Choice, options:dict[str, Any]):
+		alternatives = [_elementsOf(alternative) for alternative in node.alternatives]
+		shapes = [[shape_visitor.visit(element, options) for element in elements] for elements in alternatives]
+		for i in range(len(alternatives)):
+			for j in range(i + 1, len(alternatives)):
+				common = 0
+				while (
+					common < len(shapes[i]) and common < len(shapes[j])
+					and shapes[i][common] == shapes[j][common]
+				):
+					common += 1
+				retried = all_refs(alternatives[i][:common])
+				retried |= leading_of_rest(alternatives[i][common:]) & leading_of_rest(alternatives[j][common:])
+				select(retried, f"re-tried by alternatives {i + 1} and {j + 1} of a choice")
+		for alternative in node.alternatives:
+			self.visit(alternative, options)
+
+	def sequence(self:Visitor, node:Sequence, options:dict[str, Any]):
+		for index, element in enumerate(node.elements):
+			if element.type in ("optional", "zero_or_more", "one_or_more"):
+				retried = leading(cast(Expression, element).expression) & leading_of_rest(cast(list[Node], node.elements[index + 1:]))
+				select(retried, f"re-tried after the {element.type} that precedes it")
+			self.visit(element, options)
+
+	Visitor({
+		"choice"   : choice,
+		"sequence" : sequence,
+	}).visit(grammar, context)
+
+	info:Typing_Optional[Callable[[str, Typing_Optional[Location]], None]] = options.get("info", None)
+	for rule in grammar.rules:
+		if rule.name in reasons:
+			rule.memoize = True
+			if info is not None:
+				info(f'Rule "{rule.name}" is memoized: {reasons[rule.name]}', rule.nameLocation)
@@ -2,10 +2,10 @@
 
 # Bytecode instruction opcodes.
 
-from enum import Enum
+from enum import IntEnum
 
 
-class opcodes(Enum):
+class opcodes(IntEnum):
 	# Stack Manipulation
 
 	# @deprecated Unused
@@ -43,6 +43,8 @@ class opcodes(Enum):
 	ACCEPT_N           = 21    # ACCEPT_N n
 	ACCEPT_STRING      = 22    # ACCEPT_STRING s
 	FAIL               = 23    # FAIL e
+	ACCEPT_CLASS_RUN   = 37    # ACCEPT_CLASS_RUN c, e
+	ACCEPT_LITERAL_SET = 38    # ACCEPT_LITERAL_SET s
 
 	# Calls
 
@@ -52,12 +54,12 @@ class opcodes(Enum):
 
 	# Rules
 
-	RULE               = 27,   # RULE r
+	RULE               = 27    # RULE r
 
 	# Failure Reporting
 
-	SILENT_FAILS_ON     = 28,   # SILENT_FAILS_ON
-	SILENT_FAILS_OFF    = 29,   # SILENT_FAILS_OFF
+	SILENT_FAILS_ON    = 28    # SILENT_FAILS_ON
+	SILENT_FAILS_OFF   = 29    # SILENT_FAILS_OFF
 
 	# Because the tests have hard-coded opcode numbers, don't renumber
 	# existing opcodes.  New opcodes that have been put in the correct
@@ -67,5 +69,7 @@ class opcodes(Enum):
 	# 30-34 reserved for @mingun
 	# PUSH_EMPTY_STRING  = 35
 	# PLUCK              = 36
+	# ACCEPT_CLASS_RUN   = 37
+	# ACCEPT_LITERAL_SET = 38
 
 
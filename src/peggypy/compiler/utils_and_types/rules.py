@@ -0,0 +1,29 @@
+from typing import Any
+
+from .syntax_tree import Rule, Rule_Ref
+from .visitor import Walker
+
+
+def isCached(rule:Rule, options:dict[str, Any]) -> bool:
+	"""
+	`options["cache"]` is either `True` to memoize every rule, a collection of
+	rule names to memoize, or `"auto"` to memoize the rules marked by
+	`select_memoized_rules`
+	"""
+	cache = options.get("cache", False)
+	if isinstance(cache, bool):
+		return cache
+	if cache == "auto":
+		return rule.memoize
+	return rule.name in cache
+
+
+def _collectRuleRef(node:Rule_Ref, refs:set[str]):
+	refs.add(node.name)
+
+
+# Adds the name of every rule referenced below the walked node to the `set`
+# given as the state of the walk
+collect_rule_refs_walker = Walker({
+	"rule_ref" : _collectRuleRef,
+})
@@ -80,7 +80,7 @@ class Stack:
 		"""
 		self.sp+=1
 
-		code = f"{self.name(self.sp)} = {exprCode};";
+		code = f"{self.name(self.sp)} = {exprCode}"
 
 		if self.sp > self.maxSp: 
 			self.maxSp = self.sp
@@ -2,6 +2,7 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import (
+	Any as Typing_Any,
 	Literal,
 	Optional as Typing_Optional,
 	Union
@@ -22,6 +23,11 @@ class MATCH(Enum):
 			return MATCH.SOMETIMES
 
 
+def match_of(node:Node) -> MATCH:
+	"""The inferred `MATCH` of `node`, or `MATCH.SOMETIMES` if `inferenceMatchResult` has not been run"""
+	return node.match if node.match is not None else MATCH.SOMETIMES
+
+
 
 @dataclass(init=True)
 class Cursor_Location:
@@ -66,19 +72,43 @@ class Grammar(Node):
 	rules:list[Rule] = field(default_factory=list)
 
 	code:Typing_Optional[str] = field(default=None, init=False) # TODO: I'm not sure if all nodes should have this?? This is populated by the final step of the compiler?
+
+	# Constant tables populated by `generateBytecode`
+	literals:list[str]                       = field(default_factory=list, init=False)
+	classes:list[dict[str, Typing_Any]]      = field(default_factory=list, init=False)
+	literalSets:list[dict[str, Typing_Any]]  = field(default_factory=list, init=False)
+	expectations:list[dict[str, Typing_Any]] = field(default_factory=list, init=False)
+	functions:list[dict[str, Typing_Any]]    = field(default_factory=list, init=False)
+
+	# Whether each rule always consumes input on success, by rule name. Inferred
+	# on first use by `always_consumes_on_success`
+	rules_consume:Typing_Optional[dict[str, bool]] = field(default=None, init=False)
+
+	# Index of each rule by name, for `findRule` and `indexOfRule`. It is built
+	# from the rules the grammar is constructed with; passes that add, remove
+	# or rename rules call `reindexRules`
+	ruleIndex:dict[str, int] = field(default_factory=dict, init=False, repr=False, compare=False)
 	
+	def __post_init__(self:Grammar):
+		self.reindexRules()
+
+
+	def reindexRules(self:Grammar):
+		self.ruleIndex = {}
+		for index, rule in enumerate(self.rules):
+			# the first of duplicate rules wins, as reported by `reportDuplicateRules`
+			self.ruleIndex.setdefault(rule.name, index)
+
+
 	def findRule(self:Grammar, name:str) -> Typing_Optional[Rule]:
-		for rule in self.rules:
-			if rule.name == name:
-				return rule
-		return None
+		index = self.indexOfRule(name)
+		return self.rules[index] if index != -1 else None
 
 
-	def indexOfRule(self:Grammar, name:str):
-		for index, rule in enumerate(self.rules):	
-			if rule.name == name:
-				return index
-		return -1  # TODO: should this be None?
+	def indexOfRule(self:Grammar, name:str) -> int:
+		# -1 when there is no such rule, like the `indexOf` of peggy, which the
+		# callers of this and the ported passes compare against
+		return self.ruleIndex.get(name, -1)
 
 
 
@@ -105,6 +135,8 @@ class Rule(Expression):
 	type:str=field(default="rule", init=False)
 	name:str
 	nameLocation:Location
+	bytecode:Typing_Optional[list[int]] = field(default=None, init=False) # populated by `generateBytecode`
+	memoize:bool = field(default=False, init=False) # set by `select_memoized_rules`
 
 
 @dataclass
@@ -118,6 +150,9 @@ class Choice(Node):
 	"""A forward-slash-separated  sequence of patterns; tested from left to right, stopping at the first match `MathThisRule / OrThisRule`"""
 	type:str=field(default="choice", init=False)
 	alternatives:list[Rule_Expression]
+	# per alternative, the class of characters it can start with and the expectations
+	# it reports when it can not; `None` if it is always tried. Set by `infer_first_sets`
+	dispatch:Typing_Optional[list[Typing_Optional[tuple[Class, list[dict[str, Typing_Any]]]]]] = field(default=None, init=False)
 
 
 @dataclass
@@ -151,7 +186,7 @@ class Simple_And(Expression):
 @dataclass()
 class Simple_Not(Expression):
 	"""`!rule`"""
-	type:str=field(default="simple_and", init=False)
+	type:str=field(default="simple_not", init=False)
 
 
 @dataclass()
@@ -1,5 +1,5 @@
-
 import re
+from typing import Optional
 
 def extract_group_and_escape_char(ch:re.Match[str]) -> str:
     num = ord(ch.group())
@@ -12,49 +12,149 @@ def extract_group_and_escape_char(ch:re.Match[str]) -> str:
 
 
 def stringEscape(s:str) -> str:
-    # ECMA-262, 5th ed., 7.8.4: All characters may appear literally in a string
-    # literal except for the closing quote character, backslash, carriage
-    # return, line separator, paragraph separator, and line feed. Any character
+    # Python string literals may contain any character except the closing
+    # quote character, backslash, carriage return and line feed. Any character
     # may appear in the form of an escape sequence.
     #
     # For portability, we also escape all control and non-ASCII characters.
     
-    s
-    s = re.sub("\\",                         "\\\\",                        s)  # Backslash
-    s = re.sub("\"",                         "\\\"",                        s)  # Closing double quote
-    s = re.sub("\0",                         "\\0",                         s)  # None
-    s = re.sub("\x08",                       "\\b",                         s)  # Backspace
-    s = re.sub("\t",                         "\\t",                         s)  # Horizontal tab
-    s = re.sub("\n",                         "\\n",                         s)  # Line feed
-    s = re.sub("\v",                         "\\v",                         s)  # Vertical tab
-    s = re.sub("\f",                         "\\f",                         s)  # Form feed
-    s = re.sub("\r",                         "\\r",                         s)  # Carriage return
-    s = re.sub("[\x00-\x1F\x7F-\UFFFFFFFF]", extract_group_and_escape_char, s)
+    s = s.replace("\\",                     "\\\\")                        # Backslash
+    s = s.replace("\"",                     "\\\"")                        # Closing double quote
+    s = s.replace("\x08",                   "\\b")                         # Backspace
+    s = s.replace("\t",                     "\\t")                         # Horizontal tab
+    s = s.replace("\n",                     "\\n")                         # Line feed
+    s = s.replace("\v",                     "\\v")                         # Vertical tab
+    s = s.replace("\f",                     "\\f")                         # Form feed
+    s = s.replace("\r",                     "\\r")                         # Carriage return
+    s = re.sub("[\x00-\x1F\x7F-\U0010FFFF]", extract_group_and_escape_char, s)  # None and the rest
         
     return s
 
 
 def regexpClassEscape(s:str) -> str:
-    # Based on ECMA-262, 5th ed., 7.8.5 & 15.10.1.
+    # Based on the python `re` module documentation for character sets.
     #
     # For portability, we also escape all control and non-ASCII characters.
-    
-    # TODO: I don't think python recognizes forward slash as special in regex pattern strings?
-    # TODO: this whole thing needs a good looking at for python purposes
-
-    s = re.sub("\\",                         "\\\\",                        s)  # Backslash
-    s = re.sub("\\/",                        "\\/",                         s)  # Closing slash
-    s = re.sub("]",                          "\\]",                         s)  # Closing bracket 
-    s = re.sub("\\^",                        "\\^",                         s)  # Caret
-    s = re.sub("-",                          "\\-",                         s)  # Dash
-    s = re.sub("\0",                         "\\0",                         s)  # None
-    s = re.sub("\x08",                       "\\b",                         s)  # Backspace
-    s = re.sub("\t",                         "\\t",                         s)  # Horizontal tab
-    s = re.sub("\n",                         "\\n",                         s)  # Line feed
-    s = re.sub("\v",                         "\\v",                         s)  # Vertical tab
-    s = re.sub("\f",                         "\\f",                         s)  # Form feed
-    s = re.sub("\r",                         "\\r",                         s)  # Carriage return
-    s = re.sub("[\x00-\x1F\x7F-\UFFFFFFFF]", extract_group_and_escape_char, s)
+    # The result is a regular expression, and must still be passed through
+    # `stringEscape` before being written into a python string literal.
+
+    s = s.replace("\\",                     "\\\\")                        # Backslash
+    s = s.replace("]",                      "\\]")                         # Closing bracket 
+    s = s.replace("[",                      "\\[")                         # Opening bracket (nested sets are reserved)
+    s = s.replace("^",                      "\\^")                         # Caret
+    s = s.replace("-",                      "\\-")                         # Dash
+    s = s.replace("\x08",                   "\\b")                         # Backspace
+    s = s.replace("\t",                     "\\t")                         # Horizontal tab
+    s = s.replace("\n",                     "\\n")                         # Line feed
+    s = s.replace("\v",                     "\\v")                         # Vertical tab
+    s = s.replace("\f",                     "\\f")                         # Form feed
+    s = s.replace("\r",                     "\\r")                         # Carriage return
+    s = re.sub("[\x00-\x1F\x7F-\U0010FFFF]", extract_group_and_escape_char, s)  # None and the rest
     return s
-        
-        
\ No newline at end of file
+
+
+def bytesEscape(b:bytes) -> str:
+    # Like `stringEscape`, for the body of a python bytes literal. Printable
+    # ASCII is written as is, everything else as a `\xNN` escape.
+    return "".join(
+        "\\\\" if c == 0x5C else
+        "\\\"" if c == 0x22 else
+        chr(c) if 0x20 <= c < 0x7F else
+        f"\\x{c:0>2X}"
+        for c in b
+    )
+
+
+def utf8Ranges(lo:int, hi:int) -> list[list[tuple[int, int]]]:
+    # Splits the code point range `lo`-`hi` into sequences of byte ranges,
+    # such that the UTF-8 encodings of the range are exactly the byte strings
+    # matched by one of the sequences. Surrogates are left out, as they have no
+    # UTF-8 encoding.
+    if lo <= 0xD7FF < hi:
+        return utf8Ranges(lo, 0xD7FF) + (utf8Ranges(0xE000, hi) if hi >= 0xE000 else [])
+    if 0xD800 <= lo <= 0xDFFF:
+        return utf8Ranges(0xE000, hi) if hi >= 0xE000 else []
+    for maxCodePoint in (0x7F, 0x7FF, 0xFFFF):
+        if lo <= maxCodePoint < hi:
+            return utf8Ranges(lo, maxCodePoint) + utf8Ranges(maxCodePoint + 1, hi)
+    if hi > 0x7F:
+        for i in (1, 2, 3):
+            mask = (1 << (6 * i)) - 1
+            if lo & ~mask != hi & ~mask:
+                if lo & mask != 0:
+                    return utf8Ranges(lo, lo | mask) + utf8Ranges((lo | mask) + 1, hi)
+                if hi & mask != mask:
+                    return utf8Ranges(lo, (hi & ~mask) - 1) + utf8Ranges(hi & ~mask, hi)
+    return [list(zip(chr(lo).encode("utf-8"), chr(hi).encode("utf-8")))]
+
+
+def utf8ClassRegexp(parts:list, inverted:bool, ignoreCase:bool) -> str:
+    # A regular expression over UTF-8 encoded bytes matching one character of
+    # the class `[parts]`. Bytes are written as `\xNN` escapes, so the result
+    # must still be passed through `bytesEscape` (as ASCII) before being
+    # written into a python bytes literal.
+    #
+    # `re.IGNORECASE` only folds ASCII letters in bytes patterns, so for the
+    # other letters the upper and lower case forms of each character are added
+    # to the class.
+    def byteClass(ranges:list[tuple[int, int]]) -> str:
+        return "".join(
+            f"\\x{a:0>2X}" if a == b else f"\\x{a:0>2X}-\\x{b:0>2X}"
+            for a, b in ranges
+        )
+
+    codePoints:list[tuple[int, int]] = []
+    for part in parts:
+        lo, hi = (ord(part[0]), ord(part[1])) if isinstance(part, list) else (ord(part), ord(part))
+        codePoints.append((lo, hi))
+        if ignoreCase and hi > 0x7F and hi - lo < 0x400:
+            for c in range(max(lo, 0x80), hi + 1):
+                for variant in (chr(c).lower(), chr(c).upper()):
+                    if len(variant) == 1:
+                        codePoints.append((ord(variant), ord(variant)))
+
+    ascii = [(lo, min(hi, 0x7F)) for lo, hi in codePoints if lo <= 0x7F]
+    sequences = [
+        sequence
+        for lo, hi in codePoints if hi > 0x7F
+        for sequence in utf8Ranges(max(lo, 0x80), hi)
+    ]
+
+    if not sequences:
+        return "[" + ("^" if inverted else "") + byteClass(ascii) + "]"
+
+    alternatives = (["[" + byteClass(ascii) + "]"] if ascii else []) + [
+        "".join("[" + byteClass([byteRange]) + "]" for byteRange in sequence)
+        for sequence in sequences
+    ]
+    pattern = "(?:" + "|".join(alternatives) + ")"
+    if inverted:
+        # any one (well formed) UTF-8 character which is not in the class
+        return "(?:(?!" + pattern + ")[\\x00-\\x7F\\xC0-\\xFF][\\x80-\\xBF]*)"
+    return pattern
+
+
+def literalSetRegexp(literals:list[str], ignoreCase:bool, encoding:Optional[str]=None) -> str:
+    # A regular expression matching the first of `literals` that matches, as
+    # an ordered choice of them would; alternation in `re` is ordered too. Each
+    # literal is in its own group, so `match.lastindex` tells which one it was.
+    #
+    # Case-insensitive literals are passed in lower case, and must be ASCII.
+    # `str.lower()` is what the literal would be compared with, so letters are
+    # written as explicit classes rather than with `re.IGNORECASE`, which also
+    # folds characters that `str.lower()` does not (like "\u017F" to "s").
+    # "\u212A" (the Kelvin sign) is the only non-ASCII character that lower
+    # cases to an ASCII letter.
+    #
+    # With `encoding`, the pattern is for bytes input: the bytes of each
+    # character are written as `\xNN` escapes, so the result must still be
+    # passed through `bytesEscape` (as ASCII), and bytes are only lower cased
+    # in the ASCII range.
+    def char(ch:str) -> str:
+        if ignoreCase and "a" <= ch <= "z":
+            return "[" + ch + ch.upper() + ("\u212A" if ch == "k" and encoding is None else "") + "]"
+        if encoding is None:
+            return re.escape(ch)
+        return "".join(f"\\x{byte:0>2X}" for byte in ch.encode(encoding))
+
+    return "|".join("(" + "".join(char(ch) for ch in literal) + ")" for literal in literals)
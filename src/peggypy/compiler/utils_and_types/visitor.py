@@ -1,6 +1,6 @@
 
 from __future__ import annotations
-from typing import Any, Callable, TypeVar, Union
+from typing import Any, Callable, Optional, TypeVar, Union
 
 
 from .syntax_tree import (
@@ -65,11 +65,12 @@ def grammar(self:Visitor, node:Grammar, options:dict[str, Any]) -> Any:
 
 class Visitor:
 	funcs:dict[str, Node_Visitor]
+	# the function for each node class, filled in as each class is first
+	# visited, so that `visit` is one dictionary lookup by `type(node)`
+	dispatch:dict[type, Node_Visitor]
 
 	def __init__(self, funcs:dict[str, Node_Visitor]):
 
-		ff:Node_Visitor = visitElements
-		print(ff)
 		default_funcs:dict[str, Node_Visitor] = {
 			"grammar":               grammar,
 			"top_level_initializer": visitNop,
@@ -95,9 +96,14 @@ class Visitor:
 			"any":                   visitNop,
 		}
 		self.funcs = default_funcs | funcs
+		self.dispatch = {}
 
 	def visit(self, node:Any, options:dict[str, Any]) -> Any:
-		return self[node.type](self, node, options)
+		func = self.dispatch.get(type(node))
+		if func is None:
+			# every node class has one `type`
+			func = self.dispatch[type(node)] = self[node.type]
+		return func(self, node, options)
 
 	def __getitem__(self, item: str) -> Node_Visitor:
 		if item in self.funcs:
@@ -109,6 +115,119 @@ class Visitor:
 		return item in self.funcs
 
 
+def _grammarChildren(node:Grammar) -> list[Node]:
+	return [
+		child for child in (node.top_level_initializer, node.initializer) if child is not None
+	] + node.rules
+
+def _choiceChildren(node:Choice) -> list[Node]:
+	return node.alternatives
+
+def _sequenceChildren(node:Sequence) -> list[Node]:
+	return node.elements
+
+def _expressionChildren(node:Expression) -> list[Node]:
+	return [node.expression]
+
+def _noChildren(node:Node) -> list[Node]:
+	return []
+
+
+# the nodes a `Visitor` visits by default below each type of node, in order
+_children:dict[str, Callable[[Any], list[Node]]] = {
+	"grammar":               _grammarChildren,
+	"top_level_initializer": _noChildren,
+	"initializer":           _noChildren,
+	"rule":                  _expressionChildren,
+	"named":                 _expressionChildren,
+	"choice":                _choiceChildren,
+	"sequence":              _sequenceChildren,
+	"action":                _expressionChildren,
+	"labeled":               _expressionChildren,
+	"text":                  _expressionChildren,
+	"simple_and":            _expressionChildren,
+	"simple_not":            _expressionChildren,
+	"optional":              _expressionChildren,
+	"zero_or_more":          _expressionChildren,
+	"one_or_more":           _expressionChildren,
+	"group":                 _expressionChildren,
+	"semantic_and":          _noChildren,
+	"semantic_not":          _noChildren,
+	"rule_ref":              _noChildren,
+	"literal":               _noChildren,
+	"class":                 _noChildren,
+	"any":                   _noChildren,
+}
+
+
+def childrenOf(node:Node) -> list[Node]:
+	"""The nodes a `Visitor` visits by default below `node`, in order"""
+	return list(_children[node.type](node))
+
+
+Walker_Enter = Callable[[Any, Any], Optional[list[Node]]]
+Walker_Leave = Callable[[Any, Any], None]
+
+
+class Walker:
+	"""
+	Walks a syntax tree with an explicit stack instead of recursion, so that
+	deeply nested grammars do not reach the recursion limit.
+
+	`enter` and `leave` map node types to hooks called with the node and a
+	state object, which the pass creates once for the whole walk rather than
+	copying an options dict at each node. The `enter` hook of a node is
+	called before its children are walked, and its `leave` hook after. An
+	`enter` hook may return the nodes to walk instead of the node's children:
+	an empty list skips them, and a referenced rule can be walked in place of
+	a `rule_ref`. Nodes without hooks are walked through, as `Visitor` does.
+	"""
+	enter:dict[str, Walker_Enter]
+	leave:dict[str, Walker_Leave]
+	# the hooks and children of each node class, filled in as each class is
+	# first walked, as `Visitor.dispatch` is
+	dispatch:dict[type, tuple[Optional[Walker_Enter], Optional[Walker_Leave], Callable[[Any], list[Node]]]]
+
+	def __init__(
+		self,
+		enter:Optional[dict[str, Walker_Enter]]=None,
+		leave:Optional[dict[str, Walker_Leave]]=None,
+	):
+		self.enter = enter if enter is not None else {}
+		self.leave = leave if leave is not None else {}
+		self.dispatch = {}
+
+	def walk(self, node:Node, state:Any=None):
+		dispatch = self.dispatch
+		# nodes to enter, and `(leave hook, node)` pairs to call once everything
+		# above them on the stack has been walked
+		stack:list[Any] = [node]
+		while len(stack) > 0:
+			item = stack.pop()
+			if type(item) is tuple:
+				item[0](item[1], state)
+				continue
+
+			hooks = dispatch.get(type(item))
+			if hooks is None:
+				hooks = dispatch[type(item)] = (
+					self.enter.get(item.type),
+					self.leave.get(item.type),
+					_children[item.type],
+				)
+			enter, leave, children = hooks
+
+			walked:Optional[list[Node]] = enter(item, state) if enter is not None else None
+			if leave is not None:
+				stack.append((leave, item))
+			if walked is None:
+				walked = children(item)
+			if len(walked) == 1:
+				stack.append(walked[0])
+			elif len(walked) > 0:
+				stack.extend(reversed(walked))
+
+
 NT = TypeVar("NT", bound="Node")
 Node_Visitor_Type = Callable[[Visitor, NT, dict[str, Any]], Any]
 
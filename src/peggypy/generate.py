@@ -1,47 +1,11 @@
 from __future__ import annotations
-from typing import Any, Callable, Literal, Optional, OrderedDict, Protocol
+from typing import Any, Callable, Literal, Optional, Protocol, Union
 
 from .grammar_error import GrammarError
-from .compiler import compile
-from .parser.parser import parse
-
-
-from .compiler.generate_bytecode          import generateBytecode
-from .compiler.generate_py                import generatePY
-from .compiler.inference_match_result     import inferenceMatchResult
-from .compiler.remove_proxy_rules         import removeProxyRules
-from .compiler.report_duplicate_labels    import report_duplicate_labels
-from .compiler.report_duplicate_rules     import reportDuplicateRules
-from .compiler.report_infinite_recursion  import report_infinite_recusrsion
-from .compiler.report_infinite_repetition import reportInfiniteRepetition
-from .compiler.report_undefined_rules     import report_undefined_rules
-from .compiler.report_incorrect_plucking  import reportIncorrectPlucking
-
-# Each pass is a function that may mutate the AST. 
-# throws |peg.GrammarError|.
-# TODO: this could be a flat array. 
-# Maybe it is broken up like this for the benefit of 
-# plugins which may modify the stages/passes?
-
-
-passes:Any = OrderedDict([
-	("check", [
-		report_undefined_rules,
-		reportDuplicateRules,
-		report_duplicate_labels,
-		report_infinite_recusrsion,
-		reportInfiniteRepetition,
-		reportIncorrectPlucking,
-	]),
-	("transform", [
-		removeProxyRules,
-		inferenceMatchResult,
-	]),
-	("generate", [
-		generateBytecode,
-		generatePY,
-	]),
-]),
+from .compiler.utils_and_types.syntax_tree import Grammar, Location
+from .compiler import Pass_Report, compile_to_source
+from .compiler.passes import passes
+from . import parser_cache
 
 
 # TODO: these appear to be javascript reserved words. Change to pythons.
@@ -107,46 +71,84 @@ RESERVED_WORDS = [
 ]
 
 class Pluggin(Protocol):
-	def use(self, config:dict[str, Any], options:GenerateOptions):...
+	cache_token:str  # describes the plugin's configuration; part of the key of parsers stored in `parser_cache_dir`
+	def use(self, config:dict[str, Any], options:dict[str, Any]):...
 
 class GenerateOptions:
 	allowed_start_rules:Optional[list[str]] = None
-	cache:bool = False
+	cache:Union[bool, Literal["auto"], list[str]] = False  # True memoizes every rule, a list of rule names memoizes only those rules, "auto" lets `select_memoized_rules` choose
+	cache_window:Optional[int] = None     # if set, memoized results this many characters behind the parse position are evicted
 	#dependencies:dict = {} # valid only for "amd", "commonjs", "es", or "umd".
 	exportVar:Optional[str] = None
 	format:Literal["amd", "bare", "commonjs", "es", "globals", "umd"] = "bare"
-	grammarSource = None
+	grammarSource:Optional[str] = None
+	info:Optional[Callable[[str, Optional[Location]], None]] = None  # receives informational messages from compiler passes
+	inline_budget:int = 8  # rules of up to this many syntax tree nodes, without actions or predicates, are inlined into the rules that use them; 0 disables inlining
+	input_type:Literal["str", "utf-8", "bytes"] = "str"  # "utf-8" matches the encoded input (bytes or mmap) and adds `parse_file(path)`, which memory-maps the file. "bytes" makes a grammar over bytes, where `text()` returns zero-copy slices
+	lazy_expectations:bool = False  # parse without tracking expectations, and only if the parse fails, parse again tracking them to build the error. Actions run twice on inputs that fail to parse
 	output:Literal["parser", "source"] = "parser"
-	plugins:list[Pluggin] = []  # TODO: what is plugin type?
+	parser_cache_dir:Optional[str] = None  # if set, generated parsers are stored in / loaded from this directory, keyed by a hash of the grammar, options and plugin `cache_token`s. Other options must then be JSON serializable
+	pass_hook:Optional[Callable[[Pass_Report], None]] = None  # called after each compiler pass with its time, memory delta and syntax tree size; `Pass_Table` prints these as a table
+	plugins:list[Pluggin] = []  # each plugin's `use(config, options)` may change `config["parser"]`, `config["passes"]` and `config["reservedWords"]` before the grammar is parsed
+	profile:bool = False  # count calls, successes, failures, memo hits, characters consumed and time of each rule into `options["profile"]`, or the parser's module-level `profile`; `Profile.report()` ranks the hottest rules and the positions where most rule calls failed. Rules are neither inlined nor skipped by first-set dispatch, so that every call is counted
+	streaming:bool = False  # also generate `parse_stream(stream, options)`, which reads a file object or iterable of chunks as needed and yields each match of the start rule
 	trace:bool = False
 
-default_options = GenerateOptions()
-
-def generate(grammar:str, options:GenerateOptions=None):
-	options = default_options.update(options) if options else default_options
-	
+# The options `generate` takes are a plain dict; these are the defaults
+default_options:dict[str, Any] = {name: getattr(GenerateOptions, name) for name in GenerateOptions.__annotations__}
+
+def parse_grammar(grammar:str, options:dict[str, Any]) -> Grammar:
+	"""The default `config["parser"]`. The grammar parser is imported on first use."""
+	from .parser.parser import parse
+	return parse(grammar, options)
+
+def generate(grammar:str, options:Optional[dict[str, Any]]=None) -> Any:
+	"""
+	Generates a parser from the text of a grammar. Returns the parser as a new
+	module, or its python source if `options["output"] == "source"`. See
+	`GenerateOptions` for the options.
+	"""
+	options = {**default_options, **(options if options is not None else {})}
+	options["plugins"] = list(options["plugins"])
+
+	# a warm start skips parsing the grammar and every pass
+	cache_dir = options["parser_cache_dir"]
+	key = ""
+	if cache_dir is not None:
+		key = parser_cache.cache_key(grammar, options)
+		cached = parser_cache.load(cache_dir, key)
+		if cached is not None:
+			source, code = cached
+			return source if options["output"] == "source" else parser_cache.load_module(code)
 
 	config = {
-		"parser":parse,
-		"passes":{stage:passes[:] for stage, passes in passes},
+		"parser":parse_grammar,
+		"passes":{stage:stage_passes[:] for stage, stage_passes in passes.items()},
 		"reservedWords":RESERVED_WORDS[:],
 	}
 
-	parsed_grammar = parse(
+	for plugin in options["plugins"]:
+		plugin.use(config, options)
+
+	parsed_grammar = config["parser"](
 		grammar, 
 		{
-			"grammarSource":options.get("grammarSource", None),
+			"grammarSource":options["grammarSource"],
 			"reservedWords":config["reservedWords"]
 		}
 	)
-	options["plugins"] = options.get("plugins", [])
-
-	for plugin in options["plugins"]:
-		plugin.use(config, options)
 
-	return compile(
+	source = compile_to_source(
 		parsed_grammar,
-		config["passes"],
-		options
+		[each_pass for stage in config["passes"].values() for each_pass in stage],
+		**options
 	)
-	
+
+	if options["output"] == "source" and cache_dir is None:
+		return source
+
+	code = parser_cache.compile_source(source, key)
+	if cache_dir is not None:
+		parser_cache.store(cache_dir, key, source, code)
+
+	return source if options["output"] == "source" else parser_cache.load_module(code)
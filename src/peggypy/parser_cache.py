@@ -0,0 +1,114 @@
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import tempfile
+from types import CodeType, ModuleType
+from typing import Any, Optional
+
+from .version import VERSION
+
+
+# On-disk cache of generated parsers, so that processes compiling the same
+# grammar can skip parsing it and running the passes.
+#
+# Each entry is one file named after `cache_key(...)`, holding the marshalled
+# tuple `(source, code)`: the generated python source and its compiled code
+# object. Marshal data is only readable by the python version that wrote it, so
+# the interpreter's bytecode magic number is part of the key.
+#
+# Entries are written to a temporary file in the cache directory and moved into
+# place with `os.replace`, which is atomic, so a reader sees either the whole
+# entry or no entry even if several processes fill the same cache at once.
+
+# Options which do not change the generated source. `grammarSource` only names
+# the grammar in the errors of a compilation that fails, and failed
+# compilations are not stored.
+IGNORED_OPTIONS = {"grammarSource", "info", "output", "parser_cache_dir", "pass_hook", "plugins"}
+
+
+def cache_key(grammar:str, options:dict[str, Any]) -> str:
+	"""
+	Content hash of the grammar text, the options, the plugins and the
+	peggypy / python versions. Keyed options must be JSON serializable, and
+	each plugin must have a `cache_token` string that describes its
+	configuration, so that the key is the same in every process.
+	"""
+	keyed_options = {key: value for key, value in options.items() if key not in IGNORED_OPTIONS}
+	for name, value in keyed_options.items():
+		try:
+			json.dumps(value)
+		except (TypeError, ValueError):
+			raise Exception(f"Option \"{name}\" must be JSON serializable to use parser_cache_dir")
+	keyed_options["plugins"] = [_plugin_token(plugin) for plugin in options.get("plugins", [])]
+	digest = hashlib.sha256()
+	digest.update(VERSION.encode("utf-8"))
+	digest.update(importlib.util.MAGIC_NUMBER)
+	digest.update(json.dumps(keyed_options, sort_keys=True).encode("utf-8"))
+	digest.update(b"\0")
+	digest.update(grammar.encode("utf-8"))
+	return digest.hexdigest()
+
+
+def _plugin_token(plugin:Any) -> list[str]:
+	name = f"{type(plugin).__module__}.{type(plugin).__qualname__}"
+	token = getattr(plugin, "cache_token", None)
+	if not isinstance(token, str):
+		raise Exception(f"Plugin {name} must have a cache_token string to use parser_cache_dir")
+	return [name, token]
+
+
+def _entry_path(cache_dir:str, key:str) -> str:
+	return os.path.join(cache_dir, key + ".peggypy")
+
+
+def load(cache_dir:str, key:str) -> Optional[tuple[str, CodeType]]:
+	"""Returns the cached `(source, code)` for `key`, or `None` if there is no usable entry"""
+	try:
+		with open(_entry_path(cache_dir, key), "rb") as file:
+			source, code = marshal.load(file)
+	except FileNotFoundError:
+		return None
+	except (OSError, EOFError, ValueError, TypeError):
+		# unreadable or damaged entry; it is regenerated and replaced
+		return None
+	if not isinstance(source, str) or not isinstance(code, CodeType):
+		return None
+	return source, code
+
+
+def store(cache_dir:str, key:str, source:str, code:CodeType):
+	"""Atomically writes the entry for `key`"""
+	os.makedirs(cache_dir, exist_ok=True)
+	fd, temporary_path = tempfile.mkstemp(dir=cache_dir, prefix=key, suffix=".tmp")
+	try:
+		with os.fdopen(fd, "wb") as file:
+			marshal.dump((source, code), file)
+		os.replace(temporary_path, _entry_path(cache_dir, key))
+	except BaseException:
+		os.unlink(temporary_path)
+		raise
+
+
+def compile_source(source:str, key:str="") -> CodeType:
+	return compile(source, f"<peggypy parser {key[:12]}>" if key else "<peggypy parser>", "exec")
+
+
+def load_module(code:CodeType) -> ModuleType:
+	"""Executes the code of a generated parser as a new module"""
+	parser = ModuleType("peggypy_parser")
+	exec(code, parser.__dict__)
+	return parser
+
+
+def clear(cache_dir:str):
+	"""Removes every entry from `cache_dir`"""
+	if not os.path.isdir(cache_dir):
+		return
+	for name in os.listdir(cache_dir):
+		if name.endswith(".peggypy"):
+			try:
+				os.unlink(os.path.join(cache_dir, name))
+			except FileNotFoundError:
+				pass
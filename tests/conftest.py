@@ -0,0 +1,7 @@
+import os
+import sys
+
+# use the peggypy in this checkout, and the reference grammars of the benchmarks
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_root, "src"))
+sys.path.insert(0, _root)
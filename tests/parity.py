@@ -0,0 +1,50 @@
+"""
+Helpers for checking that two ways of compiling a grammar parse alike: the
+same results, and the same errors with the same location and expectations.
+"""
+import json
+import random
+from typing import Any, Optional
+
+from benchmarks.grammars import Reference_Grammar
+
+
+def expectation_set(expected:Optional[list[dict[str, Any]]]) -> Optional[list[str]]:
+	"""
+	The distinct expectations of an error. A failure may be recorded more than
+	once, and in another order, when a memoized rule is not re-run.
+	"""
+	if expected is None:
+		return None
+	return sorted({json.dumps(expectation, sort_keys=True) for expectation in expected})
+
+
+def outcome(parser:Any, input:Any) -> tuple[Any, ...]:
+	try:
+		return ("result", parser.parse(input))
+	except parser.SyntaxError as error:
+		return ("error", error.message, expectation_set(error.expected), error.location)
+
+
+def exact_outcome(parser:Any, input:Any) -> tuple[Any, ...]:
+	"""As `outcome`, but with the expectations as reported, for passes that must not reorder them"""
+	try:
+		return ("result", parser.parse(input))
+	except parser.SyntaxError as error:
+		return ("error", error.message, error.expected, error.location)
+
+
+def outcomes(parser:Any, inputs:list[Any]) -> list[tuple[Any, ...]]:
+	return [outcome(parser, input) for input in inputs]
+
+
+def reference_inputs(grammar:Reference_Grammar) -> list[str]:
+	"""Valid inputs of a few sizes, and each of them cut short and with a bad character inserted"""
+	rng = random.Random(0)
+	valid = [grammar.make_input(size, rng) for size in (1, 50, 400)]
+	malformed = []
+	for input in valid:
+		malformed.append(input[:len(input) // 2])
+		cut = rng.randrange(len(input))
+		malformed.append(input[:cut] + "\x01" + input[cut:])
+	return valid + malformed + [""]
@@ -0,0 +1,101 @@
+"""
+Builders of syntax trees for the tests, since the grammar-text parser is not
+usable yet. Every node gets the same location.
+"""
+from typing import Union
+
+from peggypy.compiler.passes import passes
+from peggypy.compiler.utils_and_types.syntax_tree import (
+	Action,
+	Any,
+	Choice,
+	Class,
+	Cursor_Location,
+	Grammar,
+	Group,
+	Initializer,
+	Labeled,
+	Literal,
+	Location,
+	Named,
+	One_or_More,
+	Optional,
+	Rule,
+	Rule_Ref,
+	Rule_Expression,
+	Semantic_And,
+	Semantic_Not,
+	Sequence,
+	Simple_And,
+	Simple_Not,
+	Text,
+	Zero_or_More,
+)
+
+
+# Every pass, in the order `generate` runs them
+PASSES = [each_pass for stage_passes in passes.values() for each_pass in stage_passes]
+
+
+def at() -> Location:
+	return Location(Cursor_Location(0, 1, 1), Cursor_Location(0, 1, 1))
+
+def grammar(*rules:Rule, initializer:Union[str, None]=None) -> Grammar:
+	return Grammar(at(), None, Initializer(at(), initializer, at()) if initializer is not None else None, list(rules))
+
+def rule(name:str, expression:Rule_Expression) -> Rule:
+	return Rule(at(), expression, name, at())
+
+def named(name:str, expression:Rule_Expression) -> Named:
+	return Named(at(), expression, name)
+
+def ref(name:str) -> Rule_Ref:
+	return Rule_Ref(at(), name)
+
+def lit(value:str, ignoreCase:bool=False) -> Literal:
+	return Literal(at(), value, ignoreCase)
+
+def cls(parts:list[Union[str, list[str]]], inverted:bool=False, ignoreCase:bool=False) -> Class:
+	return Class(at(), parts, inverted, ignoreCase)
+
+def any_() -> Any:
+	return Any(at())
+
+def seq(*elements:Rule_Expression) -> Sequence:
+	return Sequence(at(), list(elements))
+
+def choice(*alternatives:Rule_Expression) -> Choice:
+	return Choice(at(), list(alternatives))
+
+def act(expression:Rule_Expression, code:str) -> Action:
+	return Action(at(), expression, code, at())
+
+def label(name:str, expression:Rule_Expression) -> Labeled:
+	return Labeled(at(), expression, name, at())
+
+def text(expression:Rule_Expression) -> Text:
+	return Text(at(), expression)
+
+def group(expression:Rule_Expression) -> Group:
+	return Group(at(), expression)
+
+def optional(expression:Rule_Expression) -> Optional:
+	return Optional(at(), expression)
+
+def star(expression:Rule_Expression) -> Zero_or_More:
+	return Zero_or_More(at(), expression)
+
+def plus(expression:Rule_Expression) -> One_or_More:
+	return One_or_More(at(), expression)
+
+def and_(expression:Rule_Expression) -> Simple_And:
+	return Simple_And(at(), expression)
+
+def not_(expression:Rule_Expression) -> Simple_Not:
+	return Simple_Not(at(), expression)
+
+def sem_and(code:str) -> Semantic_And:
+	return Semantic_And(at(), code, at())
+
+def sem_not(code:str) -> Semantic_Not:
+	return Semantic_Not(at(), code, at())
@@ -0,0 +1,25 @@
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import compile_interpreter
+from syntax_trees import PASSES
+
+
+def test_python_source_is_not_generated():
+	ast = GRAMMARS["arithmetic"].build()
+	parser = compile_interpreter(ast, PASSES)
+	assert ast.code is None
+	assert parser.parse("1 + 2 * 3") == 7
+
+
+@pytest.mark.parametrize("input_type", ["utf-8", "bytes", "latin-1"])
+def test_input_type_other_than_str_is_rejected(input_type:str):
+	with pytest.raises(Exception, match="input_type"):
+		compile_interpreter(GRAMMARS["arithmetic"].build(), PASSES, input_type=input_type)
+
+
+@pytest.mark.parametrize("option", ["streaming", "profile", "lazy_expectations"])
+def test_generated_parser_options_are_rejected(option:str):
+	with pytest.raises(Exception, match=option):
+		compile_interpreter(GRAMMARS["arithmetic"].build(), PASSES, **{option: True})
+	compile_interpreter(GRAMMARS["arithmetic"].build(), PASSES, **{option: False})
@@ -0,0 +1,59 @@
+"""
+Generated python parsers give the same results and errors as the bytecode
+interpreter, which runs the same bytecode without generating source.
+"""
+import random
+from typing import Any, Callable
+
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import compile_interpreter, compile_parser
+from parity import outcome, reference_inputs
+from syntax_trees import PASSES
+
+
+# Memoization options, given the rule names of a grammar
+CACHE_OPTIONS:dict[str, Callable[[list[str]], dict[str, Any]]] = {
+	"no cache"    : lambda rules: {},
+	"cache all"   : lambda rules: {"cache": True},
+	"cache auto"  : lambda rules: {"cache": "auto"},
+	"cache listed": lambda rules: {"cache": rules[::2]},
+	"cache window": lambda rules: {"cache": True, "cache_window": 8},
+}
+
+
+@pytest.mark.parametrize("cache", list(CACHE_OPTIONS))
+@pytest.mark.parametrize("name", list(GRAMMARS))
+def test_generated_parser_matches_interpreter(name:str, cache:str):
+	grammar = GRAMMARS[name]
+	options = CACHE_OPTIONS[cache]([rule.name for rule in grammar.build().rules])
+
+	generated   = compile_parser(grammar.build(), PASSES, **dict(options))
+	interpreter = compile_interpreter(grammar.build(), PASSES, **dict(options))
+
+	for input in reference_inputs(grammar):
+		assert outcome(generated, input) == outcome(interpreter, input), repr(input)
+
+
+@pytest.mark.parametrize("name", list(GRAMMARS))
+def test_valid_inputs_parse(name:str):
+	grammar = GRAMMARS[name]
+	parser = compile_parser(grammar.build(), PASSES)
+	rng = random.Random(1)
+	for size in (1, 200):
+		parser.parse(grammar.make_input(size, rng))
+
+
+def test_cache_window_must_be_positive():
+	with pytest.raises(Exception, match="cache_window"):
+		compile_parser(GRAMMARS["arithmetic"].build(), PASSES, cache=True, cache_window=0)
+
+
+def test_arithmetic_results():
+	parser = compile_parser(GRAMMARS["arithmetic"].build(), PASSES, cache=True, cache_window=4)
+	assert parser.parse("2 * (3 + 4) - 5") == 9
+	with pytest.raises(parser.SyntaxError) as error:
+		parser.parse("2 * (3 + ")
+	assert error.value.location["start"]["offset"] == 9
+	assert error.value.message == "Expected \"(\" or integer but end of input found."
@@ -0,0 +1,112 @@
+"""
+Skipping the alternatives of a choice that can not start at the current
+character does not change what a parser does: the same results, and the same
+errors with the same expectations, in the same order.
+"""
+from itertools import product
+from typing import Any
+
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import compile_parser
+from peggypy.compiler.infer_first_sets import infer_first_sets
+from peggypy.compiler.utils_and_types.syntax_tree import Choice, Grammar
+from peggypy.compiler.utils_and_types.visitor import Walker
+from parity import exact_outcome, reference_inputs
+from syntax_trees import (
+	PASSES, and_, choice, grammar, lit, not_, optional, ref, rule, sem_and, seq, star,
+)
+
+
+WITHOUT_DISPATCH = [each_pass for each_pass in PASSES if each_pass is not infer_first_sets]
+
+
+def dispatches(ast:Grammar) -> bool:
+	choices:list[Choice] = []
+	Walker({"choice": lambda node, state: choices.append(node)}).walk(ast, None)
+	return any(node.dispatch is not None for node in choices)
+
+
+def assert_dispatch_is_equivalent(build, inputs:list[str], **options:Any):
+	ast = build()
+	dispatched = compile_parser(ast, PASSES, **options)
+	assert dispatches(ast)
+	plain = compile_parser(build(), WITHOUT_DISPATCH, **options)
+	for input in inputs:
+		assert exact_outcome(dispatched, input) == exact_outcome(plain, input), repr(input)
+
+
+def all_inputs(alphabet:str, length:int) -> list[str]:
+	return ["".join(chars) for size in range(length + 1) for chars in product(alphabet, repeat=size)]
+
+
+# Small rules are kept, rather than inlined, so that the choices start with rule calls
+NO_INLINING = {"inline_budget": 0}
+
+
+# A = "a" "1"; B = "b" "2"
+def two_rules():
+	return [
+		rule("A", seq(lit("a"), lit("1"))),
+		rule("B", seq(lit("b"), lit("2"))),
+	]
+
+
+@pytest.mark.parametrize("options", [NO_INLINING, {**NO_INLINING, "cache": ["B"]}])
+def test_nullable_alternatives(options:dict[str, Any]):
+	# S = (A / B? / "c") ("!" / A / "")
+	assert_dispatch_is_equivalent(
+		lambda: grammar(
+			rule("S", seq(
+				choice(ref("A"), optional(ref("B")), lit("c")),
+				choice(lit("!"), ref("A"), lit("")),
+			)),
+			*two_rules(),
+		),
+		all_inputs("ab12c!", 3),
+		**options,
+	)
+
+
+def test_predicates():
+	# S = &"a" A / !"b" B / &{ return True } A / star(B) "!"
+	assert_dispatch_is_equivalent(
+		lambda: grammar(
+			rule("S", choice(
+				seq(and_(lit("a")), ref("A")),
+				seq(not_(lit("b")), ref("B")),
+				seq(sem_and("return True"), ref("A")),
+				seq(star(ref("B")), lit("!")),
+			)),
+			*two_rules(),
+		),
+		all_inputs("ab12!", 3),
+		**NO_INLINING,
+	)
+
+
+def test_case_insensitive_literals():
+	# S = A / B / C; A = "Ab"i "1"; B = "é"i "2"; C = "a" "3"
+	assert_dispatch_is_equivalent(
+		lambda: grammar(
+			rule("S", choice(ref("A"), ref("B"), ref("C"))),
+			rule("A", seq(lit("Ab", ignoreCase=True), lit("1"))),
+			rule("B", seq(lit("é", ignoreCase=True), lit("2"))),
+			rule("C", seq(lit("a"), lit("3"))),
+		),
+		all_inputs("aAbBéÉ123", 3),
+		**NO_INLINING,
+	)
+
+
+@pytest.mark.parametrize("name", list(GRAMMARS))
+def test_reference_grammars(name:str):
+	grammar = GRAMMARS[name]
+	assert_dispatch_is_equivalent(grammar.build, reference_inputs(grammar))
+
+
+def test_skipped_when_tracing():
+	ast = GRAMMARS["json"].build()
+	compile_parser(ast, PASSES, trace=True)
+	assert not dispatches(ast)
@@ -0,0 +1,77 @@
+"""
+Inlining small rules does not change what a parser does, and leaves the rule
+index of the grammar in step with its rules.
+"""
+from typing import Any, Optional
+
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import compile_parser
+from peggypy.compiler.utils_and_types.syntax_tree import Location
+from parity import exact_outcome, reference_inputs
+from syntax_trees import PASSES, act, choice, grammar, label, lit, ref, rule, seq, star
+
+
+NO_INLINING = {"inline_budget": 0}
+
+
+def inlined_rules(build) -> list[str]:
+	messages:list[str] = []
+	def info(message:str, location:Optional[Location]):
+		messages.append(message)
+	compile_parser(build(), PASSES, info=info)
+	return [message.split('"')[1] for message in messages if "is inlined" in message]
+
+
+def assert_inlining_is_equivalent(build, inputs:list[str], **options:Any):
+	inlined = compile_parser(build(), PASSES, **options)
+	plain   = compile_parser(build(), PASSES, **{**options, **NO_INLINING})
+	for input in inputs:
+		assert exact_outcome(inlined, input) == exact_outcome(plain, input), repr(input)
+
+
+# S = c:"1" A d:B { return [c, d] }; A = c:"2" "3"; B = A / "4"
+def labels_and_actions():
+	return grammar(
+		rule("S", act(
+			seq(label("c", lit("1")), ref("A"), label("d", ref("B"))),
+			"return [c, d]",
+		)),
+		rule("A", seq(label("c", lit("2")), lit("3"))),
+		rule("B", choice(ref("A"), lit("4"))),
+	)
+
+
+def test_inlined_rule_in_label_and_action_scope():
+	assert set(inlined_rules(labels_and_actions)) == {"A", "B"}
+	parser = compile_parser(labels_and_actions(), PASSES)
+	# the label `c` of A stays inside the inlined copy
+	assert parser.parse("12323") == ["1", ["2", "3"]]
+	assert parser.parse("1234") == ["1", "4"]
+	assert_inlining_is_equivalent(labels_and_actions, ["12323", "1234", "123", "12", "1235", "", "2"])
+
+
+def test_rule_index_after_inlining():
+	ast = grammar(
+		rule("S", seq(ref("A"), star(ref("C")))),
+		rule("A", lit("a")),
+		rule("C", choice(ref("A"), lit("c"))),
+		rule("T", seq(ref("C"), lit("!"))),
+	)
+	# A is removed once inlined; C is inlined too, but kept as a start rule
+	compile_parser(ast, PASSES, allowed_start_rules=["S", "C"])
+	assert [rule.name for rule in ast.rules] == ["S", "C", "T"]
+	assert ast.ruleIndex == {"S": 0, "C": 1, "T": 2}
+	for index, each_rule in enumerate(ast.rules):
+		assert ast.indexOfRule(each_rule.name) == index
+		assert ast.findRule(each_rule.name) is each_rule
+	assert ast.indexOfRule("A") == -1
+	assert ast.findRule("A") is None
+
+
+@pytest.mark.parametrize("name", list(GRAMMARS))
+def test_reference_grammars(name:str):
+	grammar = GRAMMARS[name]
+	assert inlined_rules(grammar.build) != []
+	assert_inlining_is_equivalent(grammar.build, reference_inputs(grammar))
@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import pytest
+
+from peggypy.compiler import compile_parser
+from syntax_trees import PASSES, act, choice, cls, grammar, lit, rule, seq, star, text
+
+
+def parse_error(parser, input, **options):
+	with pytest.raises(Exception) as caught:
+		parser.parse(input, **options)
+	return caught.value
+
+
+# `S = "Éa"i "!"`
+def ignore_case_parser(input_type:str):
+	return compile_parser(
+		grammar(rule("S", seq(lit("Éa", ignoreCase=True), lit("!")))),
+		PASSES,
+		input_type=input_type,
+	)
+
+
+@pytest.mark.parametrize("input", ["Éa!", "ÉA!", "éa!", "éA!"])
+def test_utf8_ignore_case_literal_folds_non_ascii(input:str):
+	parser = ignore_case_parser("utf-8")
+	assert parser.parse(input.encode("utf-8")) == [input[:-1], "!"]
+	assert ignore_case_parser("str").parse(input) == [input[:-1], "!"]
+
+
+@pytest.mark.parametrize("input", ["ea!", "É", ""])
+def test_utf8_ignore_case_literal_rejects(input:str):
+	error = parse_error(ignore_case_parser("utf-8"), input.encode("utf-8"))
+	assert error.expected == [{"type": "literal", "text": "Éa", "ignoreCase": True}]
+
+
+def test_bytes_ignore_case_literal_folds_ascii_only():
+	# a bytes grammar holds latin-1 code points, of which only ASCII is folded
+	parser = ignore_case_parser("bytes")
+	assert [bytes(value) for value in parser.parse(b"\xC9A!")] == [b"\xC9A", b"!"]
+	assert parse_error(parser, b"\xE9a!").location["start"]["offset"] == 0
+
+
+# `S = $("é" / "a" / "\n")* "!"`, returning the location of the match
+def location_parser(input_type:str):
+	return compile_parser(
+		grammar(rule("S", act(
+			seq(text(star(choice(lit("é"), lit("a"), lit("\n")))), lit("!")),
+			"return [text(), location()]",
+		))),
+		PASSES,
+		input_type=input_type,
+	)
+
+
+def test_utf8_locations_count_characters():
+	[matched, location] = location_parser("utf-8").parse("éa\né!".encode("utf-8"))
+	assert matched == "éa\né!"
+	assert location["end"] == {"offset": 7, "line": 2, "column": 3}
+
+
+def test_utf8_error_location():
+	error = parse_error(location_parser("utf-8"), "éa\néxé".encode("utf-8"))
+	assert error.message == 'Expected "!", "\\n", "a", or "é" but "x" found.'
+	assert error.location["start"] == {"offset": 6, "line": 2, "column": 2}
+	assert error.location["end"] == {"offset": 7, "line": 2, "column": 3}
+
+
+def test_parse_file_matches_parse(tmp_path:Path):
+	parser = location_parser("utf-8")
+	for input in ["éa\né!", "é" * 5000 + "!", "!"]:
+		path = tmp_path / "input.txt"
+		path.write_bytes(input.encode("utf-8"))
+		assert parser.parse_file(str(path)) == parser.parse(input.encode("utf-8"))
+
+
+@pytest.mark.parametrize("input", ["éa\néxé", ""])
+def test_parse_file_error_matches_parse(tmp_path:Path, input:str):
+	parser = location_parser("utf-8")
+	path = tmp_path / "input.txt"
+	path.write_bytes(input.encode("utf-8"))
+	with pytest.raises(Exception) as from_file:
+		parser.parse_file(str(path))
+	from_bytes = parse_error(parser, input.encode("utf-8"))
+	assert from_file.value.message == from_bytes.message
+	assert from_file.value.location == from_bytes.location
+
+
+# `S = $("\xE9" / [a\x80-\xFF] / "\n")* "!"` over bytes
+def bytes_parser():
+	return compile_parser(
+		grammar(rule("S", act(
+			seq(text(star(choice(lit("\xE9"), cls(["a", ["\x80", "\xFF"]]), lit("\n")))), lit("!")),
+			"return [text(), location()]",
+		))),
+		PASSES,
+		input_type="bytes",
+	)
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+def test_bytes_round_trip(wrap):
+	input = wrap(b"\xE9a\n\xFF!")
+	[matched, location] = bytes_parser().parse(input)
+	assert bytes(matched) == b"\xE9a\n\xFF!"
+	assert matched.obj is (input.obj if isinstance(input, memoryview) else input)
+	assert location["end"] == {"offset": 5, "line": 2, "column": 3}
+
+
+def test_bytes_error_location():
+	error = parse_error(bytes_parser(), b"\xE9a\n\xE9x\xE9")
+	assert error.message == 'Expected "!", "\\n", "\xE9", or [a\\x80-\xFF] but "x" found.'
+	assert error.location["start"] == {"offset": 4, "line": 2, "column": 2}
+	assert error.location["end"] == {"offset": 5, "line": 2, "column": 3}
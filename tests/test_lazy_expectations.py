@@ -0,0 +1,24 @@
+"""
+Parsers that only collect expectations when a parse fails report the same
+errors as ones that collect them as they go.
+"""
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import compile_parser
+from parity import exact_outcome, reference_inputs
+from syntax_trees import PASSES
+
+
+@pytest.mark.parametrize("cache", [False, True])
+@pytest.mark.parametrize("name", list(GRAMMARS))
+def test_lazy_expectations_match_eager(name:str, cache:bool):
+	grammar = GRAMMARS[name]
+	lazy  = compile_parser(grammar.build(), PASSES, cache=cache, lazy_expectations=True)
+	eager = compile_parser(grammar.build(), PASSES, cache=cache)
+	errors = 0
+	for input in reference_inputs(grammar):
+		outcome = exact_outcome(lazy, input)
+		assert outcome == exact_outcome(eager, input), repr(input)
+		errors += outcome[0] == "error"
+	assert errors > 0
@@ -0,0 +1,71 @@
+"""
+A run of literal alternatives matched with one |ACCEPT_LITERAL_SET| parses
+like the same alternatives tried one after the other: the first literal in
+grammar order that matches is taken, not the longest.
+"""
+import sys
+from itertools import product
+from typing import Any
+
+import pytest
+
+from peggypy.compiler import compile_parser, generate_bytecode
+from syntax_trees import PASSES, choice, grammar, lit, plus, rule, seq
+
+
+LITERALS = ["a", "ab", "b", "ba", "c", "cab", "d", "da", "é", "éa"]
+
+ENCODINGS = {"str": None, "utf-8": "utf-8", "bytes": "latin-1"}
+
+
+# S = ("a" / "ab" / ... / "éa")+ "!"
+def build(ignoreCase:bool):
+	return grammar(rule("S", seq(
+		plus(choice(*(lit(value, ignoreCase) for value in LITERALS))),
+		lit("!"),
+	)))
+
+
+def as_str(value:Any) -> Any:
+	if isinstance(value, list):
+		return [as_str(item) for item in value]
+	if isinstance(value, (bytes, memoryview)):
+		return bytes(value).decode("latin-1")
+	return value
+
+
+def exact_outcome(parser:Any, input:Any) -> tuple[Any, ...]:
+	try:
+		return ("result", as_str(parser.parse(input)))
+	except parser.SyntaxError as error:
+		return ("error", error.message, error.expected, error.location)
+
+
+def inputs(encoding:Any) -> list[Any]:
+	texts = ["".join(chars) for size in range(5) for chars in product("abcdAé!", repeat=size)]
+	return texts if encoding is None else [text.encode(encoding) for text in texts]
+
+
+@pytest.mark.parametrize("ignoreCase", [False, True])
+@pytest.mark.parametrize("input_type", list(ENCODINGS))
+def test_literal_set_matches_plain_choice(monkeypatch:pytest.MonkeyPatch, input_type:str, ignoreCase:bool):
+	ast = build(ignoreCase)
+	with_set = compile_parser(ast, PASSES, input_type=input_type)
+	assert len(ast.literalSets) == 1
+
+	monkeypatch.setattr(generate_bytecode, "MIN_LITERAL_SET_SIZE", sys.maxsize)
+	ast = build(ignoreCase)
+	plain = compile_parser(ast, PASSES, input_type=input_type)
+	assert len(ast.literalSets) == 0
+
+	for input in inputs(ENCODINGS[input_type]):
+		assert exact_outcome(with_set, input) == exact_outcome(plain, input), repr(input)
+
+
+@pytest.mark.parametrize("input_type", list(ENCODINGS))
+def test_literal_set_keeps_grammar_order(input_type:str):
+	parser = compile_parser(build(False), PASSES, input_type=input_type)
+	encode = (lambda text: text) if ENCODINGS[input_type] is None else (lambda text: text.encode(ENCODINGS[input_type]))
+	# "a" is before "ab", so "ab" is matched as "a" then "b"
+	assert as_str(parser.parse(encode("ab!"))) == [["a", "b"], "!"]
+	assert as_str(parser.parse(encode("cab!"))) == [["c", "a", "b"], "!"]
@@ -0,0 +1,34 @@
+"""
+The bytecode optimizer does not change what a parser does: the same results,
+and the same errors at the same offsets with the same expectations.
+"""
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import compile_interpreter, compile_parser
+from peggypy.compiler.optimize_bytecode import optimize_bytecode
+from parity import exact_outcome, reference_inputs
+from syntax_trees import PASSES
+
+
+WITHOUT_OPTIMIZER = [each_pass for each_pass in PASSES if each_pass is not optimize_bytecode]
+
+
+@pytest.mark.parametrize("compile", [compile_parser, compile_interpreter])
+@pytest.mark.parametrize("cache", [False, True])
+@pytest.mark.parametrize("name", list(GRAMMARS))
+def test_optimized_bytecode_parses_alike(name:str, cache:bool, compile):
+	grammar = GRAMMARS[name]
+	optimized = compile(grammar.build(), PASSES, cache=cache)
+	plain     = compile(grammar.build(), WITHOUT_OPTIMIZER, cache=cache)
+	for input in reference_inputs(grammar):
+		assert exact_outcome(optimized, input) == exact_outcome(plain, input), repr(input)
+
+
+@pytest.mark.parametrize("name", list(GRAMMARS))
+def test_optimizer_changes_the_bytecode(name:str):
+	optimized = GRAMMARS[name].build()
+	plain     = GRAMMARS[name].build()
+	compile_interpreter(optimized, PASSES)
+	compile_interpreter(plain, WITHOUT_OPTIMIZER)
+	assert [rule.bytecode for rule in optimized.rules] != [rule.bytecode for rule in plain.rules]
@@ -0,0 +1,55 @@
+import importlib
+import multiprocessing
+
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import Parse_Failure, compile_parser, parse_many
+from syntax_trees import PASSES
+
+
+# the module, which the package shadows with its `parse_many` function
+parse_many_module = importlib.import_module("peggypy.compiler.parse_many")
+
+
+INPUTS = ["1 + 2", "2 * (3 + 4)", "2 * (", "7", "+"]
+
+
+def expected_outcomes() -> list:
+	parser = compile_parser(GRAMMARS["arithmetic"].build(), PASSES)
+	outcomes = []
+	for input in INPUTS:
+		try:
+			outcomes.append(parser.parse(input))
+		except parser.SyntaxError as error:
+			outcomes.append(Parse_Failure("SyntaxError", error.message, error.expected, error.found, error.location))
+	return outcomes
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_results_and_failures_in_order(workers:int):
+	results = list(parse_many(GRAMMARS["arithmetic"].build(), PASSES, INPUTS, workers=workers, chunksize=2))
+	assert results == expected_outcomes()
+	assert [isinstance(result, Parse_Failure) for result in results] == [False, False, True, False, True]
+	assert results[2].message == 'Expected "(" or integer but end of input found.'
+	assert results[2].location["start"]["offset"] == 5
+
+
+def test_spawned_workers(monkeypatch:pytest.MonkeyPatch):
+	# spawned workers start from a fresh interpreter, so nothing of this
+	# process is inherited and each compiles the source it is sent
+	monkeypatch.setattr(parse_many_module, "multiprocessing", multiprocessing.get_context("spawn"))
+	results = list(parse_many(GRAMMARS["arithmetic"].build(), PASSES, INPUTS, workers=2))
+	assert results == expected_outcomes()
+
+
+def test_start_rule():
+	results = list(parse_many(GRAMMARS["arithmetic"].build(), PASSES, ["12", "1 + 2"], start_rule="Integer", workers=1))
+	assert results[0] == 12
+	assert isinstance(results[1], Parse_Failure)
+
+
+@pytest.mark.parametrize("arguments", [{"workers": 0}, {"chunksize": 0}])
+def test_invalid_arguments(arguments:dict):
+	with pytest.raises(Exception, match=list(arguments)[0]):
+		list(parse_many(GRAMMARS["arithmetic"].build(), PASSES, INPUTS, **arguments))
@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+from typing import Any
+
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy import parser_cache
+from peggypy.compiler import Pass_Report
+from peggypy.generate import generate
+
+
+class Reference_Grammars:
+	"""Plugin that parses the name of a benchmark grammar into its syntax tree"""
+	cache_token = "reference grammars"
+
+	def __init__(self):
+		self.parsed:list[str] = []
+
+	def use(self, config:dict[str, Any], options:dict[str, Any]):
+		def parse(grammar:str, options:dict[str, Any]):
+			self.parsed.append(grammar)
+			return GRAMMARS[grammar].build()
+		config["parser"] = parse
+
+
+def compile(cache_dir:str, plugin:Reference_Grammars, passes_run:list[str], **options:Any):
+	def record(report:Pass_Report):
+		passes_run.append(report.name)
+	return generate("arithmetic", {"parser_cache_dir": cache_dir, "plugins": [plugin], "pass_hook": record, **options})
+
+
+def entries(cache_dir:str) -> list[str]:
+	return [name for name in os.listdir(cache_dir) if name.endswith(".peggypy")]
+
+
+def test_cold_store_then_warm_load(tmp_path:Any):
+	cache_dir = str(tmp_path)
+	plugin = Reference_Grammars()
+
+	passes_run:list[str] = []
+	cold = compile(cache_dir, plugin, passes_run, cache=True)
+	assert cold.parse("1 + 2 * 3") == 7
+	assert plugin.parsed == ["arithmetic"]
+	assert "generatePY" in passes_run
+	assert len(entries(cache_dir)) == 1
+
+	passes_run = []
+	warm = compile(cache_dir, plugin, passes_run, cache=True)
+	assert warm.parse("1 + 2 * 3") == 7
+	assert plugin.parsed == ["arithmetic"]
+	assert passes_run == []
+
+	source = compile(cache_dir, plugin, passes_run, cache=True, output="source")
+	assert "def peg_parse" in source
+	assert passes_run == []
+
+
+def test_options_change_the_key(tmp_path:Any):
+	cache_dir = str(tmp_path)
+	plugin = Reference_Grammars()
+	compile(cache_dir, plugin, [], cache=True)
+	compile(cache_dir, plugin, [], cache=False)
+	assert plugin.parsed == ["arithmetic", "arithmetic"]
+	assert len(entries(cache_dir)) == 2
+
+
+def test_damaged_entry_is_regenerated(tmp_path:Any):
+	cache_dir = str(tmp_path)
+	plugin = Reference_Grammars()
+	compile(cache_dir, plugin, [])
+	[entry] = entries(cache_dir)
+	with open(os.path.join(cache_dir, entry), "wb") as file:
+		file.write(b"not a marshalled parser")
+
+	passes_run:list[str] = []
+	parser = compile(cache_dir, plugin, passes_run)
+	assert parser.parse("(1 + 2) * 3") == 9
+	assert "generatePY" in passes_run
+	assert parser_cache.load(cache_dir, entry[:-len(".peggypy")]) is not None
+
+
+def test_key_is_stable_and_ignores_grammar_source():
+	plugin = Reference_Grammars()
+	options = {"cache": True, "plugins": [plugin], "info": print}
+	key = parser_cache.cache_key("grammar", options)
+	assert parser_cache.cache_key("grammar", {**options, "grammarSource": object()}) == key
+	assert parser_cache.cache_key("grammar", dict(options)) == key
+	assert parser_cache.cache_key("other grammar", options) != key
+
+
+def test_key_is_the_same_in_another_process():
+	options = {"cache": ["Term"], "cache_window": 64, "grammarSource": object()}
+	script = (
+		"import sys; sys.path.insert(0, sys.argv[1]); import peggypy.parser_cache as c;"
+		"print(c.cache_key('grammar', {'cache': ['Term'], 'cache_window': 64, 'grammarSource': object()}))"
+	)
+	src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+	other = subprocess.run([sys.executable, "-c", script, src], capture_output=True, text=True, check=True)
+	assert other.stdout.strip() == parser_cache.cache_key("grammar", options)
+
+
+def test_plugin_configuration_changes_the_key():
+	first, second = Reference_Grammars(), Reference_Grammars()
+	second.cache_token = "reference grammars, configured differently"
+	assert parser_cache.cache_key("grammar", {"plugins": [first]}) != parser_cache.cache_key("grammar", {"plugins": [second]})
+
+
+def test_unkeyable_options_and_plugins_are_rejected():
+	with pytest.raises(Exception, match="exportVar"):
+		parser_cache.cache_key("grammar", {"exportVar": object()})
+
+	class Untokened_Plugin:
+		def use(self, config:dict[str, Any], options:dict[str, Any]):...
+
+	with pytest.raises(Exception, match="cache_token"):
+		parser_cache.cache_key("grammar", {"plugins": [Untokened_Plugin()]})
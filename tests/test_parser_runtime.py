@@ -0,0 +1,35 @@
+import compileall
+import os
+import shutil
+import subprocess
+import sys
+from typing import Any
+
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def test_parsers_generate_with_only_compiled_modules_installed(tmp_path:Any):
+	package = os.path.join(str(tmp_path), "peggypy")
+	shutil.copytree(os.path.join(SRC, "peggypy"), package, ignore=shutil.ignore_patterns("__pycache__", "parser"))
+	assert compileall.compile_dir(package, legacy=True, quiet=1)
+	for directory, _, files in os.walk(package):
+		for name in files:
+			if name.endswith(".py"):
+				os.unlink(os.path.join(directory, name))
+
+	script = "\n".join([
+		"from peggypy.compiler import compile_parser",
+		"from peggypy.compiler.passes import passes",
+		"from peggypy.compiler.utils_and_types.syntax_tree import Cursor_Location, Grammar, Literal, Location, Rule",
+		"at = Location(Cursor_Location(0, 1, 1), Cursor_Location(0, 1, 1))",
+		"ast = Grammar(at, None, None, [Rule(at, Literal(at, 'a', False), 'Start', at)])",
+		"parser = compile_parser(ast, [p for stage in passes.values() for p in stage], trace=True)",
+		"try:",
+		"    parser.parse('b', {'tracer': parser.DefaultTracer()})",
+		"except parser.SyntaxError as error:",
+		"    print(error.message)",
+	])
+	run = subprocess.run([sys.executable, "-c", script], cwd=str(tmp_path), capture_output=True, text=True, env={**os.environ, "PYTHONPATH": str(tmp_path)})
+	assert run.returncode == 0, run.stderr
+	assert run.stdout.splitlines()[-1] == "Expected \"a\" but \"b\" found."
@@ -0,0 +1,73 @@
+import io
+import tracemalloc
+
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import Pass_Report, Pass_Table, compile_parser
+from syntax_trees import PASSES, choice, grammar, group, lit, ref, rule, seq
+
+
+def test_a_report_for_each_pass():
+	table = Pass_Table()
+	parser = compile_parser(GRAMMARS["arithmetic"].build(), PASSES, pass_hook=table)
+	assert parser.parse("1 + 2") == 3
+	assert [report.name for report in table.reports] == [each_pass.__name__ for each_pass in PASSES]
+	assert all(report.seconds >= 0 and report.memory_delta is None for report in table.reports)
+	# each pass starts from the tree the one before it left
+	for before, after in zip(table.reports, table.reports[1:]):
+		assert after.nodes_before == before.nodes_after
+
+
+def test_node_counts():
+	# S = A ("b" / (A)); A = "a"
+	ast = grammar(
+		rule("S", seq(ref("A"), choice(lit("b"), group(ref("A"))))),
+		rule("A", lit("a")),
+	)
+	reports:list[Pass_Report] = []
+	compile_parser(ast, PASSES, pass_hook=reports.append)
+	# grammar, 2 rules, and 6 + 1 expressions
+	assert reports[0].nodes_before == 10
+	# each reference to A becomes a group around a copy of "a", and A is removed
+	inlined = next(report for report in reports if report.name == "inline_rules")
+	assert (inlined.nodes_before, inlined.nodes_after) == (10, 10)
+	assert [each_rule.name for each_rule in ast.rules] == ["S"]
+
+
+def test_deep_tree_is_counted():
+	expression = lit("a")
+	for _ in range(10_000):
+		expression = group(expression)
+	reports:list[Pass_Report] = []
+	compile_parser(grammar(rule("S", expression)), PASSES[:1], pass_hook=reports.append)
+	assert reports[0].nodes_before == 10_003
+
+
+def test_table_is_printed():
+	file = io.StringIO()
+	with Pass_Table(file=file) as table:
+		compile_parser(GRAMMARS["json"].build(), PASSES, pass_hook=table)
+	lines = file.getvalue().splitlines()
+	assert lines[0].split() == ["pass", "ms", "memory", "nodes"]
+	assert [line.split()[0] for line in lines[1:]] == [each_pass.__name__ for each_pass in PASSES] + ["total"]
+	assert lines[1:-1] == table.format().splitlines()[1:-1]
+	assert float(lines[-1].split()[1]) == pytest.approx(sum(report.seconds for report in table.reports) * 1e3, abs=1e-3)
+
+
+def test_table_traces_memory():
+	assert not tracemalloc.is_tracing()
+	with Pass_Table(trace_memory=True, file=io.StringIO()) as table:
+		compile_parser(GRAMMARS["json"].build(), PASSES, pass_hook=table)
+	assert not tracemalloc.is_tracing()
+	assert all(report.memory_delta is not None for report in table.reports)
+	assert "K" in table.format()
+
+
+def test_table_is_not_printed_on_error():
+	file = io.StringIO()
+	with pytest.raises(Exception):
+		with Pass_Table(trace_memory=True, file=file) as table:
+			compile_parser(grammar(rule("S", ref("Missing"))), PASSES, pass_hook=table)
+	assert file.getvalue() == ""
+	assert not tracemalloc.is_tracing()
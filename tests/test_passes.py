@@ -0,0 +1,8 @@
+from peggypy.compiler.passes import passes
+from peggypy.generate import passes as generate_passes
+
+
+def test_generate_runs_the_shared_passes():
+	assert generate_passes is passes
+	assert list(passes) == ["check", "transform", "generate"]
+	assert passes["generate"][-1].__name__ == "generatePY"
@@ -0,0 +1,83 @@
+from typing import Any
+
+from peggypy.compiler import compile_parser
+from syntax_trees import PASSES, choice, grammar, lit, ref, rule, seq
+
+
+def counts(profile:Any, key:str) -> dict[str, int]:
+	return {name: getattr(profile, key)[index] for index, name in enumerate(profile.ruleNames)}
+
+
+# S = A / B; A = "a" "1"; B = "b"
+def choice_parser(**options:Any):
+	return compile_parser(
+		grammar(
+			rule("S", choice(ref("A"), ref("B"))),
+			rule("A", seq(lit("a"), lit("1"))),
+			rule("B", lit("b")),
+		),
+		PASSES,
+		profile=True,
+		**options,
+	)
+
+
+def test_rule_counts():
+	parser = choice_parser()
+	assert parser.parse("b") == "b"
+	profile = parser.profile
+	# A is called, and fails, even though first-set dispatch would skip it
+	assert counts(profile, "calls")     == {"S": 1, "A": 1, "B": 1}
+	assert counts(profile, "successes") == {"S": 1, "A": 0, "B": 1}
+	assert counts(profile, "failures")  == {"S": 0, "A": 1, "B": 0}
+	assert counts(profile, "consumed")  == {"S": 1, "A": 0, "B": 1}
+	assert profile.failedAt == {0: 1}
+	assert [rule["rule"] for rule in profile.hottest(key="calls")] == ["S", "A", "B"]
+
+	profile.reset()
+	assert counts(profile, "calls") == {"S": 0, "A": 0, "B": 0}
+	assert profile.failedAt == {}
+
+
+def test_profile_option():
+	parser = choice_parser()
+	profile = parser.Profile()
+	parser.parse("a1", {"profile": profile})
+	assert counts(profile, "successes") == {"S": 1, "A": 1, "B": 0}
+	assert counts(parser.profile, "calls") == {"S": 0, "A": 0, "B": 0}
+
+
+def test_memo_hits():
+	# S = A "x" / A "y"; A = "a"
+	parser = compile_parser(
+		grammar(
+			rule("S", choice(seq(ref("A"), lit("x")), seq(ref("A"), lit("y")))),
+			rule("A", lit("a")),
+		),
+		PASSES,
+		profile=True,
+		cache=True,
+	)
+	parser.parse("ay")
+	assert counts(parser.profile, "calls")    == {"S": 1, "A": 2}
+	assert counts(parser.profile, "memoHits") == {"S": 0, "A": 1}
+
+
+def test_report():
+	parser = choice_parser()
+	try:
+		parser.parse("c")
+	except parser.SyntaxError:
+		pass
+	lines = parser.profile.report().splitlines()
+	assert lines[0].split() == ["rule", "calls", "fails", "memo", "consumed", "ms"]
+	rows = {line.split()[0]: line.split()[1:5] for line in lines[1:4]}
+	assert rows == {
+		"S": ["1", "1", "0", "0"],
+		"A": ["1", "1", "0", "0"],
+		"B": ["1", "1", "0", "0"],
+	}
+	assert lines[4] == ""
+	assert lines[5].split() == ["offset", "failed", "calls"]
+	assert lines[6].split() == ["0", "3"]
+	assert len(lines) == 7
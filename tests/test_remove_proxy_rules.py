@@ -0,0 +1,80 @@
+import pytest
+
+from peggypy.compiler import compile_parser
+from peggypy.compiler.remove_proxy_rules import removeProxyRules
+from syntax_trees import PASSES, grammar, lit, ref, rule, seq
+
+
+def names(ast) -> list[str]:
+	return [each_rule.name for each_rule in ast.rules]
+
+
+def refs_of(ast, name:str) -> list[str]:
+	return [element.name for element in ast.findRule(name).expression.elements if element.type == "rule_ref"]
+
+
+def test_chain_of_proxies():
+	# S = A B C; A = B; B = C; C = "c"
+	ast = grammar(
+		rule("S", seq(ref("A"), ref("B"), ref("C"))),
+		rule("A", ref("B")),
+		rule("B", ref("C")),
+		rule("C", lit("c")),
+	)
+	removeProxyRules(ast, {"allowed_start_rules": ["S"]})
+	assert names(ast) == ["S", "C"]
+	assert refs_of(ast, "S") == ["C", "C", "C"]
+
+
+def test_proxies_defined_after_use():
+	# S = A B; C = "c"; B = C; A = B; the chain is listed in reverse
+	ast = grammar(
+		rule("S", seq(ref("A"), ref("B"))),
+		rule("C", lit("c")),
+		rule("B", ref("C")),
+		rule("A", ref("B")),
+	)
+	removeProxyRules(ast, {"allowed_start_rules": ["S"]})
+	assert names(ast) == ["S", "C"]
+	assert refs_of(ast, "S") == ["C", "C"]
+	assert ast.ruleIndex == {"S": 0, "C": 1}
+
+
+def test_allowed_start_rules_are_kept():
+	# S = A; A = B; B = "b", where A may also start a parse
+	ast = grammar(
+		rule("S", seq(ref("A"), lit("!"))),
+		rule("A", ref("B")),
+		rule("B", lit("b")),
+	)
+	removeProxyRules(ast, {"allowed_start_rules": ["S", "A"]})
+	assert names(ast) == ["S", "A", "B"]
+	assert refs_of(ast, "S") == ["B"]
+	assert ast.findRule("A").expression.name == "B"
+
+
+def test_cycle_of_proxies_is_left():
+	# A = B; B = A is left recursion, which is reported, not rewritten
+	ast = grammar(
+		rule("S", seq(ref("A"), lit("!"))),
+		rule("A", ref("B")),
+		rule("B", ref("A")),
+	)
+	removeProxyRules(ast, {"allowed_start_rules": ["S"]})
+	assert names(ast) == ["S", "A", "B"]
+	assert refs_of(ast, "S") == ["A"]
+
+
+def test_chain_parses_like_its_target():
+	ast = grammar(
+		rule("S", seq(ref("A"), ref("B"))),
+		rule("B", ref("C")),
+		rule("A", ref("B")),
+		rule("C", lit("c")),
+	)
+	parser = compile_parser(ast, PASSES)
+	assert parser.parse("cc") == ["c", "c"]
+	with pytest.raises(parser.SyntaxError) as error:
+		parser.parse("cx")
+	assert error.value.message == 'Expected "c" but "x" found.'
+	assert error.value.location["start"]["offset"] == 1
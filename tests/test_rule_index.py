@@ -0,0 +1,49 @@
+from peggypy.compiler import compile_parser
+from peggypy.compiler.remove_proxy_rules import removeProxyRules
+from syntax_trees import PASSES, grammar, lit, ref, rule, seq
+
+
+def test_rules_are_indexed_on_construction():
+	ast = grammar(rule("S", ref("A")), rule("A", lit("a")), rule("A", lit("b")))
+	assert ast.indexOfRule("S") == 0
+	# the first of duplicate rules wins
+	assert ast.indexOfRule("A") == 1
+	assert ast.findRule("A") is ast.rules[1]
+
+
+def test_miss_returns_minus_one_without_reindexing():
+	ast = grammar(rule("S", lit("s")))
+	ast.rules.append(rule("B", lit("b")))
+	assert ast.indexOfRule("B") == -1
+	assert ast.findRule("B") is None
+	ast.reindexRules()
+	assert ast.indexOfRule("B") == 1
+
+
+def test_index_follows_removed_proxy_rules():
+	# S = P Q; P = A; Q = A; A = "a"
+	ast = grammar(
+		rule("S", seq(ref("P"), ref("Q"))),
+		rule("P", ref("A")),
+		rule("Q", ref("A")),
+		rule("A", lit("a")),
+	)
+	removeProxyRules(ast, {"allowed_start_rules": ["S"]})
+	assert [each_rule.name for each_rule in ast.rules] == ["S", "A"]
+	assert ast.ruleIndex == {"S": 0, "A": 1}
+	assert ast.indexOfRule("P") == -1
+
+
+def test_rule_calls_use_the_index():
+	# the rule index given to |RULE| is the position of the rule after the
+	# transform passes removed the ones before it
+	ast = grammar(
+		rule("S", seq(ref("P"), ref("B"))),
+		rule("P", ref("B")),
+		rule("B", seq(lit("b"), ref("C"))),
+		rule("C", lit("c")),
+	)
+	parser = compile_parser(ast, PASSES, inline_budget=0)
+	assert [each_rule.name for each_rule in ast.rules] == ["S", "B", "C"]
+	assert ast.ruleIndex == {"S": 0, "B": 1, "C": 2}
+	assert parser.parse("bcbc") == [["b", "c"], ["b", "c"]]
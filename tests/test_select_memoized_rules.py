@@ -0,0 +1,58 @@
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import compile_parser
+from peggypy.compiler.select_memoized_rules import select_memoized_rules
+from peggypy.compiler.utils_and_types.syntax_tree import Grammar, Rule, Rule_Expression
+from parity import outcomes, reference_inputs
+from syntax_trees import PASSES, choice, grammar, lit, optional, plus, ref, rule, seq, star
+
+
+def letters(*names:str) -> list[Rule]:
+	return [rule(name, lit(name.lower())) for name in names]
+
+
+def memoized(start:Rule_Expression, *rules:Rule) -> set[str]:
+	ast:Grammar = grammar(rule("Start", start), *rules)
+	messages:list[str] = []
+	select_memoized_rules(ast, {"cache": "auto", "info": lambda message, location: messages.append(message)})
+	assert len(messages) == sum(rule.memoize for rule in ast.rules)
+	return {rule.name for rule in ast.rules if rule.memoize}
+
+
+def test_shared_prefix_is_memoized():
+	assert memoized(choice(seq(ref("A"), ref("B")), seq(ref("A"), ref("C"))), *letters("A", "B", "C")) == {"A"}
+
+
+def test_rules_starting_both_rests_of_a_shared_prefix_are_memoized():
+	start = choice(seq(ref("A"), ref("B"), lit("x")), seq(ref("A"), ref("B"), lit("y")), seq(ref("A"), ref("C")))
+	assert memoized(start, *letters("A", "B", "C")) == {"A", "B"}
+
+
+def test_alternatives_without_a_shared_prefix_are_not_memoized():
+	assert memoized(choice(seq(ref("A"), ref("B")), seq(ref("C"), ref("B"))), *letters("A", "B", "C")) == set()
+	assert memoized(seq(ref("A"), ref("B")), *letters("A", "B")) == set()
+
+
+@pytest.mark.parametrize("repeat", [optional, star, plus])
+def test_repetition_followed_by_its_leading_rule_is_memoized(repeat):
+	assert memoized(seq(repeat(seq(ref("A"), lit(","))), ref("A")), *letters("A")) == {"A"}
+
+
+def test_repetition_followed_by_another_rule_is_not_memoized():
+	assert memoized(seq(star(seq(ref("A"), lit(","))), ref("B")), *letters("A", "B")) == set()
+
+
+def test_rules_are_only_selected_with_cache_auto():
+	ast = grammar(rule("Start", choice(seq(ref("A"), ref("B")), seq(ref("A"), lit("c")))), *letters("A", "B"))
+	select_memoized_rules(ast, {"cache": True})
+	assert not any(rule.memoize for rule in ast.rules)
+
+
+@pytest.mark.parametrize("name", list(GRAMMARS))
+def test_auto_cache_parses_like_no_cache(name:str):
+	grammar = GRAMMARS[name]
+	inputs = reference_inputs(grammar)
+	auto  = compile_parser(grammar.build(), PASSES, cache="auto")
+	plain = compile_parser(grammar.build(), PASSES, cache=False)
+	assert outcomes(auto, inputs) == outcomes(plain, inputs)
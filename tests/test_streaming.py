@@ -0,0 +1,44 @@
+import random
+from typing import Any
+
+import pytest
+
+from benchmarks.grammars import GRAMMARS
+from peggypy.compiler import compile_parser
+from syntax_trees import PASSES, grammar, lit, not_, ref, rule, seq
+
+
+def outcome(parser:Any, chunks:list[str]) -> tuple[Any, ...]:
+	try:
+		return ("results", list(parser.parse_stream(chunks)))
+	except parser.SyntaxError as error:
+		return ("error", error.message, error.location)
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_memoized_failure_of_the_start_rule_reports_expectations(cache:bool):
+	# `!Line` memoizes the failure of `Line` at offset 1, silently, while
+	# matching the first result; the second result starts there
+	line = grammar(rule("Line", seq(lit("a"), not_(ref("Line")))))
+	parser = compile_parser(line, PASSES, streaming=True, cache=cache)
+	with pytest.raises(parser.SyntaxError) as error:
+		list(parser.parse_stream(["ab"]))
+	assert error.value.message == "Expected \"a\" but \"b\" found."
+
+
+def test_cache_does_not_change_stream_errors():
+	grammar = GRAMMARS["peggy"]
+	plain  = compile_parser(grammar.build(), PASSES, streaming=True)
+	cached = compile_parser(grammar.build(), PASSES, streaming=True, cache=True)
+
+	rng = random.Random(0)
+	errors = 0
+	for _ in range(10):
+		input = grammar.make_input(300, rng)
+		cut = rng.randrange(len(input))
+		input = input[:cut] + "\x01" + input[cut:]
+		for chunks in ([input], [input[i:i + 3] for i in range(0, len(input), 3)]):
+			expected = outcome(plain, chunks)
+			errors += expected[0] == "error"
+			assert outcome(cached, chunks) == expected
+	assert errors > 0
@@ -0,0 +1,69 @@
+import sys
+
+from peggypy.compiler.utils_and_types.rules import collect_rule_refs_walker
+from peggypy.compiler.utils_and_types.visitor import Walker
+from syntax_trees import choice, grammar, group, lit, ref, rule, seq
+
+
+DEPTH = 10_000
+
+
+def deep_grammar():
+	# S = ((((... A ...)))); A = "a", with the groups nested `DEPTH` deep
+	expression = ref("A")
+	for _ in range(DEPTH):
+		expression = group(expression)
+	return grammar(rule("S", expression), rule("A", lit("a")))
+
+
+def test_deep_tree_is_walked():
+	assert DEPTH > sys.getrecursionlimit()
+	entered:list[int] = []
+	left:list[int] = []
+	# the state is the stack of groups around the walked node
+	def enter(node, groups:list):
+		entered.append(len(groups))
+		groups.append(node)
+	def leave(node, groups:list):
+		left.append(len(groups))
+		groups.pop()
+	Walker({"group": enter}, {"group": leave}).walk(deep_grammar(), [])
+	assert entered == list(range(DEPTH))
+	assert left == list(range(DEPTH, 0, -1))
+
+	refs:set[str] = set()
+	collect_rule_refs_walker.walk(deep_grammar(), refs)
+	assert refs == {"A"}
+
+
+def test_enter_and_leave_order():
+	# S = "a" ("b" / B); B = "c"
+	ast = grammar(
+		rule("S", seq(lit("a"), choice(lit("b"), ref("B")))),
+		rule("B", lit("c")),
+	)
+	events:list[str] = []
+	Walker(
+		{
+			"rule"     : lambda node, events: events.append(f"enter {node.name}"),
+			"literal"  : lambda node, events: events.append(node.value),
+			"rule_ref" : lambda node, events: events.append(f"ref {node.name}"),
+		},
+		{
+			"rule"     : lambda node, events: events.append(f"leave {node.name}"),
+		},
+	).walk(ast, events)
+	assert events == ["enter S", "a", "b", "ref B", "leave S", "enter B", "c", "leave B"]
+
+
+def test_enter_may_choose_the_nodes_walked():
+	# S = A "s"; A = "a", walking into A in place of the reference to it, and
+	# skipping rules otherwise
+	ast = grammar(rule("S", seq(ref("A"), lit("s"))), rule("A", lit("a")))
+	values:list[str] = []
+	Walker({
+		"grammar"  : lambda node, values: [node.rules[0]],
+		"rule_ref" : lambda node, values: [ast.findRule(node.name)],
+		"literal"  : lambda node, values: values.append(node.value),
+	}).walk(ast, values)
+	assert values == ["a", "s"]